@@ -0,0 +1,170 @@
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+from PitchTracker import PitchTracker
+from PitchTrack import frame_signal, track_dtype
+from Spectrum import rfft_frequencies
+from WavIO import open_wav, to_float
+from pitch import cents_off
+
+#Saved analysis of a recording, kept for later comparison. An analysis is a
+#folder of three files:
+#  meta.json        - sample rate, frame and hop sizes, how the spectrogram is stored
+#  track.npy        - the pitch of every frame, frequency as float32 and cents as float16
+#  spectrogram.npy  - magnitude of every frame's bins up to max_frequency, one row per frame
+#The .npy files are plain arrays, memory mapped when read, so any stretch of
+#time is read from disk on its own without decoding the rest. Frame times are
+#not stored; frame i is centred on (i * hop + frame_size / 2) / sample_rate.
+#The spectrogram is stored as
+#  'uint8'   - decibels, from db_floor (0, silence) to 0 dB (255, a full scale sine)
+#              in steps of about 0.4 dB, one byte per bin
+#  'float16' - magnitudes as half floats, two bytes per bin
+#meta.json is written last, so a folder without it is an unfinished export
+stored_track_dtype = np.dtype([('frequency', np.float32), ('cents', np.float16)])
+spectrum_dtypes = {'uint8': np.uint8, 'float16': np.float16}
+db_floor = -100.0
+
+
+#Analyzes samples a block of frames at a time and writes the results to a folder
+#The output files are written in place through memory maps, so memory use is
+#bounded by block_frames however long the recording is
+#Arguments: (numpy array) samples, raw PCM (e.g. from WavIO.open_wav) or float between -1 and 1
+#           (int) sample_rate
+#           (string) output folder
+#           (int) frame_size samples per frame
+#           (int) hop samples between frame starts
+#           (float) max_frequency of the spectrogram bins kept, None keeps them all
+#           (string) spectrum storage, 'uint8' or 'float16'
+#           (int) block_frames frames analyzed at once
+#Returns: (AnalysisFile) the saved analysis
+def write_analysis(samples, sample_rate, output_folder, frame_size=2048, hop=512, max_frequency=8000, spectrum='uint8', fmin=60, fmax=2000,
+                   block_frames=256):
+    if spectrum not in spectrum_dtypes:
+        raise ValueError(f"spectrum must be one of {', '.join(spectrum_dtypes)}, not {spectrum!r}")
+    os.makedirs(output_folder, exist_ok=True)
+    meta_file = os.path.join(output_folder, 'meta.json')
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+
+    tracker = PitchTracker(sample_rate, frame_size, hop, fmin, fmax)
+    window = np.hanning(frame_size)
+    # Scales the spectrum of a full scale sine to 1
+    scale = 2 / window.sum()
+    bins = frame_size // 2 + 1
+    if max_frequency is not None:
+        bins = min(bins, int(np.searchsorted(rfft_frequencies(frame_size, sample_rate), max_frequency, side='right')))
+    total_frames = max(0, (len(samples) - frame_size) // hop + 1)
+    track = open_memmap(os.path.join(output_folder, 'track.npy'), mode='w+', dtype=stored_track_dtype, shape=(total_frames,))
+    spectrogram = open_memmap(os.path.join(output_folder, 'spectrogram.npy'), mode='w+', dtype=spectrum_dtypes[spectrum],
+                              shape=(total_frames, bins))
+
+    for first in range(0, total_frames, block_frames):
+        count = min(block_frames, total_frames - first)
+        start = first * hop
+        wave = to_float(np.asarray(samples[start:start + (count - 1) * hop + frame_size])).astype(np.float64)
+        frames = frame_signal(wave, frame_size, hop)
+        frequencies, _ = tracker.estimate_batch(frames)
+        track['frequency'][first:first + count] = frequencies
+        track['cents'][first:first + count] = np.where(frequencies > 0, cents_off(frequencies), np.nan)
+        magnitudes = np.abs(np.fft.rfft(frames * window, axis=1)[:, :bins]) * scale
+        spectrogram[first:first + count] = encode_spectrum(magnitudes, spectrum)
+    track.flush()
+    spectrogram.flush()
+    del track, spectrogram
+
+    meta = {'sample_rate': sample_rate, 'frame_size': frame_size, 'hop': hop, 'frames': total_frames, 'bins': bins,
+            'spectrum': spectrum, 'db_floor': db_floor, 'samples': len(samples)}
+    partial = f'{meta_file}.{os.getpid()}.tmp'
+    with open(partial, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(partial, meta_file)
+    return AnalysisFile(output_folder)
+
+
+#Analyzes a .wav file without loading it all, see write_analysis
+#Arguments: (string) input file path, (string) output folder, other arguments as write_analysis
+#Returns: (AnalysisFile) the saved analysis
+def export_analysis(input_file, output_folder, frame_size=2048, hop=512, max_frequency=8000, spectrum='uint8'):
+    samples, sample_rate = open_wav(input_file)
+    return write_analysis(samples, sample_rate, output_folder, frame_size, hop, max_frequency, spectrum)
+
+
+#Arguments: (numpy array) magnitudes, full scale 1
+#           (string) spectrum storage, 'uint8' or 'float16'
+#Returns: numpy array of the storage type
+def encode_spectrum(magnitudes, spectrum='uint8'):
+    if spectrum == 'float16':
+        return magnitudes.astype(np.float16)
+    with np.errstate(divide='ignore'):
+        db = 20 * np.log10(magnitudes)
+    return np.clip(np.rint((db - db_floor) * (255 / -db_floor)), 0, 255).astype(np.uint8)
+
+#Arguments: (numpy array) stored spectrum
+#           (string) spectrum storage, 'uint8' or 'float16'
+#Returns: numpy float32 array of magnitudes, full scale 1, with 0 for the bottom uint8 step
+def decode_spectrum(stored, spectrum='uint8'):
+    if spectrum == 'float16':
+        return stored.astype(np.float32)
+    magnitudes = np.power(np.float32(10), (stored.astype(np.float32) * (-db_floor / 255) + db_floor) / 20)
+    magnitudes[stored == 0] = 0
+    return magnitudes
+
+
+#A saved analysis, opened without reading it. Each read only touches the
+#frames between its start and stop times
+class AnalysisFile:
+    def __init__(self, folder):
+        self.folder = folder
+        meta_file = os.path.join(folder, 'meta.json')
+        if not os.path.exists(meta_file):
+            raise FileNotFoundError(f"{folder} is not a finished analysis, it has no meta.json")
+        with open(meta_file) as f:
+            self.meta = json.load(f)
+        self.sample_rate = self.meta['sample_rate']
+        self.frame_size = self.meta['frame_size']
+        self.hop = self.meta['hop']
+        self.spectrum = self.meta['spectrum']
+        self.stored_track = np.load(os.path.join(folder, 'track.npy'), mmap_mode='r')
+        self.stored_spectrogram = np.load(os.path.join(folder, 'spectrogram.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.stored_track)
+
+    #Frames whose centres fall between two times
+    #Arguments: (float) start and stop in seconds default to the whole analysis
+    #Returns: slice of frame indices
+    def frames(self, start=None, stop=None):
+        offset = self.frame_size / 2
+        first = 0 if start is None else max(0, int(np.ceil((start * self.sample_rate - offset) / self.hop)))
+        last = len(self) if stop is None else min(len(self), max(0, int(np.floor((stop * self.sample_rate - offset) / self.hop)) + 1))
+        return slice(first, max(first, last))
+
+    #Arguments: (float) start and stop in seconds
+    #Returns: numpy array of frame centre times
+    def times(self, start=None, stop=None):
+        frames = self.frames(start, stop)
+        return (np.arange(frames.start, frames.stop) * self.hop + self.frame_size / 2) / self.sample_rate
+
+    #Arguments: (float) start and stop in seconds
+    #Returns: numpy array of PitchTrack.track_dtype rows
+    def track(self, start=None, stop=None):
+        stored = self.stored_track[self.frames(start, stop)]
+        track = np.empty(len(stored), dtype=track_dtype)
+        track['time'] = self.times(start, stop)
+        track['frequency'] = stored['frequency']
+        track['cents'] = stored['cents']
+        return track
+
+    #Arguments: (float) start and stop in seconds
+    #Returns: numpy float32 array of magnitudes shaped (frames, bins), full scale 1
+    def spectrogram(self, start=None, stop=None):
+        return decode_spectrum(self.stored_spectrogram[self.frames(start, stop)], self.spectrum)
+
+    #Returns: numpy array of the frequency of each spectrogram bin
+    def frequencies(self):
+        return rfft_frequencies(self.frame_size, self.sample_rate)[:self.stored_spectrogram.shape[1]]
+
+    #Returns: (int) bytes on disk
+    def size(self):
+        return sum(os.path.getsize(os.path.join(self.folder, name)) for name in ('meta.json', 'track.npy', 'spectrogram.npy'))
@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import math
+from LiveTuner import LiveTuner
+from AudioBackend import FakeAudio
+from pitch import tune_categories
+
+#One tuner result for asyncio code and network clients. time is the position
+#in the input, in seconds, of the end of the frame the pitch came from; level
+#is pitch.tune_level and category its name, e.g. 'in tune'
+Frame = collections.namedtuple('Frame', ['time', 'frequency', 'note', 'cents', 'level', 'category', 'confidence', 'onset', 'chord',
+                                         'sequence'])
+
+
+#The fields of a frame as a dict for JSON, with a missing cents value as None
+#Arguments: (Frame) frame
+#Returns: (dict)
+def frame_to_json(frame):
+    values = frame._asdict()
+    values['cents'] = None if math.isnan(frame.cents) else round(float(frame.cents), 2)
+    values['frequency'] = round(float(frame.frequency), 3)
+    values['confidence'] = round(float(frame.confidence), 3)
+    values['onset'] = bool(frame.onset)
+    values['level'] = int(frame.level)
+    values['chord'] = list(frame.chord)
+    return values
+
+
+#Queue of frames for one reader of AsyncTuner.frames(). Frames arrive from the
+#analysis thread and are handed over to the event loop's thread. A full queue
+#either drops its oldest frame, so a slow reader only misses frames, or makes
+#the analysis thread wait for room. Dropped frames are counted in metrics
+class _Subscriber:
+    def __init__(self, loop, maxsize, drop_oldest, metrics):
+        self.loop = loop
+        self.metrics = metrics
+        self.queue = asyncio.Queue(maxsize)
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self.closed = False
+        # Set once the tuner is stopping, after which nothing waits for room
+        self.released = False
+
+    #Runs on the analysis thread. Waiting for room gives up once the reader
+    #goes, the tuner is stopping or the event loop stops
+    def offer(self, frame):
+        if self.closed:
+            return
+        try:
+            if self.drop_oldest or self.released:
+                self.loop.call_soon_threadsafe(self._put, frame)
+                return
+            future = asyncio.run_coroutine_threadsafe(self.queue.put(frame), self.loop)
+            while not (self.closed or self.released) and self.loop.is_running():
+                try:
+                    future.result(timeout=0.05)
+                    return
+                except concurrent.futures.TimeoutError:
+                    pass
+            future.cancel()
+        except (RuntimeError, concurrent.futures.CancelledError):
+            # The event loop has closed
+            self.closed = True
+
+    #Runs on the event loop's thread
+    def _put(self, frame):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.metrics.count('frames dropped by readers')
+        self.queue.put_nowait(frame)
+
+    #Runs on the event loop's thread, ending the reader's loop once it has the frames before
+    def end(self):
+        self._put(None)
+
+    #Runs on the event loop's thread once the reader has gone. Emptying the
+    #queue lets an analysis thread waiting for room carry on
+    def close(self):
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+#asyncio front end for a LiveTuner:
+#  async with AsyncTuner(LiveTuner()) as tuner:
+#      async for frame in tuner.frames():
+#          print(frame.note, frame.cents)
+#The tuner analyzes the input once, on its own analysis thread, however many
+#readers there are; each reader of frames() gets every new result through a
+#queue of its own. A reader that falls maxsize frames behind loses its oldest
+#frames, or with drop_oldest=False holds up the analysis until it catches up or
+#the tuner stops, which backs the audio up into the capture's ring buffer and,
+#past the tuner's max_backlog, makes it skip ahead. Every reader's loop ends
+#when the input does
+class AsyncTuner:
+    def __init__(self, tuner=None):
+        self.tuner = LiveTuner() if tuner is None else tuner
+        self.tuner.on_reading = self._publish
+        # Replaced rather than changed, so the analysis thread can walk it without a lock
+        self.subscribers = ()
+        self.loop = None
+        self.watcher = None
+        self.stopped = False
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exception):
+        await self.stop()
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.tuner.start()
+        self.watcher = asyncio.create_task(self._watch())
+
+    #Stops the capture without blocking the event loop and ends every reader
+    async def stop(self):
+        if self.watcher is not None and self.watcher is not asyncio.current_task():
+            self.watcher.cancel()
+        if not self.stopped:
+            self.stopped = True
+            # Nothing waits for a reader from here on, or joining the analysis thread could wait forever
+            for subscriber in self.subscribers:
+                subscriber.released = True
+            # Joins the capture threads, whose last readings are published on the way out
+            await asyncio.to_thread(self.tuner.stop)
+            for subscriber in self.subscribers:
+                subscriber.end()
+
+    #Stops once the input ends, e.g. at the end of a file
+    async def _watch(self):
+        capture = self.tuner.capture
+        while not capture.finished.is_set() and capture.stream is not None and capture.stream.is_active():
+            await asyncio.sleep(0.05)
+        await self.stop()
+
+    #Runs on the analysis thread for every new reading
+    def _publish(self, reading):
+        frame = Frame(self.tuner.received / self.tuner.sample_rate, reading.frequency, reading.note, reading.cents, reading.level,
+                      tune_categories[reading.level] if reading.level >= 0 else 'none', reading.confidence, reading.onset,
+                      reading.chord, reading.sequence)
+        for subscriber in self.subscribers:
+            subscriber.offer(frame)
+
+    #Every new result from now until the input ends
+    #Arguments: (int) maxsize frames kept for a reader that falls behind
+    #           (bool) drop_oldest frames when full, or hold up the analysis if False
+    #Returns: async generator of Frames
+    async def frames(self, maxsize=32, drop_oldest=True):
+        if self.stopped:
+            return
+        subscriber = _Subscriber(asyncio.get_running_loop(), maxsize, drop_oldest, self.tuner.metrics)
+        self.subscribers += (subscriber,)
+        try:
+            while True:
+                frame = await subscriber.queue.get()
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.subscribers = tuple(other for other in self.subscribers if other is not subscriber)
+            subscriber.close()
+
+
+#Shares one AsyncTuner with any number of TCP clients, e.g. the SwiftUI app,
+#sending each frame as a line of JSON (frame_to_json). Every client reads
+#frames() on its own, so a slow client only drops its own frames and never
+#holds up the analysis or the other clients
+class TunerServer:
+    def __init__(self, tuner, host='127.0.0.1', port=8765, maxsize=32):
+        self.tuner = tuner
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.server = None
+        self.clients = 0
+
+    #Starts listening; port 0 picks a free port, stored in self.port
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def _serve_client(self, reader, writer):
+        self.clients += 1
+        try:
+            async for frame in self.tuner.frames(self.maxsize):
+                writer.write(json.dumps(frame_to_json(frame)).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+#Reads the frames a TunerServer sends
+#Arguments: (string) host
+#           (int) port
+#Returns: async generator of dicts, as frame_to_json, until the server closes the connection
+async def subscribe(host='127.0.0.1', port=8765):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while line := await reader.readline():
+            yield json.loads(line)
+    finally:
+        writer.close()
+
+
+async def serve(args):
+    audio = None
+    if args.input:
+        audio = FakeAudio.from_wav(args.input, args.speed, mono=True)
+    elif args.tone:
+        audio = FakeAudio.tone(args.seconds or 5, args.tone, speed=args.speed)
+    sample_rate = audio.sample_rate if audio is not None else 44100
+    live_tuner = LiveTuner(args.device, args.chunk, sample_rate, args.frame_size, args.hop, audio=audio, chords=args.chords)
+    tuner = AsyncTuner(live_tuner)
+    server = TunerServer(tuner, args.host, args.port)
+    await server.start()
+    print(f"Serving tuner frames on {args.host}:{server.port}")
+
+    async def show(frames):
+        async for frame in frames:
+            if not args.quiet:
+                print(f"{frame.time:8.2f} s {frame.frequency:8.2f} Hz  {frame.note:<4} {frame.category}")
+            if args.seconds is not None and frame.time >= args.seconds:
+                break
+
+    # Reading from the first frame on, however quickly the input goes by
+    shown = asyncio.create_task(show(tuner.frames()))
+    await asyncio.sleep(0)
+    await tuner.start()
+    try:
+        await shown
+    finally:
+        await tuner.stop()
+        await server.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve live tuner results to TCP clients as lines of JSON')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on, only this machine by default')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--input', help='.wav file to play instead of the microphone')
+    parser.add_argument('--tone', type=float, nargs='+', help='frequencies to play instead of the microphone')
+    parser.add_argument('--speed', type=float, default=1, help='playback speed of --input or --tone')
+    parser.add_argument('--device', type=int, default=0, help='microphone to record from')
+    parser.add_argument('--seconds', type=float, default=None, help='seconds of input to serve, defaults to until Ctrl+C or the end of the file')
+    parser.add_argument('--frame-size', type=int, default=4096, help='samples per analysis frame')
+    parser.add_argument('--hop', type=int, default=256, help='samples between frame starts')
+    parser.add_argument('--chunk', type=int, default=256, help='samples per audio callback')
+    parser.add_argument('--chords', action='store_true', help='also send every note sounding')
+    parser.add_argument('--quiet', action='store_true', help='do not print the frames')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
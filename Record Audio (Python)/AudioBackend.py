@@ -0,0 +1,186 @@
+import atexit
+import threading
+import time
+import numpy as np
+import pyaudio
+
+#Sample formats the capture engine can turn into numpy arrays
+sample_dtypes = {pyaudio.paInt16: np.int16, pyaudio.paInt32: np.int32}
+
+#Audio backends give recording code what it needs from pyaudio.PyAudio:
+#open(...) with a stream_callback, get_sample_size(format), terminate() and the
+#device queries get_device_count, get_device_info_by_index,
+#get_host_api_info_by_index and get_device_info_by_host_api_device_index
+
+
+#One PortAudio instance kept open for the life of the program and shared by
+#every caller, since starting PortAudio scans every device and takes far longer
+#than opening a stream. terminate() is ignored so callers written for a
+#pyaudio.PyAudio of their own cannot close it for everyone; close() really
+#shuts PortAudio down and happens automatically at exit
+class PyAudioBackend:
+    def __init__(self):
+        self.audio = pyaudio.PyAudio()
+        self.device_cache = None
+
+    #Everything else, open and the device queries, goes straight to PyAudio
+    def __getattr__(self, name):
+        return getattr(self.audio, name)
+
+    #Information about every device, read from PortAudio once and then cached
+    #PortAudio reads the device list only when it starts, so refresh restarts it
+    #to pick up a device plugged in since; with a stream open it cannot, and
+    #the devices are only read again from the running instance
+    #Arguments: (bool) refresh reads the devices again, e.g. after one is plugged in
+    #Returns: list of device info dicts
+    def devices(self, refresh=False):
+        if refresh and not self.open_streams():
+            self.audio.terminate()
+            self.audio = pyaudio.PyAudio()
+        if self.device_cache is None or refresh:
+            self.device_cache = [self.audio.get_device_info_by_index(i) for i in range(self.audio.get_device_count())]
+        return self.device_cache
+
+    #Streams opened through this backend and not yet closed, as PyAudio tracks them
+    def open_streams(self):
+        return len(getattr(self.audio, '_streams', ()))
+
+    def terminate(self):
+        pass
+
+    def close(self):
+        if self.audio is not None:
+            self.audio.terminate()
+            self.audio = None
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+#Returns the shared PyAudioBackend, starting PortAudio on first use
+def shared_audio():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PyAudioBackend()
+            atexit.register(_shared.close)
+        return _shared
+
+
+#Stand-in for pyaudio.PyAudio that plays a numpy array through the stream
+#callback instead of opening a microphone. speed=1 runs in real time, higher
+#values run faster and speed=0 runs as fast as possible. It looks like a
+#single input device named name, so device listing code works with it too
+class FakeAudio:
+    def __init__(self, signal, sample_rate=44100, speed=0, name='Fake input'):
+        self.signal = np.asarray(signal)
+        self.sample_rate = sample_rate
+        self.speed = speed
+        self.name = name
+
+    #Plays a .wav file of any sample format, scaled to 16 bit
+    #Arguments: (string) input file path
+    #           (float) speed, 1 for real time
+    #           (bool) mono averages the channels
+    #Returns: FakeAudio
+    @classmethod
+    def from_wav(cls, input_file, speed=1, mono=False):
+        # The fake sources import their helpers (and scipy) only when used, so recording starts quickly
+        from WavIO import open_wav, to_float
+        samples, sample_rate = open_wav(input_file)
+        return cls(np.clip(to_float(samples, mono), -1, 1) * 32767, sample_rate, speed, name=input_file)
+
+    #Plays steady tones
+    #Arguments: (float) seconds
+    #           (list) frequencies sounded together
+    #           (float) amplitude between 0 and 1 of the mix
+    #           (float) speed, 1 for real time
+    #Returns: FakeAudio
+    @classmethod
+    def tone(cls, duration, frequencies=[440], sample_rate=44100, amplitude=0.5, speed=1):
+        from WaveGenerator import generate_chord
+        chord = generate_chord(duration, sample_rate, frequencies)
+        return cls(chord * (amplitude * 32767 / max(1, len(frequencies))), sample_rate, speed,
+                   name=' + '.join(f'{frequency:g} Hz' for frequency in frequencies))
+
+    #Plays one steady tone on each channel, e.g. a device with a mic per instrument
+    #Arguments: (float) seconds
+    #           (list) frequencies, one per channel
+    #           (float) amplitude between 0 and 1 of each channel
+    #           (float) speed, 1 for real time
+    #Returns: FakeAudio
+    @classmethod
+    def channel_tones(cls, duration, frequencies=[220, 330, 440], sample_rate=44100, amplitude=0.5, speed=1):
+        from WaveGenerator import generate_sine_wave
+        signal = np.column_stack([generate_sine_wave(duration, sample_rate, frequency) for frequency in frequencies])
+        return cls(signal * (amplitude * 32767), sample_rate, speed,
+                   name=' | '.join(f'{frequency:g} Hz' for frequency in frequencies))
+
+    def open(self, format=pyaudio.paInt16, channels=1, rate=44100, frames_per_buffer=1024, input=True, input_device_index=None, stream_callback=None, start=True):
+        signal = self.signal.astype(sample_dtypes[format]).reshape(-1, channels)
+        return FakeStream(signal, rate, frames_per_buffer, stream_callback, self.speed, start)
+
+    def get_sample_size(self, format):
+        return np.dtype(sample_dtypes[format]).itemsize
+
+    def get_device_count(self):
+        return 1
+
+    def get_device_info_by_index(self, index):
+        channels = 1 if self.signal.ndim == 1 else self.signal.shape[1]
+        return {'index': index, 'name': self.name, 'maxInputChannels': channels, 'maxOutputChannels': 0,
+                'defaultSampleRate': float(self.sample_rate)}
+
+    def get_host_api_info_by_index(self, index):
+        return {'index': index, 'name': 'Fake', 'deviceCount': 1}
+
+    def get_device_info_by_host_api_device_index(self, host_api_index, host_api_device_index):
+        return self.get_device_info_by_index(host_api_device_index)
+
+    def devices(self, refresh=False):
+        return [self.get_device_info_by_index(0)]
+
+    def terminate(self):
+        pass
+
+
+class FakeStream:
+    def __init__(self, signal, rate, frames_per_buffer, stream_callback, speed, start=True):
+        self.signal = signal
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.stream_callback = stream_callback
+        self.speed = speed
+        self.active = False
+        self.thread = None
+        if start:
+            self.start_stream()
+
+    def start_stream(self):
+        self.active = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        started = time.monotonic()
+        for start in range(0, len(self.signal), self.frames_per_buffer):
+            if not self.active:
+                return
+            block = self.signal[start:start + self.frames_per_buffer]
+            if self.speed:
+                time.sleep(max(0.0, started + (start + len(block)) / self.rate / self.speed - time.monotonic()))
+            _, flag = self.stream_callback(block.tobytes(), len(block), {}, 0)
+            if flag != pyaudio.paContinue:
+                break
+        self.active = False
+
+    def is_active(self):
+        return self.active
+
+    def stop_stream(self):
+        self.active = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def close(self):
+        self.stop_stream()
@@ -0,0 +1,103 @@
+import argparse
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from tqdm import tqdm
+from PitchTrack import pitch_track
+from Spectrum import dominant_frequency
+from WavIO import load_audio
+from pitch import freq_to_pitch, tune_level
+
+#Fraction of voiced frames at each pitch.tune_level
+level_fields = ['in_tune', 'out_of_tune', 'really_out_of_tune', 'different_note']
+summary_fields = ['file', 'duration', 'sample_rate', 'dominant_freq', 'median_freq', 'note', 'voiced_fraction',
+                  'mean_abs_cents'] + level_fields + ['error']
+
+
+#Summarizes the pitch and intonation of one recording
+#Runs in a worker process, so any error is reported in the summary instead of raised
+#Arguments: (string) input file path
+#           (int) frame_size samples per analysis frame
+#           (int) hop samples between frames
+#Returns: (dict) one row of summary_fields
+def analyze_file(input_file, frame_size=2048, hop=512):
+    summary = dict.fromkeys(summary_fields, '')
+    summary['file'] = input_file
+    try:
+        wave, sample_rate = load_audio(input_file)
+        track = pitch_track(wave, sample_rate, frame_size, hop)
+        voiced = track[track['frequency'] > 0]
+        summary['sample_rate'] = sample_rate
+        summary['duration'] = round(len(wave) / sample_rate, 3)
+        summary['dominant_freq'] = round(float(dominant_frequency(wave, sample_rate, pad='fast')), 2) if len(wave) else 0.0
+        summary['voiced_fraction'] = round(len(voiced) / len(track), 3) if len(track) else 0.0
+        if len(voiced):
+            median = float(np.median(voiced['frequency']))
+            levels = np.bincount(tune_level(voiced['frequency']), minlength=4) / len(voiced)
+            summary['median_freq'] = round(median, 2)
+            summary['note'] = freq_to_pitch(median)
+            summary['mean_abs_cents'] = round(float(np.mean(np.abs(voiced['cents']))), 2)
+            for field, fraction in zip(level_fields, levels):
+                summary[field] = round(float(fraction), 3)
+    except Exception as error:
+        summary['error'] = f'{type(error).__name__}: {error}'
+    return summary
+
+#Finds every .wav file under a folder
+#Arguments: (string) folder path
+#Returns: sorted list of file paths
+def find_recordings(folder):
+    recordings = []
+    for root, _, files in os.walk(folder):
+        recordings.extend(os.path.join(root, name) for name in files if name.lower().endswith('.wav'))
+    return sorted(recordings)
+
+#Analyzes many recordings across a pool of processes
+#Files are handed to the workers in chunks so each task carries several files
+#Arguments: (list) file paths
+#           (int) workers defaults to the number of CPUs
+#           (int) chunksize files per task, defaults to about four tasks per worker
+#           (bool) progress shows a tqdm progress bar
+#Returns: list of summaries in the same order as the files
+def analyze_files(files, workers=None, chunksize=None, frame_size=2048, hop=512, progress=True):
+    workers = workers or os.cpu_count() or 1
+    chunksize = chunksize or max(1, len(files) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(analyze_file, files, [frame_size] * len(files), [hop] * len(files), chunksize=chunksize)
+        return list(tqdm(results, total=len(files), unit='file', disable=not progress))
+
+#Writes summaries to a .csv or .json file, chosen by the extension
+#Arguments: (list) summaries
+#           (string) output file path
+#Returns: N/A
+def write_summaries(summaries, output_file):
+    if output_file.lower().endswith('.json'):
+        with open(output_file, 'w') as f:
+            json.dump(summaries, f, indent=2)
+    else:
+        with open(output_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=summary_fields)
+            writer.writeheader()
+            writer.writerows(summaries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize the pitch and intonation of every .wav file in a folder')
+    parser.add_argument('folder', help='folder of recordings, searched recursively')
+    parser.add_argument('-o', '--output', default='summary.csv', help='.csv or .json output file')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes, defaults to the number of CPUs')
+    parser.add_argument('--chunksize', type=int, default=None, help='files per task')
+    parser.add_argument('--frame-size', type=int, default=2048)
+    parser.add_argument('--hop', type=int, default=512)
+    args = parser.parse_args(argv)
+
+    files = find_recordings(args.folder)
+    summaries = analyze_files(files, args.workers, args.chunksize, args.frame_size, args.hop)
+    write_summaries(summaries, args.output)
+    failed = sum(1 for summary in summaries if summary['error'])
+    print(f"Analyzed {len(files) - failed} of {len(files)} recordings into {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,839 @@
+import argparse
+import datetime
+import json
+import logging
+import math
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from scipy.io.wavfile import write
+from SongToWav import read_song, parse_song, render_song, song_chunks, compile_score, render_score, transpose, NoteCache
+from WaveGenerator import generate_sine_wave, generate_chord, read_wave_freq, OscillatorBank
+from WaveToWav import wave_to_wav, wave_to_wav_stream
+from WavToFreq import find_dominant_freq
+from WavIO import load_audio
+from Spectrum import magnitude_spectrum
+from PitchTracker import PitchTracker
+from PitchTrack import pitch_track, stft, frame_signal
+from PitchSmoother import PitchSmoother
+from ChordDetector import ChordDetector, chord_names, detect_chords
+from BatchAnalysis import analyze_files
+from Intonation import score_timeline, align
+from AnalysisStore import export_analysis
+from Metrics import Metrics, Histogram
+from LoggingSetup import log_setup, log_shutdown
+from pitch import pitch_to_freq, freq_to_pitch, pitches_to_freqs, cents_off, in_tune, frequencies_C2_to_C5, C0, all_sharp, all_flat
+
+#Benchmarks of the synthesis, analysis and live paths, name -> (setup function,
+#input sizes, kind). A setup function takes a size and a scratch folder and
+#returns the call to run:
+#  'time'   - the call is timed over many rounds, see measure
+#  'values' - the call runs once and returns a dict of what it measured, e.g.
+#             a latency seen inside a live run or the peak memory. Labels end
+#             in their unit, e.g. '(MB)' or '(count)'; plain labels are seconds
+#Benchmarks of the audio code import it in their setup functions, and are
+#skipped on machines without pyaudio or an audio system
+suite = {}
+
+
+#A setup function raises this when the benchmark cannot run on this machine
+class Unavailable(Exception):
+    pass
+
+
+#Registers a benchmark to run at each of several input sizes
+#Arguments: (string) name
+#           (list) sizes passed to the setup function
+#           (string) kind, 'time' or 'values'
+#Returns: decorator
+def benchmark(name, sizes, kind='time'):
+    def register(setup):
+        suite[name] = (setup, sizes, kind)
+        return setup
+    return register
+
+
+#Times a call until min_time seconds have passed, after one warm up call
+#Arguments: (function) func to time
+#           (float) min_time seconds to keep timing for
+#           (int) max_rounds to time at most
+#Returns: (dict) statistics of the round times in seconds
+def measure(func, min_time=0.2, max_rounds=1000):
+    func()
+    rounds = []
+    started = time.perf_counter()
+    while len(rounds) < max_rounds and (len(rounds) < 3 or time.perf_counter() - started < min_time):
+        start = time.perf_counter()
+        func()
+        rounds.append(time.perf_counter() - start)
+    return {'min': min(rounds), 'median': statistics.median(rounds), 'mean': statistics.fmean(rounds),
+            'stdev': statistics.stdev(rounds), 'rounds': len(rounds)}
+
+
+#Measures the peak memory Python allocates during a function call
+#Arguments: (function) func to measure
+#Returns: (float) peak in megabytes
+def peak_memory(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+#Writes a song file of repeated notes lasting roughly the given number of seconds
+#Arguments: (string) output file path
+#           (int) seconds of music
+#Returns: N/A
+def write_test_song(output_file, seconds=180, bpm=120):
+    pattern = ['B3', 'A3', 'G3', 'A3']
+    with open(output_file, 'w') as f:
+        f.write(f'{bpm}\n')
+        for i in range(int(seconds * bpm / 60)):
+            f.write(f'{pattern[i % len(pattern)]}, 1\n')
+
+
+#A song file in the scratch folder, written the first time it is asked for
+def _test_song(folder, seconds):
+    song_file = os.path.join(folder, f'song_{seconds}.txt')
+    if not os.path.exists(song_file):
+        write_test_song(song_file, seconds)
+    return song_file
+
+#A 16 bit .wav of held notes in the scratch folder, written the first time it is asked for
+def _test_recording(folder, seconds):
+    input_file = os.path.join(folder, f'recording_{seconds}.wav')
+    if not os.path.exists(input_file):
+        wave_to_wav_stream(lambda: song_chunks([('A3', 1), ('C4', 1), ('E4', 2)] * math.ceil(seconds / 4), 60), output_file=input_file)
+    return input_file
+
+
+# WaveGenerator.py
+############################################################################################
+@benchmark('generate_sine_wave', sizes=[0.1, 1, 10])
+def setup_generate_sine_wave(seconds, folder):
+    return lambda: generate_sine_wave(duration=seconds, frequency=440)
+
+@benchmark('generate_chord', sizes=[0.1, 1, 10])
+def setup_generate_chord(seconds, folder):
+    return lambda: generate_chord(duration=seconds)
+
+@benchmark('read_wave_freq', sizes=[0.1, 1, 10])
+def setup_read_wave_freq(seconds, folder):
+    wave = generate_sine_wave(duration=seconds, frequency=440)
+    return lambda: read_wave_freq(wave)
+
+#100 blocks of 1024 samples from a bank of voices
+@benchmark('OscillatorBank float64', sizes=[1, 4, 16, 64])
+def setup_oscillator_bank(voices, folder, dtype=np.float64):
+    bank = OscillatorBank(np.linspace(110, 880, voices), dtype=dtype)
+    block = np.empty(1024, dtype=dtype)
+    return lambda: [bank.render(out=block) for _ in range(100)]
+
+@benchmark('OscillatorBank float32', sizes=[1, 4, 16, 64])
+def setup_oscillator_bank_float32(voices, folder):
+    return setup_oscillator_bank(voices, folder, np.float32)
+
+
+# WaveToWav.py
+############################################################################################
+@benchmark('wave_to_wav', sizes=[0.1, 1, 10])
+def setup_wave_to_wav(seconds, folder):
+    wave = generate_sine_wave(duration=seconds, frequency=440)
+    output_file = os.path.join(folder, 'wave_to_wav.wav')
+    return lambda: wave_to_wav(wave, output_file=output_file)
+
+#The whole-signal conversion wave_to_wav used before wave_to_wav_stream
+def legacy_wave_to_wav(sin_wave, sampling_rate=44100, output_file='legacy.wav'):
+    sin_wave = np.clip(sin_wave * (32767 / np.max(np.abs(sin_wave))), -32768, 32767)
+    sin_wave = sin_wave.astype(np.int16)
+    write(output_file, sampling_rate, sin_wave)
+
+@benchmark('peak memory writing a song', sizes=[180], kind='values')
+def setup_wave_to_wav_memory(seconds, folder):
+    bpm, notes = parse_song(_test_song(folder, seconds))
+    output_file = os.path.join(folder, 'memory.wav')
+    return lambda: {'legacy (MB)': peak_memory(lambda: legacy_wave_to_wav(render_song(notes, bpm), output_file=output_file)),
+                    'wave_to_wav_stream (MB)': peak_memory(lambda: wave_to_wav_stream(song_chunks(notes, bpm), output_file=output_file, peak=1.0))}
+
+
+# SongToWav.py
+############################################################################################
+#The per-sample list copy read_song used before render_song
+def legacy_render_song(notes, bpm, sample_rate=44100):
+    song = []
+    all_notes = []
+    for pitch, beats in notes:
+        dur = pow(bpm / 60 * pow(beats, -1), -1)
+        all_notes.append(generate_sine_wave(duration=dur, sample_rate=sample_rate, frequency=pitch_to_freq(pitch)))
+    for note in all_notes:
+        for element in note:
+            song.append(element)
+    return np.array(song)
+
+@benchmark('render_song legacy', sizes=[10, 60])
+def setup_legacy_render_song(seconds, folder):
+    bpm, notes = parse_song(_test_song(folder, seconds))
+    return lambda: legacy_render_song(notes, bpm)
+
+@benchmark('render_song', sizes=[10, 60, 180])
+def setup_render_song(seconds, folder):
+    bpm, notes = parse_song(_test_song(folder, seconds))
+    return lambda: render_song(notes, bpm)
+
+@benchmark('read_song', sizes=[10, 60, 300])
+def setup_read_song(seconds, folder):
+    output_file = os.path.join(folder, 'read_song.wav')
+    song_file = _test_song(folder, seconds)
+    return lambda: read_song(song_file, output_file)
+
+@benchmark('read_song from cache_dir', sizes=[10, 60, 300])
+def setup_read_song_cached(seconds, folder):
+    output_file = os.path.join(folder, 'read_song_cached.wav')
+    song_file, cache_dir = _test_song(folder, seconds), os.path.join(folder, 'cache')
+    return lambda: read_song(song_file, output_file, cache_dir)
+
+@benchmark('render_score empty cache', sizes=[10, 60, 300])
+def setup_render_score_cold(seconds, folder):
+    score = compile_score(*reversed(parse_song(_test_song(folder, seconds))))
+    return lambda: render_score(score, cache=NoteCache())
+
+@benchmark('render_score warm cache', sizes=[10, 60, 300])
+def setup_render_score(seconds, folder):
+    bpm, notes = parse_song(_test_song(folder, seconds))
+    score, cache = compile_score(notes, bpm), NoteCache()
+    return lambda: render_score(score, cache=cache)
+
+#Six tempo and transposition variants of a song sharing one warm cache
+@benchmark('render_score variants', sizes=[60, 180])
+def setup_render_score_variants(seconds, folder):
+    bpm, notes = parse_song(_test_song(folder, seconds))
+    cache = NoteCache()
+    return lambda: [render_score(transpose(compile_score(notes, bpm * tempo), semitones), cache=cache)
+                    for tempo in (0.9, 1.1) for semitones in (-2, 0, 2)]
+
+
+# WavToFreq.py
+############################################################################################
+@benchmark('find_dominant_freq', sizes=[0.1, 1, 10])
+def setup_find_dominant_freq(seconds, folder):
+    input_file = os.path.join(folder, f'dominant_{seconds}.wav')
+    wave_to_wav(generate_sine_wave(duration=seconds, frequency=440), output_file=input_file)
+    return lambda: find_dominant_freq(input_file)
+
+
+# Spectrum.py
+############################################################################################
+#The two full complex FFTs find_frequencies used before magnitude_spectrum
+def legacy_find_frequencies(wave, sample_rate=44100):
+    magnitude = np.abs(np.fft.fft(wave))
+    fft = np.fft.fft(wave)
+    freqs = np.fft.fftfreq(len(fft), 1/sample_rate)
+    return freqs, magnitude
+
+#An odd length like most real recordings
+def _odd_wave(seconds):
+    return generate_sine_wave(duration=seconds, frequency=440)[:-1]
+
+@benchmark('find_frequencies legacy', sizes=[1, 60])
+def setup_legacy_find_frequencies(seconds, folder):
+    wave = _odd_wave(seconds)
+    return lambda: legacy_find_frequencies(wave)
+
+@benchmark('magnitude_spectrum', sizes=[1, 60])
+def setup_magnitude_spectrum(seconds, folder):
+    wave = _odd_wave(seconds)
+    return lambda: magnitude_spectrum(wave)
+
+@benchmark("magnitude_spectrum pad='fast'", sizes=[1, 60])
+def setup_magnitude_spectrum_fast(seconds, folder):
+    wave = _odd_wave(seconds)
+    return lambda: magnitude_spectrum(wave, pad='fast')
+
+@benchmark("magnitude_spectrum pad='pow2'", sizes=[1, 60])
+def setup_magnitude_spectrum_pow2(seconds, folder):
+    wave = _odd_wave(seconds)
+    return lambda: magnitude_spectrum(wave, pad='pow2')
+
+
+# WavIO.py
+############################################################################################
+@benchmark('load_audio whole file', sizes=[60, 300])
+def setup_load_audio(seconds, folder):
+    input_file = _test_recording(folder, seconds)
+    return lambda: load_audio(input_file)
+
+@benchmark('load_audio 1 s window', sizes=[60, 300])
+def setup_load_audio_window(seconds, folder):
+    input_file = _test_recording(folder, seconds)
+    return lambda: load_audio(input_file, start=seconds / 2, stop=seconds / 2 + 1)
+
+
+# pitch.py
+############################################################################################
+@benchmark('pitch_to_freq', sizes=[10, 1000])
+def setup_pitch_to_freq(count, folder):
+    names = [f'{note}{octave}' for octave in range(1, 8) for note in ['C', 'D#', 'Eb', 'F', 'G#', 'Bb', 'B']]
+    names = (names * (count // len(names) + 1))[:count]
+    return lambda: [pitch_to_freq(name) for name in names]
+
+#The regex and list.index parser pitch_to_freq used before pitch_table
+def legacy_pitch_to_freq(pitch):
+    match = re.match(r'([A-G][#b]?+)(\d+)', pitch)
+    note, octave = match.group(1), match.group(2)
+    index = all_sharp.index(note) if note in all_sharp else all_flat.index(note)
+    return C0 * (2 ** ((index + int(octave) * 12) / 12))
+
+@benchmark('pitch_to_freq legacy', sizes=[10, 1000])
+def setup_legacy_pitch_to_freq(count, folder):
+    names = [all_flat[i % 12] + str(i % 7 + 1) for i in range(count)]
+    return lambda: [legacy_pitch_to_freq(name) for name in names]
+
+@benchmark('pitches_to_freqs', sizes=[10, 1000, 100000])
+def setup_pitches_to_freqs(count, folder):
+    names = (['C4', 'D#5', 'Bb2', 'G3'] * (count // 4 + 1))[:count]
+    return lambda: pitches_to_freqs(names)
+
+@benchmark('freq_to_pitch', sizes=[10, 1000])
+def setup_freq_to_pitch(count, folder):
+    frequencies = np.geomspace(60, 2000, count).tolist()
+    return lambda: [freq_to_pitch(frequency) for frequency in frequencies]
+
+@benchmark('cents_off scalar', sizes=[10, 1000])
+def setup_cents_off_scalar(count, folder):
+    frequencies = np.geomspace(60, 2000, count).tolist()
+    return lambda: [cents_off(frequency) for frequency in frequencies]
+
+#The linear scan over C2 to C5 cents_off used before nearest_semitone
+def legacy_cents_off(f1):
+    f2 = min(frequencies_C2_to_C5, key=lambda x: abs(x - f1))
+    return 1200 * math.log2(f2 / f1)
+
+@benchmark('cents_off scalar legacy', sizes=[10, 1000])
+def setup_legacy_cents_off(count, folder):
+    frequencies = np.geomspace(65, 1000, count).tolist()
+    return lambda: [legacy_cents_off(frequency) for frequency in frequencies]
+
+@benchmark('cents_off array', sizes=[10, 1000, 100000])
+def setup_cents_off_array(count, folder):
+    frequencies = np.geomspace(60, 2000, count)
+    return lambda: cents_off(frequencies)
+
+@benchmark('in_tune array', sizes=[10, 1000, 100000])
+def setup_in_tune_array(count, folder):
+    frequencies = np.geomspace(60, 2000, count)
+    return lambda: in_tune(frequencies)
+
+
+# PitchTracker.py
+############################################################################################
+#The argmax of a 1024 sample FFT the live plot used before PitchTracker
+def legacy_argmax_pitch(chunk, sample_rate=44100):
+    magnitude = np.abs(np.fft.fft(chunk)[:len(chunk) // 2])
+    return np.argmax(magnitude) * sample_rate / len(chunk)
+
+@benchmark('PitchTracker.estimate', sizes=[1024, 2048, 4096])
+def setup_pitch_tracker(frame_size, folder):
+    tracker = PitchTracker(frame_size=frame_size)
+    frame = generate_sine_wave(duration=frame_size / 44100, frequency=220)
+    return lambda: tracker.estimate(frame)
+
+#Worst error over sine tones from C2 to C6, in seconds of tone per note
+@benchmark('pitch tracking accuracy', sizes=[0.5], kind='values')
+def setup_pitch_tracker_accuracy(seconds, folder, notes=['C2', 'G2', 'C3', 'E3', 'A3', 'C4', 'A4', 'E5', 'C6']):
+    def run():
+        legacy_errors, tracker_errors = [], []
+        tracker = PitchTracker()
+        for note in notes:
+            frequency = pitch_to_freq(note)
+            wave = generate_sine_wave(duration=seconds, frequency=frequency)
+            legacy = legacy_argmax_pitch(wave[:1024])
+            tracker.reset()
+            estimate = np.median(tracker.process(wave))
+            legacy_errors.append(abs(1200 * np.log2(max(legacy, 1) / frequency)))
+            tracker_errors.append(abs(1200 * np.log2(estimate / frequency)))
+        return {'legacy worst error (cents)': float(max(legacy_errors)), 'PitchTracker worst error (cents)': float(max(tracker_errors))}
+    return run
+
+
+# PitchTrack.py
+############################################################################################
+@benchmark('PitchTracker frame by frame', sizes=[10, 60])
+def setup_pitch_track_per_frame(seconds, folder):
+    wave = generate_sine_wave(duration=seconds, frequency=220)
+    tracker = PitchTracker()
+    frames = frame_signal(wave, tracker.frame_size, tracker.hop_size)
+    return lambda: [tracker.estimate(frame) for frame in frames]
+
+@benchmark('pitch_track', sizes=[10, 60])
+def setup_pitch_track(seconds, folder):
+    wave = generate_sine_wave(duration=seconds, frequency=220)
+    return lambda: pitch_track(wave)
+
+
+# ChordDetector.py
+############################################################################################
+test_chords = [['C4', 'E4', 'G4'], ['A3', 'C#4', 'E4'], ['G2', 'D3', 'B3', 'F4'], ['E3', 'G#3', 'B3'], ['D4', 'F4', 'A4', 'C5']]
+
+#Triads and seventh chords as generate_chord makes them
+@benchmark('chord detection accuracy', sizes=[4096], kind='values')
+def setup_chord_accuracy(frame_size, folder):
+    detector = ChordDetector(frame_size=frame_size)
+    def run():
+        exact = 0
+        for chord in test_chords:
+            frame = generate_chord(frame_size / 44100, 44100, pitches_to_freqs(chord)) / len(chord)
+            exact += chord_names(detector.detect_batch(frame[None])[0])[0] == tuple(chord)
+        return {'chords named exactly (count)': int(exact), 'chords tried (count)': len(test_chords)}
+    return run
+
+#Spectra per call; one is what a LiveTuner reading hands over
+@benchmark('ChordDetector.detect_spectra', sizes=[1, 64])
+def setup_detect_spectra(frames, folder):
+    detector = ChordDetector()
+    frame = generate_chord(detector.frame_size / 44100, 44100, pitches_to_freqs(test_chords[0])) / 3
+    spectra = np.repeat(detector.spectra(frame[None]), frames, axis=0)
+    return lambda: detector.detect_spectra(spectra)
+
+@benchmark('detect_chords', sizes=[1, 10])
+def setup_detect_chords(seconds, folder):
+    wave = generate_chord(seconds, 44100, pitches_to_freqs(test_chords[0])) / 3
+    return lambda: detect_chords(wave)
+
+
+# AnalysisStore.py
+############################################################################################
+@benchmark('export_analysis', sizes=[60, 300])
+def setup_export_analysis(seconds, folder):
+    input_file = _test_recording(folder, seconds)
+    return lambda: export_analysis(input_file, os.path.join(folder, f'export_{seconds}'))
+
+@benchmark('AnalysisFile 2 s read', sizes=[300])
+def setup_analysis_read(seconds, folder):
+    analysis = export_analysis(_test_recording(folder, seconds), os.path.join(folder, f'read_{seconds}'))
+    return lambda: (analysis.track(seconds / 2, seconds / 2 + 2), analysis.spectrogram(seconds / 2, seconds / 2 + 2))
+
+#Saved analysis against the recording plus its float64 spectrogram
+@benchmark('saved analysis size', sizes=[300], kind='values')
+def setup_analysis_size(seconds, folder, frame_size=2048, hop=512):
+    def run():
+        input_file = _test_recording(folder, seconds)
+        frames = (seconds * 44100 - frame_size) // hop + 1
+        raw = os.path.getsize(input_file) + frames * (frame_size // 2 + 1) * 8
+        analysis = export_analysis(input_file, os.path.join(folder, f'uint8_{seconds}'))
+        half = export_analysis(input_file, os.path.join(folder, f'float16_{seconds}'), spectrum='float16', max_frequency=None)
+        return {'wav + float64 spectrogram (MB)': raw / 1e6, 'uint8 to 8 kHz (MB)': analysis.size() / 1e6,
+                'float16 every bin (MB)': half.size() / 1e6, 'uint8 size of raw (%)': 100 * analysis.size() / raw}
+    return run
+
+
+# BatchAnalysis.py
+############################################################################################
+#Sixteen 20 s recordings by number of worker processes
+@benchmark('analyze_files 16 recordings', sizes=sorted({1, 2, os.cpu_count() or 1}))
+def setup_batch_analysis(workers, folder, files=16, seconds=20):
+    paths = [os.path.join(folder, f'student_{i}.wav') for i in range(files)]
+    for path in paths:
+        if not os.path.exists(path):
+            wave_to_wav_stream(lambda: song_chunks([('A4', 1), ('B3', 1)] * (seconds // 2), 60), output_file=path)
+    return lambda: analyze_files(paths, workers, progress=False)
+
+
+# Intonation.py
+############################################################################################
+#Hot Cross Buns repeated for the given seconds and played 5% slow
+@benchmark('Intonation align', sizes=[60, 300])
+def setup_intonation(seconds, folder):
+    bpm, notes = parse_song(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'HotCrossBuns.txt'))
+    notes = notes * int(np.ceil(seconds / score_timeline(notes, bpm)['end'][-1]))
+    timeline = score_timeline(notes, bpm)
+    track = pitch_track(render_song(notes, bpm * 0.95))
+    return lambda: align(track, timeline)
+
+
+# AudioBackend.py
+############################################################################################
+#The list_audio_devices that started and terminated PortAudio on every call
+def legacy_list_audio_devices():
+    import pyaudio
+    p = pyaudio.PyAudio()
+    info = p.get_host_api_info_by_index(0)
+    devices = [p.get_device_info_by_host_api_device_index(0, i).get('name') for i in range(info.get('deviceCount'))]
+    p.terminate()
+    return devices
+
+#The shared backend, or Unavailable on a machine with no audio system
+def _audio_system():
+    from AudioBackend import shared_audio
+    try:
+        return shared_audio()
+    except Exception as error:
+        raise Unavailable(f'no audio system: {error}')
+
+@benchmark('list_audio_devices legacy', sizes=[1])
+def setup_legacy_list_audio_devices(size, folder):
+    _audio_system()
+    return legacy_list_audio_devices
+
+@benchmark('list_audio_devices pooled', sizes=[1])
+def setup_list_audio_devices(size, folder):
+    from setupMicrophone import list_audio_devices
+    audio = _audio_system()
+    return lambda: list_audio_devices(audio)
+
+#A fake source pushing samples through AudioCapture with no real time pacing
+@benchmark('fake capture', sizes=[10, 60])
+def setup_fake_capture(seconds, folder):
+    from AudioBackend import FakeAudio
+    from recordAudio import AudioCapture
+    audio = FakeAudio.tone(seconds, [220], speed=0)
+    def capture():
+        recorder = AudioCapture(chunk_size=1024, audio=audio, max_frames=len(audio.signal), metrics=Metrics(enabled=False))
+        recorder.start()
+        recorder.wait()
+        recorder.stop()
+    return capture
+
+
+# PitchSmoother.py
+############################################################################################
+#Estimates of a noisy held 196 Hz note, every 37th made an octave too high as a
+#tracker locking onto a harmonic would
+def _noisy_estimates(seconds, frame_size=4096, hop=256):
+    wave = generate_sine_wave(duration=seconds, frequency=196)
+    wave += np.random.default_rng(0).normal(0, 0.1, len(wave))
+    frames = frame_signal(wave, frame_size, hop)
+    frequencies, confidences = PitchTracker(44100, frame_size, hop).estimate_batch(frames)
+    frequencies[18::37] *= 2
+    return frequencies, confidences, stft(wave, frame_size, hop)
+
+def _smooth(frequencies, confidences, spectra):
+    smoother = PitchSmoother()
+    return np.array([smoother.update(frequencies[i], confidences[i], spectra[i]) for i in range(len(frequencies))])
+
+@benchmark('PitchSmoother.update', sizes=[5])
+def setup_pitch_smoother(seconds, folder):
+    estimates = _noisy_estimates(seconds)
+    return lambda: _smooth(*estimates)
+
+#Jitter of the noisy note before and after smoothing
+@benchmark('pitch smoother jitter', sizes=[5], kind='values')
+def setup_pitch_smoother_jitter(seconds, folder):
+    def run():
+        frequencies, confidences, spectra = _noisy_estimates(seconds)
+        smoothed = _smooth(frequencies, confidences, spectra)
+        raw, smooth = 1200 * np.log2(frequencies[frequencies > 0] / 196), 1200 * np.log2(smoothed[smoothed > 0] / 196)
+        return {'raw jitter (cents)': float(np.std(raw)), 'smoothed jitter (cents)': float(np.std(smooth)),
+                'raw worst error (cents)': float(np.max(np.abs(raw))), 'smoothed worst error (cents)': float(np.max(np.abs(smooth)))}
+    return run
+
+
+# LiveTuner.py
+############################################################################################
+#5 s played in real time to a headless tuner with 4096 sample frames, by hop
+#size, whose display takes 50 ms per frame
+@benchmark('live tuner with a 50 ms redraw', sizes=[256, 1024], kind='values')
+def setup_live_tuner(hop_size, folder, seconds=5, redraw=0.05, frame_size=4096):
+    from AudioBackend import FakeAudio
+    from LiveTuner import LiveTuner
+    def run():
+        signal = generate_sine_wave(duration=seconds, frequency=220) * 10000
+        tuner = LiveTuner(chunk_size=hop_size, frame_size=frame_size, hop_size=hop_size, audio=FakeAudio(signal, 44100, speed=1),
+                          metrics=Metrics(enabled=False))
+        stats = tuner.run_headless(on_reading=lambda reading: time.sleep(redraw))
+        return {'update rate (Hz)': stats['update rate (Hz)'],
+                'cpu per hop': stats['cpu per hop (ms)'] / 1000,
+                'hop budget': hop_size / 44100,
+                'analysis latency mean': stats['analysis latency mean (ms)'] / 1000,
+                'analysis latency max': stats['analysis latency max (ms)'] / 1000,
+                'display latency max': stats['display latency max (ms)'] / 1000,
+                'readings (count)': stats['readings'],
+                'readings not displayed (count)': stats['readings not displayed'],
+                'dropped frames (count)': stats['dropped frames']}
+    return run
+
+
+# EnsembleTuner.py
+############################################################################################
+#Analysis of 5 s on several channels of one device, hop by hop as the drain
+#thread hands blocks over; under 5 s the channels keep up with real time
+@benchmark('EnsembleTuner 5 s by channels', sizes=[1, 2, 4, 8])
+def setup_ensemble_tuner(channels, folder, seconds=5, hop_size=256):
+    from AudioBackend import FakeAudio
+    from EnsembleTuner import EnsembleTuner
+    signal = FakeAudio.channel_tones(seconds, [220 * 2 ** (channel / 12) for channel in range(channels)]).signal.astype(np.int16)
+    blocks = [signal[start:start + hop_size] for start in range(0, len(signal) - hop_size + 1, hop_size)]
+    def analyze():
+        tuner = EnsembleTuner([(0, channels)], hop_size, hop_size=hop_size, audio=FakeAudio([0]), metrics=Metrics(enabled=False))
+        for block in blocks:
+            tuner._analyze(0, block.T)
+        tuner.stop()
+    return analyze
+
+
+# AsyncTuner.py
+############################################################################################
+#Seconds from a reading being analyzed to a TCP client receiving it, by number
+#of clients sharing the same analysis
+@benchmark('AsyncTuner TCP delivery', sizes=[1, 8], kind='values')
+def setup_async_tuner(clients, folder, seconds=5):
+    import asyncio
+    from AudioBackend import FakeAudio
+    from LiveTuner import LiveTuner
+    from AsyncTuner import AsyncTuner, TunerServer, subscribe
+    def run():
+        live_tuner = LiveTuner(audio=FakeAudio.tone(seconds, [220], speed=4), metrics=Metrics(enabled=False))
+        analyzed = {}
+
+        async def receive(port):
+            delays = []
+            async for frame in subscribe(port=port):
+                delays.append(time.perf_counter() - analyzed[frame['sequence']])
+            return delays
+
+        async def serve():
+            tuner = AsyncTuner(live_tuner)
+            publish = live_tuner.on_reading
+            live_tuner.on_reading = lambda reading: (analyzed.__setitem__(reading.sequence, reading.analyzed), publish(reading))
+            server = TunerServer(tuner, port=0)
+            await server.start()
+            tasks = [asyncio.create_task(receive(server.port)) for _ in range(clients)]
+            while server.clients < clients:
+                await asyncio.sleep(0.01)
+            await tuner.start()
+            delays = await asyncio.gather(*tasks)
+            await tuner.stop()
+            await server.stop()
+            return delays
+
+        delays = np.concatenate(asyncio.run(serve()))
+        return {'latency p50': float(np.percentile(delays, 50)), 'latency max': float(delays.max()),
+                'frames each (count)': len(delays) // clients, 'readings analyzed (count)': live_tuner.readings}
+    return run
+
+
+# Metrics.py
+############################################################################################
+#Live analysis of 5 s, hop by hop as the live tuner does it
+def _live_analysis(seconds, metrics, hop_size=256):
+    from AudioBackend import FakeAudio
+    from LiveTuner import LiveTuner
+    blocks = (generate_sine_wave(duration=seconds, frequency=220) * 10000).astype(np.int16).reshape(-1, 1)
+    blocks = [blocks[start:start + hop_size] for start in range(0, len(blocks) - hop_size + 1, hop_size)]
+    def analyze():
+        tuner = LiveTuner(hop_size=hop_size, audio=FakeAudio([0]), metrics=metrics())
+        for block in blocks:
+            tuner._analyze(block)
+        return tuner
+    return analyze, len(blocks)
+
+@benchmark('live analysis, metrics off', sizes=[5])
+def setup_metrics_off(seconds, folder):
+    return _live_analysis(seconds, lambda: Metrics(enabled=False))[0]
+
+@benchmark('live analysis, metrics on', sizes=[5])
+def setup_metrics_on(seconds, folder):
+    return _live_analysis(seconds, Metrics)[0]
+
+@benchmark('Histogram.record', sizes=[10000])
+def setup_histogram_record(count, folder):
+    histogram = Histogram()
+    return lambda: [histogram.record(1e-4) for _ in range(count)]
+
+#The on/off difference is lost in run to run noise, so the cost is also worked
+#out from the number of timings recorded per hop
+@benchmark('metrics overhead', sizes=[5], kind='values')
+def setup_metrics_overhead(seconds, folder):
+    def run():
+        analyze, hops = _live_analysis(seconds, Metrics)
+        tuner = analyze()
+        histogram = Histogram()
+        per_record = measure(lambda: [histogram.record(1e-4) for _ in range(10000)])['min'] / 10000
+        off = measure(_live_analysis(seconds, lambda: Metrics(enabled=False))[0])['min']
+        timings = sum(timer.snapshot()['count'] for timer in tuner.metrics.timers.values()) + 2 * hops
+        return {'one timing recorded': per_record, 'timings per hop (count)': round(timings / hops),
+                'estimated overhead (%)': 100 * timings * per_record / off}
+    return run
+
+
+# LoggingSetup.py
+############################################################################################
+#The synchronous colored FileHandler log_setup attached before the queue
+def legacy_log_setup(log_file, level=logging.INFO, color={'INFO' : 'blue'}):
+    import colorlog
+    logger = logging.getLogger()
+    logger.setLevel(level)
+    formatter = colorlog.ColoredFormatter("%(log_color)s%(levelname)-8s%(reset)s %(message)s",log_colors=color)
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return file_handler
+
+#Time per call, on the calling thread, of a hot loop that logs every time
+#through, e.g. cents_off given silence, with logging off and with each setup on
+@benchmark('logging in a hot loop, per call', sizes=[20000], kind='values')
+def setup_logging(count, folder):
+    loop = lambda: [cents_off(0) for _ in range(count)]
+    per_call = lambda func: measure(func)['min'] / count
+    def run():
+        root = logging.getLogger()
+        level = root.level
+        log_file = os.path.join(folder, 'bench.log')
+        results = {'no logging': per_call(lambda: [cents_off(440) for _ in range(count)])}
+        root.setLevel(logging.INFO)
+        results['debug off'] = per_call(loop)
+        handler = legacy_log_setup(log_file, logging.DEBUG)
+        results['debug on, FileHandler'] = per_call(loop)
+        root.removeHandler(handler)
+        handler.close()
+        log_setup(logging.DEBUG, {'DEBUG': 'red'}, log_file)
+        results['debug on, queue'] = per_call(loop)
+        start = time.perf_counter()
+        log_shutdown()
+        results['writing out the queue'] = time.perf_counter() - start
+        root.setLevel(level)
+        return results
+    return run
+
+
+# SoundByte.py
+############################################################################################
+#Wall time of a fresh process running each CLI command, against an empty Python
+#as the floor that no command can beat
+@benchmark('SoundByte.py cold start', sizes=['python -c pass', 'tune', 'synth', 'render-song', 'analyze'])
+def setup_cold_start(command, folder):
+    here = os.path.dirname(os.path.abspath(__file__))
+    song_file = _test_song(folder, 10)
+    recording = os.path.join(folder, 'cold_start.wav')
+    if not os.path.exists(recording):
+        read_song(song_file, recording)
+    arguments = {'python -c pass': ['-c', 'pass'],
+                 'tune': ['tune', '442', 'Bb3'],
+                 'synth': ['synth', 'C4', 'E4', 'G4', '-o', os.path.join(folder, 'chord.wav')],
+                 'render-song': ['render-song', song_file, '-o', os.path.join(folder, 'song.wav')],
+                 'analyze': ['analyze', recording]}[command]
+    if command != 'python -c pass':
+        arguments = [os.path.join(here, 'SoundByte.py')] + arguments
+    return lambda: subprocess.run([sys.executable] + arguments, cwd=folder, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+#Runs the suite
+#Arguments: (string) only runs benchmarks whose name contains this
+#           (float) min_time seconds to time each size for
+#Returns: (dict) results ready to be saved as JSON; benchmarks that cannot run
+#         here are listed under 'skipped' with the reason
+def run_suite(select=None, min_time=0.2):
+    results = {}
+    skipped = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for name, (setup, sizes, kind) in suite.items():
+            if select and select not in name:
+                continue
+            try:
+                runs = {str(size): setup(size, folder) for size in sizes}
+            except (ImportError, Unavailable) as error:
+                skipped[name] = str(error)
+                continue
+            if kind == 'values':
+                results[name] = {size: {'values': run()} for size, run in runs.items()}
+            else:
+                results[name] = {size: measure(run, min_time) for size, run in runs.items()}
+    return {'machine': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                        'processor': platform.processor(), 'cpus': os.cpu_count()},
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'results': results,
+            'skipped': skipped}
+
+
+#True for a value label with no unit, which is in seconds
+def _is_seconds(label):
+    return not label.endswith(')')
+
+#Compares the best times of two runs, which are less disturbed by other work
+#on the machine than the medians, and the seconds measured by 'values' benchmarks
+#Arguments: (dict) baseline run
+#           (dict) current run
+#           (float) threshold ratio of current to baseline counted as a regression
+#Returns: list of (name, size, baseline seconds, current seconds, ratio, regressed) tuples
+def compare_runs(baseline, current, threshold=1.2):
+    rows = []
+    for name, sizes in current['results'].items():
+        for size, stats in sizes.items():
+            before = baseline['results'].get(name, {}).get(size)
+            if before is None:
+                continue
+            if 'values' in stats:
+                pairs = [(f'{name}: {label}', before['values'][label], value) for label, value in stats['values'].items()
+                         if _is_seconds(label) and before['values'].get(label)]
+            else:
+                pairs = [(name, before['min'], stats['min'])]
+            for row_name, old, new in pairs:
+                ratio = new / old
+                rows.append((row_name, size, old, new, ratio, ratio > threshold))
+    return rows
+
+
+#Formats seconds with a unit that suits them
+def format_time(seconds):
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:9.2f} us'
+    if seconds < 1:
+        return f'{seconds * 1e3:9.2f} ms'
+    return f'{seconds:9.2f} s '
+
+#Formats a measured value by the unit its label ends in
+def format_value(label, value):
+    units = {'(MB)': 'MB', '(Hz)': 'Hz', '(%)': '%', '(cents)': 'cents'}
+    for suffix, unit in units.items():
+        if label.endswith(suffix):
+            return f'{value:9.2f} {unit}'
+    if label.endswith('(count)'):
+        return f'{value:9d}'
+    return format_time(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the synthesis, analysis and live paths across input sizes')
+    parser.add_argument('-k', '--select', help='only run benchmarks whose name contains this')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds to time each size for')
+    parser.add_argument('--json', help='save the results to this file')
+    parser.add_argument('--compare', help='earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2, help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    run = run_suite(args.select, args.min_time)
+    for name, sizes in run['results'].items():
+        print("\033[33m" + name + "\033[0m")
+        for size, stats in sizes.items():
+            if 'values' in stats:
+                for label, value in stats['values'].items():
+                    print(f"    {size:>8}  {label:<36} {format_value(label, value)}")
+            else:
+                print(f"    {size:>8}  median {format_time(stats['median'])}  min {format_time(stats['min'])}  ({stats['rounds']} rounds)")
+    for name, reason in run['skipped'].items():
+        print(f"\033[33m{name}\033[0m skipped: {reason}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare_runs(baseline, run, args.threshold)
+        print(f"\033[33mCompared with {args.compare} ({baseline['date']})\033[0m")
+        for name, size, before, after, ratio, regressed in rows:
+            color = "\033[91m" if regressed else "\033[92m" if ratio < 1 / args.threshold else ""
+            print(f"    {color}{name:<20} {size:>8} {format_time(before)} -> {format_time(after)}  x{ratio:.2f}\033[0m")
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import math
+import numpy as np
+from PitchTrack import frame_signal
+from pitch import C0, freq_to_pitch
+
+
+#Multi-pitch estimator for chords, by harmonic sums with iterative cancellation
+#(after Klapuri, 2006). Every semitone from fmin to fmax is a candidate whose
+#salience is the weighted sum of the spectrum at its first few harmonics, for
+#all frames at once as one matrix product. The most salient candidate whose
+#fundamental is actually present is taken, refined to the spectral peak, and
+#its harmonics are removed from the spectrum before looking for the next note,
+#so a note's own harmonics are not reported as notes. Only spectral peaks count
+#towards the sums. Notes stop being added once their salience falls below
+#threshold times the first note's.
+#Hann windowed frames of frame_size samples resolve notes at least two FFT bins
+#(2 * sample_rate / frame_size Hz) apart; closer notes merge into one
+class ChordDetector:
+    def __init__(self, sample_rate=44100, frame_size=4096, fmin=80, fmax=2000, harmonics=5, max_notes=4, threshold=0.2,
+                 min_amplitude=0.005):
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.max_notes = max_notes
+        self.threshold = threshold
+        self.min_amplitude = min_amplitude
+        self.window = np.hanning(frame_size)
+        # Scales the spectrum of a full scale sine to 1
+        self.scale = 2 / self.window.sum()
+        self.bin_width = sample_rate / frame_size
+        bins = frame_size // 2 + 1
+
+        semitones = np.arange(math.ceil(12 * math.log2(fmin / C0)), math.floor(12 * math.log2(fmax / C0)) + 1)
+        self.candidates = C0 * 2 ** (semitones / 12)
+        self.harmonics = np.arange(1, harmonics + 1)
+        centres = np.rint(np.outer(self.candidates, self.harmonics) / self.bin_width).astype(np.int64)
+        # Salience of every candidate is spectrum @ weights, with harmonic h weighted 1/h
+        self.weights = np.zeros((bins, len(self.candidates)))
+        columns = np.arange(len(self.candidates))
+        for h in range(harmonics):
+            inside = centres[:, h] < bins
+            self.weights[centres[inside, h], columns[inside]] = 1 / self.harmonics[h]
+        self.fundamental_bins = centres[:, 0]
+        # Bins within half a semitone of each candidate, searched for its peak
+        self.half_widths = np.maximum(1, np.floor(self.candidates * (2 ** (1 / 24) - 1) / self.bin_width)).astype(np.int64)
+        self.search = np.arange(-self.half_widths.max(), self.half_widths.max() + 1)
+        # Bins cleared around each harmonic of a found note, the Hann main lobe
+        self.lobe = np.arange(-2, 3)
+
+    #Scaled magnitude spectra of a batch of frames, in one rfft
+    #Arguments: (numpy array) frames shaped (frames, frame_size), full scale 1
+    #Returns: numpy array shaped (frames, frame_size // 2 + 1)
+    def spectra(self, frames):
+        return np.abs(np.fft.rfft(np.asarray(frames, dtype=np.float64) * self.window, axis=-1)) * self.scale
+
+    #Frequency and amplitude of the spectral peak near each chosen candidate,
+    #with parabolic interpolation of the log magnitudes around it
+    def _refine(self, spectra, best):
+        rows = np.arange(len(spectra))
+        last = spectra.shape[1] - 1
+        search = np.clip(self.fundamental_bins[best][:, None] + self.search, 0, last)
+        values = spectra[rows[:, None], search]
+        values[np.abs(self.search) > self.half_widths[best][:, None]] = -1
+        peak = search[rows, values.argmax(axis=1)]
+        left, middle, right = (np.log(spectra[rows, np.clip(peak + shift, 0, last)] + 1e-12) for shift in (-1, 0, 1))
+        denominator = left - 2 * middle + right
+        offset = np.divide(0.5 * (left - right), denominator, out=np.zeros(len(rows)), where=denominator < 0)
+        return (peak + np.clip(offset, -0.5, 0.5)) * self.bin_width, spectra[rows, peak]
+
+    #Finds the notes in a batch of spectra, e.g. from spectra() or a LiveTuner reading
+    #Arguments: (numpy array) spectra shaped (frames, frame_size // 2 + 1), full scale 1
+    #Returns: numpy array of frequencies shaped (frames, max_notes), ascending with 0 after the last note,
+    #         numpy array of the salience of each note
+    def detect_spectra(self, spectra):
+        # Copied, as found notes are cancelled from it
+        spectra = np.array(spectra, dtype=np.float64, ndmin=2)
+        frames, bins = spectra.shape
+        rows = np.arange(frames)
+        frequencies = np.zeros((frames, self.max_notes))
+        salience = np.zeros((frames, self.max_notes))
+        active = np.ones(frames, dtype=bool)
+        peaks = np.empty_like(spectra)
+        pooled = np.empty_like(spectra)
+        for n in range(self.max_notes):
+            # Only local maxima count, so a strong note's leakage into the next bins is not a note of its own
+            peaks[:] = 0
+            middle = spectra[:, 1:-1]
+            is_peak = (middle >= spectra[:, :-2]) & (middle > spectra[:, 2:]) & (middle >= self.min_amplitude)
+            np.copyto(peaks[:, 1:-1], middle, where=is_peak)
+            # Each bin takes the largest of itself and its neighbours, allowing slightly out of tune harmonics
+            np.maximum(peaks[:, :-1], peaks[:, 1:], out=pooled[:, :-1])
+            pooled[:, -1] = peaks[:, -1]
+            np.maximum(pooled[:, 1:], peaks[:, :-1], out=pooled[:, 1:])
+            scores = pooled @ self.weights
+            scores[pooled[:, self.fundamental_bins] == 0] = 0
+            best = scores.argmax(axis=1)
+            score = scores[rows, best]
+            if n == 0:
+                first = score
+            active &= (score > 0) & (score >= self.threshold * first)
+            if not active.any():
+                break
+            found = rows[active]
+            frequency, amplitude = self._refine(spectra[found], best[found])
+            frequencies[found, n] = frequency
+            salience[found, n] = score[found]
+            # The fundamental is removed, and each harmonic h loses the 1/h of the
+            # fundamental's amplitude a sawtooth like tone would put there, so a
+            # note an octave or a twelfth above is still found
+            cancel = np.rint(np.outer(frequency, self.harmonics) / self.bin_width).astype(np.int64)
+            cancel = np.clip(cancel[:, :, None] + self.lobe, 0, bins - 1).reshape(len(found), -1)
+            expected = np.outer(amplitude, 1 / self.harmonics)
+            expected[:, 0] = np.inf
+            expected = np.repeat(expected, len(self.lobe), axis=1)
+            spectra[found[:, None], cancel] = np.maximum(spectra[found[:, None], cancel] - expected, 0)
+
+        order = np.argsort(np.where(frequencies > 0, frequencies, np.inf), axis=1)
+        return np.take_along_axis(frequencies, order, axis=1), np.take_along_axis(salience, order, axis=1)
+
+    #Finds the notes in a batch of frames
+    #Arguments: (numpy array) frames shaped (frames, frame_size), full scale 1
+    #Returns: as detect_spectra
+    def detect_batch(self, frames):
+        return self.detect_spectra(self.spectra(frames))
+
+    #Names the notes in a single frame
+    #Arguments: (numpy array) frame of frame_size samples, full scale 1
+    #Returns: tuple of note names, lowest first
+    def notes(self, frame):
+        return chord_names(self.detect_batch(np.asarray(frame)[None])[0])[0]
+
+
+#Names the notes found in each frame
+#Arguments: (numpy array) frequencies shaped (frames, notes), 0 where there is no note
+#Returns: list of tuples of note names
+def chord_names(frequencies):
+    return [tuple(freq_to_pitch(frequency) for frequency in row if frequency > 0) for row in np.atleast_2d(frequencies)]
+
+
+#Finds the notes sounding in every frame of a wave
+#Arguments: (numpy array) wave, full scale 1
+#           (int) sample_rate defaults to 44100
+#           (int) frame_size samples per frame
+#           (int) hop samples between frame starts
+#           (int) batch frames analyzed per FFT call, which bounds memory use
+#           other arguments as ChordDetector
+#Returns: numpy array of frame centre times, numpy array of frequencies shaped (frames, max_notes)
+def detect_chords(wave, sample_rate=44100, frame_size=4096, hop=1024, batch=256, **settings):
+    detector = ChordDetector(sample_rate, frame_size, **settings)
+    frames = frame_signal(np.asarray(wave, dtype=np.float64), frame_size, hop)
+    times = (np.arange(len(frames)) * hop + frame_size / 2) / sample_rate
+    blocks = [detector.detect_batch(frames[start:start + batch])[0] for start in range(0, len(frames), batch)]
+    return times, np.concatenate(blocks) if blocks else np.zeros((0, detector.max_notes))
@@ -0,0 +1,151 @@
+import argparse
+import concurrent.futures
+import os
+import time
+from LiveTuner import LiveTuner, readout
+from AudioBackend import FakeAudio
+from recordAudio import MultiCapture
+from Metrics import metrics as shared_metrics
+
+#Tunes a whole ensemble at once, one instrument per input channel. A
+#MultiCapture records every device through its own stream and ring buffer,
+#and each channel has a LiveTuner of its own, holding that channel's pitch
+#tracker and smoother and sharing its device's capture. The channels of every
+#block are analyzed side by side: the device's drain thread takes the first
+#channel itself and hands the rest to a thread pool, then waits for them all,
+#so a channel's blocks are still analyzed one at a time and in order. numpy
+#lets go of the GIL inside the FFTs and array arithmetic, which is where most
+#of a hop's time goes, so channels overlap on a machine with several cores
+#Arguments for sources: list of (device_index, channels) pairs
+#              audio: one backend for every device, or a list of one per device
+#              workers: threads in the pool, defaults to one per channel after the first,
+#                       which the drain thread analyzes itself, up to the cores
+#              other arguments as LiveTuner
+class EnsembleTuner:
+    def __init__(self, sources, chunk_size=256, sample_rate=44100, frame_size=4096, hop_size=256, max_backlog=None, audio=None,
+                 smoothing=True, chords=False, workers=None, metrics=None):
+        self.sample_rate = sample_rate
+        self.metrics = shared_metrics if metrics is None else metrics
+        self.capture = MultiCapture(sources, None, chunk_size, sample_rate=sample_rate, on_chunk=self._analyze, audio=audio,
+                                    metrics=self.metrics)
+        # tuners[source][channel], and labels such as '2:1' for device 2, channel 1
+        self.tuners = [[LiveTuner(device, chunk_size, sample_rate, frame_size, hop_size, max_backlog, smoothing=smoothing, chords=chords,
+                                  metrics=self.metrics, channel=channel, capture=capture)
+                        for channel in range(channels)]
+                       for (device, channels), capture in zip(self.capture.sources, self.capture.captures)]
+        self.labels = [f'{device}:{channel}' for device, channels in self.capture.sources for channel in range(channels)]
+        self.workers = workers or max(1, min(self.capture.channels - 1, os.cpu_count() or 1))
+        self.pool = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix='channel')
+        self.displayed = [-1] * self.capture.channels
+
+    def start(self):
+        self.capture.start()
+
+    def stop(self):
+        self.capture.stop()
+        self.pool.shutdown()
+
+    #Blocks until every input ends
+    #Arguments: (float) timeout in seconds, defaults to waiting forever
+    #Returns: (bool) True if every input ended
+    def wait(self, timeout=None):
+        return self.capture.wait(timeout)
+
+    #Runs on a device's drain thread for every block drained from its ring
+    #Arguments: (int) source, the device's place in sources
+    #           (numpy array) channels shaped (channels, samples)
+    def _analyze(self, source, channels):
+        tuners = self.tuners[source]
+        futures = [self.pool.submit(tuner._analyze_samples, samples) for tuner, samples in zip(tuners[1:], channels[1:])]
+        tuners[0]._analyze_samples(channels[0])
+        for future in futures:
+            future.result()
+
+    #Every channel's tuner, in the order of labels
+    def channel_tuners(self):
+        return [tuner for tuners in self.tuners for tuner in tuners]
+
+    #Returns the newest reading of every channel without waiting, None for a channel with none yet
+    def latest(self):
+        return [tuner.latest() for tuner in self.channel_tuners()]
+
+    #LiveTuner.stats of every channel, by label
+    #Returns: (dict) of dicts
+    def stats(self):
+        return {label: tuner.stats() for label, tuner in zip(self.labels, self.channel_tuners())}
+
+    #Runs without a window, polling the newest readings refresh times a second
+    #Arguments: (float) seconds to run, None runs until every input ends
+    #           (float) refresh rate of the simulated display in Hz
+    #           (function) on_readings called with the list of readings whenever any channel has a new one
+    #Returns: (dict) stats by label
+    def run_headless(self, seconds=None, refresh=30, on_readings=None):
+        self.start()
+        deadline = None if seconds is None else time.monotonic() + seconds
+        draw = self.metrics.histogram('draw')
+        try:
+            while self.capture.active():
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+                readings = self.latest()
+                sequences = [-1 if reading is None else reading.sequence for reading in readings]
+                if sequences != self.displayed and on_readings is not None:
+                    start = time.perf_counter()
+                    on_readings(readings)
+                    draw.record(time.perf_counter() - start)
+                self.displayed = sequences
+                time.sleep(1 / refresh)
+        except KeyboardInterrupt:
+            pass
+        self.stop()
+        return self.stats()
+
+
+#Reads a device as index or index:channels, e.g. 2:4 for the first 4 channels of device 2
+#Arguments: (string) value
+#Returns: (device_index, channels) pair
+def parse_source(value):
+    device, _, channels = value.partition(':')
+    try:
+        return int(device), int(channels or 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a device index or index:channels")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show the pitch of every channel of several microphones, or of fake inputs, at once')
+    parser.add_argument('--device', type=parse_source, nargs='+', default=[(0, 1)], help='devices to record from, as index or index:channels')
+    parser.add_argument('--input', nargs='+', help='.wav files to play instead of microphones, one device each with all of its channels')
+    parser.add_argument('--tone', type=float, nargs='+', help='play one device with a tone of each of these frequencies on its own channel')
+    parser.add_argument('--speed', type=float, default=1, help='playback speed of --input or --tone')
+    parser.add_argument('--seconds', type=float, default=None, help='seconds to run, defaults to until Ctrl+C or the end of the inputs')
+    parser.add_argument('--refresh', type=float, default=10, help='display updates per second')
+    parser.add_argument('--frame-size', type=int, default=4096, help='samples per analysis frame')
+    parser.add_argument('--hop', type=int, default=256, help='samples between frame starts')
+    parser.add_argument('--chunk', type=int, default=256, help='samples per audio callback')
+    parser.add_argument('--workers', type=int, help='analysis threads, defaults to one per channel after the first, up to the number of cores')
+    parser.add_argument('--raw', action='store_true', help='show the unsmoothed estimates')
+    parser.add_argument('--quiet', action='store_true', help='only print the stats at the end')
+    parser.add_argument('--metrics', help='save stage timings and counters here at the end, as .json or Prometheus .prom')
+    args = parser.parse_args(argv)
+
+    sources, audio = args.device, None
+    if args.input:
+        audio = [FakeAudio.from_wav(input_file, args.speed) for input_file in args.input]
+        sources = [(0, device.get_device_info_by_index(0)['maxInputChannels']) for device in audio]
+    elif args.tone:
+        audio = FakeAudio.channel_tones(args.seconds or 5, args.tone, speed=args.speed)
+        sources = [(0, len(args.tone))]
+    sample_rate = audio[0].sample_rate if isinstance(audio, list) else audio.sample_rate if audio is not None else 44100
+    tuner = EnsembleTuner(sources, args.chunk, sample_rate, args.frame_size, args.hop, audio=audio, smoothing=not args.raw,
+                          workers=args.workers)
+    show = None if args.quiet else lambda readings: print('  '.join(f"{label} {'-' if reading is None else readout(reading):<20}"
+                                                                   for label, reading in zip(tuner.labels, readings)))
+    for label, stats in tuner.run_headless(args.seconds, args.refresh, show).items():
+        print(f"{label}: {stats['readings']} readings, {stats['dropped frames']} dropped frames, "
+              f"{stats.get('cpu per hop (ms)', 0.0):.2f} ms cpu per hop, {stats.get('analysis latency p95 (ms)', 0.0):.1f} ms p95 latency")
+    if args.metrics:
+        tuner.metrics.write(args.metrics)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import argparse
+import numpy as np
+from PitchTrack import pitch_track
+from SongToWav import parse_song
+from WavIO import load_audio
+from pitch import pitches_to_freqs, tune_limits, tune_labels
+
+#Expected notes of a score, with times in seconds
+timeline_dtype = np.dtype([('pitch', 'U8'), ('frequency', np.float64), ('start', np.float64), ('end', np.float64)])
+#One row per score note: where it was found in the recording and how well it was played
+report_dtype = np.dtype([('pitch', 'U8'), ('expected_start', np.float64), ('start', np.float64), ('end', np.float64),
+                         ('frequency', np.float64), ('cents', np.float64), ('level', np.int64)])
+
+#Cost of a frame with no pitch, and the most a pitched frame can cost, in semitones
+unvoiced_cost = 0.5
+max_cost = 3.0
+#Cost per second a frame lies outside its note's expected time, which keeps
+#repeated notes of the same pitch apart
+timing_cost = 1.0
+
+
+#Lays the notes of a score out in time
+#Arguments: (list) (pitch, beats) tuples
+#           (int) bpm
+#Returns: numpy array of timeline_dtype rows
+def score_timeline(notes, bpm):
+    timeline = np.empty(len(notes), dtype=timeline_dtype)
+    beats = np.array([beat for _, beat in notes], dtype=np.float64)
+    ends = np.cumsum(beats * 60 / bpm)
+    timeline['pitch'] = [pitch for pitch, _ in notes]
+    timeline['frequency'] = pitches_to_freqs([pitch for pitch, _ in notes])
+    timeline['end'] = ends
+    timeline['start'] = ends - beats * 60 / bpm
+    return timeline
+
+#Finds the notes each frame may be matched to: those within band seconds of the
+#frame's time once the played part of the recording, from the first pitched
+#frame to the last, is stretched to the length of the score
+#Returns: (numpy array) frame times on the score's clock,
+#         (numpy array) first allowed note, (numpy array) one past the last allowed note
+def _note_band(track, timeline, band):
+    times = track['time']
+    frames, notes = len(times), len(timeline)
+    voiced = np.flatnonzero(track['frequency'] > 0)
+    first, last = (times[voiced[0]], times[voiced[-1]]) if len(voiced) > 1 else (times[0], times[-1])
+    score_times = (times - first) * timeline['end'][-1] / max(last - first, 1e-9)
+    lo = np.searchsorted(timeline['end'], score_times - band, side='right')
+    hi = np.searchsorted(timeline['start'], score_times + band, side='right')
+    # A path moves at most one note per frame and must start on the first note and end on the last
+    steps = np.arange(frames)
+    lo = np.minimum.accumulate(np.minimum(lo, steps) - steps) + steps
+    hi = np.maximum.accumulate((np.maximum(hi, notes - (frames - 1 - steps)) - steps)[::-1])[::-1] + steps
+    lo = np.clip(lo, 0, notes - 1)
+    hi = np.clip(np.maximum(hi, lo + 1), 1, notes)
+    lo[0], hi[-1] = 0, notes
+    return score_times, lo, hi
+
+#Aligns a pitch track to a score with dynamic time warping limited to a band
+#around the expected timing, so the work grows with the length of the piece
+#rather than its square. Every frame is matched to one note, in order
+#Arguments: (numpy array) track from PitchTrack.pitch_track
+#           (numpy array) timeline from score_timeline
+#           (float) band seconds the playing may drift from the score
+#Returns: numpy array with the note index of each frame
+def align(track, timeline, band=2.0):
+    frames, notes = len(track), len(timeline)
+    if frames < notes:
+        raise ValueError("align: the recording has fewer frames than the score has notes")
+    score_times, lo, hi = _note_band(track, timeline, band)
+    frequencies = track['frequency']
+    note_semitones = 12 * np.log2(timeline['frequency'])
+    starts, ends = timeline['start'], timeline['end']
+
+    def cost(j, l, h):
+        t = score_times[j]
+        early_or_late = np.maximum(0, np.maximum(starts[l:h] - t, t - ends[l:h]))
+        if frequencies[j] <= 0:
+            return unvoiced_cost + timing_cost * early_or_late
+        return np.minimum(np.abs(12 * np.log2(frequencies[j]) - note_semitones[l:h]), max_cost) + timing_cost * early_or_late
+
+    previous = np.full(notes, np.inf)
+    current = np.full(notes, np.inf)
+    previous[0] = cost(0, 0, 1)[0]
+    advanced = [None]
+    for j in range(1, frames):
+        l, h = lo[j], hi[j]
+        stay = previous[l:h]
+        advance = np.empty(h - l)
+        advance[0] = previous[l - 1] if l > 0 else np.inf
+        advance[1:] = previous[l:h - 1]
+        moved = advance < stay
+        if j > 1:
+            # Clear what this buffer held two frames ago
+            current[lo[j - 2]:hi[j - 2]] = np.inf
+        current[l:h] = cost(j, l, h) + np.where(moved, advance, stay)
+        advanced.append(moved)
+        previous, current = current, previous
+
+    assignment = np.empty(frames, dtype=np.int64)
+    note = notes - 1
+    for j in range(frames - 1, 0, -1):
+        assignment[j] = note
+        if advanced[j][note - lo[j]]:
+            note -= 1
+    assignment[0] = note
+    return assignment
+
+#Grades each note of a score against a pitch track
+#Arguments: (numpy array) track from PitchTrack.pitch_track
+#           (numpy array) timeline from score_timeline
+#           (float) band seconds the playing may drift from the score
+#Returns: numpy array of report_dtype rows; cents are positive when flat, as in pitch.cents_off
+def grade_notes(track, timeline, band=2.0):
+    assignment = align(track, timeline, band)
+    report = np.zeros(len(timeline), dtype=report_dtype)
+    report['pitch'] = timeline['pitch']
+    report['expected_start'] = timeline['start']
+    bounds = np.searchsorted(assignment, np.arange(len(timeline) + 1))
+    for i, (first, last) in enumerate(zip(bounds[:-1], bounds[1:])):
+        frames = track[first:last]
+        voiced = frames['frequency'][frames['frequency'] > 0]
+        report['start'][i] = frames['time'][0]
+        report['end'][i] = frames['time'][-1]
+        if len(voiced):
+            # Silence before or after a note is not part of it
+            played = frames['time'][frames['frequency'] > 0]
+            report['start'][i], report['end'][i] = played[0], played[-1]
+            report['frequency'][i] = np.median(voiced)
+            report['cents'][i] = 1200 * np.log2(timeline['frequency'][i] / report['frequency'][i])
+            report['level'][i] = np.searchsorted(tune_limits, abs(report['cents'][i]), side='right')
+        else:
+            report['cents'][i] = np.nan
+            report['level'][i] = len(tune_labels) - 1
+    return report
+
+#Grades a recording against a score file
+#Arguments: (string) score file path, as read by SongToWav.parse_song
+#           (string) recording file path
+#           (float) band seconds the playing may drift from the score
+#Returns: numpy array of report_dtype rows
+def score_recording(score_file, recording_file, band=2.0, frame_size=2048, hop=512):
+    bpm, notes = parse_song(score_file)
+    wave, sample_rate = load_audio(recording_file)
+    track = pitch_track(wave, sample_rate, frame_size, hop)
+    return grade_notes(track, score_timeline(notes, bpm), band)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Grade the intonation of each note of a recording against its score')
+    parser.add_argument('score', help='score file such as HotCrossBuns.txt')
+    parser.add_argument('recording', help='recording of the score')
+    parser.add_argument('--band', type=float, default=2.0, help='seconds the playing may drift from the score')
+    args = parser.parse_args(argv)
+
+    for row in score_recording(args.score, args.recording, args.band):
+        print(f"{row['pitch']:<4} {row['start']:7.2f}s {row['cents']:+7.1f} cents  {tune_labels[row['level']]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import argparse
+import collections
+import time
+import numpy as np
+from PitchTracker import PitchTracker
+from PitchSmoother import PitchSmoother
+from ChordDetector import ChordDetector, chord_names
+from Spectrum import rfft_frequencies
+from AudioBackend import FakeAudio
+from recordAudio import AudioCapture
+from Metrics import metrics as shared_metrics, StackSampler
+from pitch import freq_to_pitch, cents_off, tune_level
+
+#The newest analysis result. It is replaced as a whole, so the display never
+#sees half of an update. frequency is smoothed and note, cents and level
+#(pitch.tune_level) are worked out from it once, for every consumer to share;
+#raw_frequency and confidence are the tracker's own estimate, onset is set
+#when a note started since the last reading, and chord holds the names of the
+#notes sounding together, empty unless the tuner looks for chords
+Reading = collections.namedtuple('Reading', ['sequence', 'frequency', 'note', 'cents', 'level', 'raw_frequency', 'confidence', 'onset',
+                                             'chord', 'waveform', 'spectrum', 'arrived', 'analyzed'])
+
+
+#Live pitch display split across three threads:
+#  capture  - PyAudio's callback copies each block into AudioCapture's ring buffer
+#  analysis - AudioCapture's drain thread runs the pitch tracker and FFT on new blocks
+#  display  - whoever calls latest(), e.g. a matplotlib animation, only reads the newest Reading
+#A slow display therefore never holds up capture, and analysis that falls more
+#than max_backlog samples behind skips ahead instead of building up latency
+#Frames of frame_size samples overlap, starting every hop_size samples; a
+#chunk_size no larger than the hop gives one reading per hop. Every hop's
+#estimate goes through a PitchSmoother unless smoothing is False. With chords
+#a ChordDetector also names every note in the newest frame, reusing its spectrum
+#Each stage (read, fft, pitch, smooth, chords, note, draw) is timed into
+#metrics, along with the analysis and display latencies
+#Only one channel of the input is analyzed, channel 0 unless another is given.
+#A tuner can also be handed a capture it does not own, e.g. one device of a
+#MultiCapture, and be fed that channel's samples through _analyze_samples
+#on_reading, if given, is called with every new Reading on the analysis thread
+class LiveTuner:
+    def __init__(self, device_index=0, chunk_size=256, sample_rate=44100, frame_size=4096, hop_size=256,
+                 max_backlog=None, audio=None, smoothing=True, chords=False, metrics=None, channel=0, capture=None, on_reading=None):
+        self.chunk_size = chunk_size
+        self.sample_rate = sample_rate
+        self.tracker = PitchTracker(sample_rate, frame_size, hop_size)
+        self.smoother = PitchSmoother() if smoothing else None
+        self.chord_detector = ChordDetector(sample_rate, frame_size) if chords else None
+        self.max_backlog = max_backlog or 4 * frame_size
+        self.metrics = shared_metrics if metrics is None else metrics
+        self.channel = channel
+        self.on_reading = on_reading
+        if capture is None:
+            capture = AudioCapture(None, device_index, chunk_size, channels=channel + 1, sample_rate=sample_rate, on_chunk=self._analyze,
+                                   audio=audio, metrics=self.metrics)
+        self.capture = capture
+        self.times = {stage: self.metrics.histogram(stage) for stage in
+                      ('pitch', 'fft', 'smooth', 'note', 'chords', 'analysis latency', 'display latency', 'draw')}
+        self.window = np.hanning(frame_size)
+        self.frequencies = rfft_frequencies(frame_size, sample_rate)
+        # Scales the spectrum of a full scale int16 sine to 1
+        self.spectrum_scale = 2 / (32768 * self.window.sum())
+        self.reading = None
+        self.readings = 0
+        # Samples of the channel received so far, skipped ones included
+        self.received = 0
+        self.skipped = 0
+        self.hops = 0
+        self.onsets = 0
+        # Analysis thread CPU seconds, and perf_counter times of the first and last readings
+        self.cpu_time = 0.0
+        self.first_analyzed = None
+        self.displayed = 0
+        self.last_displayed = -1
+        # Seconds from a block reaching the callback to its reading being analyzed, and displayed
+        self.analysis_latency = collections.deque(maxlen=4096)
+        self.display_latency = collections.deque(maxlen=4096)
+
+    def start(self):
+        self.capture.start()
+
+    def stop(self):
+        self.capture.stop()
+
+    #Blocks until the input ends
+    #Arguments: (float) timeout in seconds, defaults to waiting forever
+    #Returns: (bool) True if the input ended
+    def wait(self, timeout=None):
+        return self.capture.wait(timeout)
+
+    #Runs on the analysis thread for every block drained from the ring
+    def _analyze(self, frames):
+        self._analyze_samples(frames[:, self.channel])
+
+    #Analyzes the new samples of this tuner's channel
+    #Arguments: (numpy array) samples, which may be a strided view of interleaved frames
+    def _analyze_samples(self, samples):
+        arrived = self.capture.chunk_arrival
+        cpu_start = time.thread_time()
+        times = self.times
+        self.received += len(samples)
+        if len(samples) > self.max_backlog:
+            # Fallen behind: drop the oldest samples rather than report stale pitches
+            self.skipped += len(samples) - self.max_backlog
+            self.metrics.count('samples skipped', len(samples) - self.max_backlog)
+            samples = samples[-self.max_backlog:]
+            self.tracker.reset()
+            if self.smoother is not None:
+                self.smoother.reset()
+        hops, onset = 0, False
+        for frame in self.tracker.iter_frames(samples):
+            start = time.perf_counter()
+            raw_frequency = self.tracker.estimate(frame)
+            pitched = time.perf_counter()
+            spectrum = np.abs(np.fft.rfft(frame * self.window)) * self.spectrum_scale
+            transformed = time.perf_counter()
+            times['pitch'].record(pitched - start)
+            times['fft'].record(transformed - pitched)
+            if self.smoother is None:
+                frequency = raw_frequency
+            else:
+                frequency = self.smoother.update(raw_frequency, self.tracker.confidence, spectrum)
+                onset = onset or self.smoother.onset
+                times['smooth'].record(time.perf_counter() - transformed)
+            hops += 1
+        self.metrics.count('samples analyzed', len(samples))
+        if hops == 0:
+            return
+        # The frame the newest pitch came from
+        waveform = self.tracker.recent().copy()
+        start = time.perf_counter()
+        if frequency > 0:
+            note, cents, level = freq_to_pitch(frequency), cents_off(frequency), tune_level(frequency)
+        else:
+            note, cents, level = 'None', np.nan, -1
+        chord = ()
+        looked_up = time.perf_counter()
+        times['note'].record(looked_up - start)
+        if self.chord_detector is not None:
+            # Once per reading rather than per hop, as only the newest is shown
+            chord = chord_names(self.chord_detector.detect_spectra(spectrum)[0])[0]
+            times['chords'].record(time.perf_counter() - looked_up)
+        analyzed = time.perf_counter()
+        self.reading = Reading(self.readings, frequency, note, cents, level, raw_frequency, self.tracker.confidence, onset,
+                               chord, waveform, spectrum, arrived, analyzed)
+        self.readings += 1
+        self.hops += hops
+        self.onsets += onset
+        self.metrics.count('hops', hops)
+        self.cpu_time += time.thread_time() - cpu_start
+        if self.first_analyzed is None:
+            self.first_analyzed = analyzed
+        self.analysis_latency.append(analyzed - arrived)
+        times['analysis latency'].record(analyzed - arrived)
+        if self.on_reading is not None:
+            self.on_reading(self.reading)
+
+    #Returns the newest reading without waiting, or None before the first one
+    #Each new reading returned counts as displayed
+    def latest(self):
+        reading = self.reading
+        if reading is not None and reading.sequence != self.last_displayed:
+            self.last_displayed = reading.sequence
+            self.displayed += 1
+            self.display_latency.append(time.perf_counter() - reading.arrived)
+            self.times['display latency'].record(self.display_latency[-1])
+        return reading
+
+    #Latency in milliseconds and the counts of dropped work so far
+    #Returns: (dict)
+    def stats(self):
+        stats = {'readings': self.readings,
+                 'displayed': self.displayed,
+                 'readings not displayed': self.readings - self.displayed,
+                 'dropped frames': self.capture.ring.overruns + self.skipped,
+                 'input overflows': self.capture.input_overflows,
+                 'hops': self.hops,
+                 'onsets': self.onsets}
+        if self.hops:
+            hop_seconds = self.tracker.hop_size / self.sample_rate
+            stats['cpu per hop (ms)'] = self.cpu_time / self.hops * 1000
+            stats['cpu load'] = self.cpu_time / self.hops / hop_seconds
+        if self.readings > 1:
+            stats['update rate (Hz)'] = (self.readings - 1) / (self.reading.analyzed - self.first_analyzed)
+        for name, latencies in (('analysis', self.analysis_latency), ('display', self.display_latency)):
+            if latencies:
+                values = np.array(latencies) * 1000
+                stats[f'{name} latency mean (ms)'] = float(values.mean())
+                stats[f'{name} latency p95 (ms)'] = float(np.percentile(values, 95))
+                stats[f'{name} latency max (ms)'] = float(values.max())
+        return stats
+
+    #Runs without a window, polling the newest reading refresh times a second
+    #Arguments: (float) seconds to run, None runs until the input ends
+    #           (float) refresh rate of the simulated display in Hz
+    #           (function) on_reading called with each new Reading, e.g. to print or draw it
+    #Returns: (dict) stats
+    def run_headless(self, seconds=None, refresh=30, on_reading=None):
+        self.start()
+        deadline = None if seconds is None else time.monotonic() + seconds
+        try:
+            while not self.capture.finished.is_set() and self.capture.stream.is_active():
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+                previous = self.last_displayed
+                reading = self.latest()
+                if reading is not None and reading.sequence != previous and on_reading is not None:
+                    start = time.perf_counter()
+                    on_reading(reading)
+                    self.times['draw'].record(time.perf_counter() - start)
+                time.sleep(1 / refresh)
+        except KeyboardInterrupt:
+            pass
+        self.stop()
+        return self.stats()
+
+
+#Formats a reading for display, e.g. "A4 12 cents flat"
+#Arguments: (Reading) reading
+#Returns: (string)
+def readout(reading):
+    if reading.frequency <= 0:
+        return 'None'
+    cents = round(reading.cents)
+    if cents == 0:
+        return f'{reading.note} in tune'
+    return f"{reading.note} {abs(cents)} cents {'flat' if cents > 0 else 'sharp'}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show the pitch of the microphone, or of a .wav file played in real time')
+    parser.add_argument('--input', help='.wav file to play instead of the microphone')
+    parser.add_argument('--tone', type=float, nargs='+', help='frequencies to play instead of the microphone')
+    parser.add_argument('--speed', type=float, default=1, help='playback speed of --input or --tone, 0 for as fast as possible')
+    parser.add_argument('--device', type=int, default=0, help='microphone to record from')
+    parser.add_argument('--seconds', type=float, default=None, help='seconds to run, defaults to until Ctrl+C or the end of the file')
+    parser.add_argument('--refresh', type=float, default=30, help='display updates per second')
+    parser.add_argument('--frame-size', type=int, default=4096, help='samples per analysis frame')
+    parser.add_argument('--hop', type=int, default=256, help='samples between frame starts')
+    parser.add_argument('--chunk', type=int, default=256, help='samples per audio callback')
+    parser.add_argument('--raw', action='store_true', help='show the unsmoothed estimates')
+    parser.add_argument('--chords', action='store_true', help='also show every note sounding')
+    parser.add_argument('--quiet', action='store_true', help='only print the stats at the end')
+    parser.add_argument('--metrics', help='save stage timings and counters here at the end, as .json or Prometheus .prom')
+    parser.add_argument('--metrics-port', type=int, help='serve the metrics on this port while running, at /metrics and /metrics.json')
+    parser.add_argument('--sample-stacks', action='store_true', help='sample every thread and print where the time went')
+    args = parser.parse_args(argv)
+
+    audio = None
+    if args.input:
+        audio = FakeAudio.from_wav(args.input, args.speed, mono=True)
+    elif args.tone:
+        audio = FakeAudio.tone(args.seconds or 5, args.tone, speed=args.speed)
+    sample_rate = audio.sample_rate if audio is not None else 44100
+    tuner = LiveTuner(args.device, args.chunk, sample_rate, args.frame_size, args.hop, audio=audio, smoothing=not args.raw,
+                      chords=args.chords)
+    show = None if args.quiet else lambda reading: print(f"{reading.frequency:8.2f} Hz  {readout(reading):<24} {' '.join(reading.chord)}")
+    if args.metrics_port is not None:
+        from Metrics import serve_metrics
+        serve_metrics(tuner.metrics, args.metrics_port)
+    sampler = StackSampler() if args.sample_stacks else None
+    if sampler is not None:
+        sampler.start()
+    for name, value in tuner.run_headless(args.seconds, args.refresh, show).items():
+        print(f"{name:<28} {value:.2f}" if isinstance(value, float) else f"{name:<28} {value}")
+    if sampler is not None:
+        sampler.stop()
+        for (thread, place), fraction in sampler.top(15):
+            print(f"{fraction:6.1%}  {thread:<12} {place}")
+    if args.metrics:
+        tuner.metrics.write(args.metrics)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,125 @@
-import colorlog
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 
-def log_setup (level=logging.INFO, color={'INFO' : 'blue'}):
+#Logging runs through a queue: the root logger only gets a QueueHandler, which
+#puts records on the queue without formatting them, and a QueueListener thread
+#formats them (colors and all) and writes them to a rotating log file. Code on
+#the audio thread therefore never waits on the disk or builds a message string
+_listener = None
+_queue_handler = None
+
+
+#Puts records on the queue as they are. The stock QueueHandler formats the
+#message on the logging thread first; here the listener does it, so log calls
+#must pass %-style arguments they will not change afterwards
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        return record
+
+
+#Writes formatted records to a log file, starting a new file once it would
+#pass max_bytes and keeping backup_count old ones as info.log.1, info.log.2, ...
+#as logging.handlers.RotatingFileHandler does. That handler flushes, and seeks
+#to measure the file, on every record; this one keeps count of the size and
+#only flushes when asked, which the listener does whenever the queue runs dry,
+#so a burst of records costs one write rather than one each
+class RotatingWriter(logging.Handler):
+    def __init__(self, log_file, max_bytes=2**20, backup_count=3):
+        super().__init__()
+        self.log_file = log_file
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file = None
+        self.size = 0
+
+    def emit(self, record):
+        try:
+            line = (self.format(record) + '\n').encode('utf-8')
+            if self.file is None:
+                self.file = open(self.log_file, 'ab')
+                self.size = self.file.tell()
+            if self.max_bytes and self.size and self.size + len(line) > self.max_bytes:
+                self.rotate()
+            self.file.write(line)
+            self.size += len(line)
+        except Exception:
+            self.handleError(record)
+
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f'{self.log_file}.{i}'):
+                os.replace(f'{self.log_file}.{i}', f'{self.log_file}.{i + 1}')
+        if self.backup_count:
+            os.replace(self.log_file, self.log_file + '.1')
+        self.file = open(self.log_file, 'wb')
+        self.size = 0
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        super().close()
+
+
+#Flushes its handlers each time it has emptied the queue
+class BatchingQueueListener(logging.handlers.QueueListener):
+    def dequeue(self, block):
+        try:
+            return self.queue.get(block=False)
+        except queue.Empty:
+            for handler in self.handlers:
+                handler.flush()
+            return self.queue.get(block=block)
+
+
+#Sets up logging to a file, replacing any earlier setup, so calling it again
+#changes the settings instead of adding a second handler
+#Arguments: (int) level
+#           (dict) colors of each level name, as colorlog takes them
+#           (string) log file path
+#           (int) max_bytes of the log file before it is rotated
+#           (int) backup_count rotated files to keep, e.g. info.log.1
+#Returns: N/A
+def log_setup (level=logging.INFO, color={'INFO' : 'blue'}, log_file='info.log', max_bytes=2**20, backup_count=3):
+    # colorlog is only needed by the listener, so it is not imported until logging is set up
+    import colorlog
+    global _listener, _queue_handler
+    log_shutdown()
+
+    folder = os.path.dirname(log_file)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    file_handler = RotatingWriter(log_file, max_bytes, backup_count)
+    file_handler.setFormatter(colorlog.ColoredFormatter("%(log_color)s%(levelname)-8s%(reset)s %(message)s", log_colors=color))
+
+    records = queue.SimpleQueue()
+    _listener = BatchingQueueListener(records, file_handler, respect_handler_level=True)
+    _queue_handler = DeferredQueueHandler(records)
     logger = logging.getLogger()
     logger.setLevel(level)
-    formatter = colorlog.ColoredFormatter("%(log_color)s%(levelname)-8s%(reset)s %(message)s",log_colors=color)
-    file_handler = logging.FileHandler('Python Files\\info.log')
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
\ No newline at end of file
+    logger.addHandler(_queue_handler)
+    _listener.start()
+
+
+#Writes out every queued record and removes the handler log_setup added
+#Runs at exit, and is safe to call when logging was never set up
+def log_shutdown():
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(log_shutdown)
@@ -0,0 +1,298 @@
+import cProfile
+import collections
+import contextlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import numpy as np
+
+#Timers, counters and gauges for the capture and analysis hot paths, cheap
+#enough to leave on: recording a time appends to a list, and gauges are only
+#read when the metrics are exported. Components take a
+#Metrics and default to the shared one, metrics, so a program's capture,
+#tuner and display all land in one place
+
+
+#Latency histogram in the style of HdrHistogram: nanoseconds are counted in
+#buckets whose width grows with the value, so every value is kept to within
+#1/64 (1.6%) from a nanosecond to about 20 minutes, in 2240 counters.
+#record() only appends to a list; every 4096 values, and whenever the
+#histogram is read, the list is sorted into the buckets in one numpy pass.
+#Threads may record into the same histogram, e.g. the channels of an EnsembleTuner
+class Histogram:
+    sub_bits = 7
+    buckets = (42 - sub_bits) << (sub_bits - 1)
+    batch = 4096
+
+    def __init__(self):
+        self.counts = np.zeros(self.buckets, dtype=np.int64)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pending = []
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    #Arguments: (float) value in seconds
+    def record(self, seconds):
+        self.pending.append(seconds)
+        if len(self.pending) >= self.batch:
+            self.fold()
+
+    #Moves the values recorded since the last call into the buckets
+    def fold(self):
+        with self.lock:
+            self._fold()
+
+    def _fold(self):
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        values = np.array(pending)
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        ns = np.maximum(values * 1e9, 0).astype(np.int64)
+        # The top sub_bits bits of each value, and how far down they sit
+        shift = np.maximum(np.frexp(ns)[1] - self.sub_bits, 0)
+        half = 1 << (self.sub_bits - 1)
+        index = np.where(shift > 0, (shift + 1) * half + ((ns >> shift) & (half - 1)), ns)
+        self.counts += np.bincount(np.minimum(index, self.buckets - 1), minlength=self.buckets)
+
+    #Smallest value in nanoseconds that falls into a bucket
+    def _bucket_start(self, index):
+        half = 1 << (self.sub_bits - 1)
+        if index < 2 * half:
+            return index
+        shift = (index >> (self.sub_bits - 1)) - 1
+        return (half | index & (half - 1)) << shift
+
+    #Value below which percent of the recorded values fall, to within a bucket
+    #Arguments: (float) percent between 0 and 100
+    #Returns: (float) seconds, 0 when nothing was recorded
+    def percentile(self, percent):
+        self.fold()
+        if self.count == 0:
+            return 0.0
+        rank = max(1, -(-self.count * percent // 100))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        # Middle of the bucket, kept within the values actually seen
+        middle = (self._bucket_start(index) + self._bucket_start(index + 1)) / 2e9
+        return min(max(middle, self.min), self.max)
+
+    def mean(self):
+        self.fold()
+        return self.total / self.count if self.count else 0.0
+
+    #Returns: (dict) count, sum, mean, min, max and percentiles in seconds
+    def snapshot(self):
+        self.fold()
+        return {'count': self.count, 'sum': self.total, 'mean': self.mean(), 'min': self.min if self.count else 0.0,
+                'max': self.max, 'p50': self.percentile(50), 'p90': self.percentile(90), 'p99': self.percentile(99),
+                'p99.9': self.percentile(99.9)}
+
+
+#Stands in for every histogram while metrics are off
+class NullHistogram:
+    def record(self, seconds):
+        pass
+
+null_histogram = NullHistogram()
+
+
+class Metrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.timers = collections.defaultdict(Histogram)
+        self.counters = collections.defaultdict(int)
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    #Adds one timing, e.g. record('fft', time.perf_counter() - start)
+    #Arguments: (string) name of the stage
+    #           (float) seconds
+    def record(self, name, seconds):
+        if self.enabled:
+            self.timers[name].record(seconds)
+
+    #The histogram of one stage, to hold on to in a hot loop and call record on
+    #directly. While the metrics are off it is a NullHistogram that keeps nothing
+    #Arguments: (string) name of the stage
+    #Returns: Histogram
+    def histogram(self, name):
+        return self.timers[name] if self.enabled else null_histogram
+
+    #Times the block inside a with statement
+    #Arguments: (string) name of the stage
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    #Arguments: (string) name, e.g. 'samples analyzed'
+    #           (int) amount to add
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] += amount
+
+    #Registers a function read only when exporting, e.g. a buffer's overrun count
+    #Arguments: (string) name
+    #           (function) returning a number
+    def gauge(self, name, read):
+        self.gauges[name] = read
+
+    def reset(self):
+        with self.lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    #Returns: (dict) every timer, counter and gauge, ready to be saved as JSON
+    def snapshot(self):
+        with self.lock:
+            return {'timers': {name: histogram.snapshot() for name, histogram in list(self.timers.items())},
+                    'counters': dict(self.counters),
+                    'gauges': {name: read() for name, read in list(self.gauges.items())}}
+
+    #Formats the metrics in the Prometheus text exposition format, with timers
+    #as summaries in seconds
+    #Arguments: (string) prefix of every metric name
+    #Returns: (string)
+    def prometheus(self, prefix='soundbyte'):
+        snapshot = self.snapshot()
+        lines = []
+        for name, timer in snapshot['timers'].items():
+            metric = _metric_name(prefix, name, 'seconds')
+            lines.append(f'# TYPE {metric} summary')
+            for quantile, key in (('0.5', 'p50'), ('0.9', 'p90'), ('0.99', 'p99'), ('0.999', 'p99.9')):
+                lines.append(f'{metric}{{quantile="{quantile}"}} {timer[key]:.9g}')
+            lines.append(f'{metric}_sum {timer["sum"]:.9g}')
+            lines.append(f'{metric}_count {timer["count"]}')
+        for name, value in snapshot['counters'].items():
+            metric = _metric_name(prefix, name, 'total')
+            lines += [f'# TYPE {metric} counter', f'{metric} {value}']
+        for name, value in snapshot['gauges'].items():
+            metric = _metric_name(prefix, name)
+            lines += [f'# TYPE {metric} gauge', f'{metric} {value}']
+        return '\n'.join(lines) + '\n'
+
+    #Writes the metrics to a file, as Prometheus text for .prom or .txt and JSON otherwise
+    #The file is replaced in one step, so a reader never sees half of it
+    #Arguments: (string) output file path
+    def write(self, output_file):
+        if output_file.endswith(('.prom', '.txt')):
+            text = self.prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=2)
+        partial = f'{output_file}.{os.getpid()}.tmp'
+        with open(partial, 'w') as f:
+            f.write(text)
+        os.replace(partial, output_file)
+
+#Shared by everything that is not handed a Metrics of its own
+metrics = Metrics()
+
+
+#e.g. ('soundbyte', 'analysis latency', 'seconds') -> soundbyte_analysis_latency_seconds
+def _metric_name(prefix, name, unit=None):
+    metric = re.sub(r'[^a-zA-Z0-9_]+', '_', f'{prefix}_{name}').strip('_').lower()
+    return f'{metric}_{unit}' if unit else metric
+
+
+#Serves the metrics over HTTP on a background thread, at /metrics as
+#Prometheus text and at /metrics.json as JSON
+#Arguments: (Metrics) metrics to serve, defaults to the shared one
+#           (int) port, 0 picks a free one
+#           (string) host, only this machine by default
+#Returns: the server; server.server_address holds the port, server.shutdown() stops it
+def serve_metrics(metrics_to_serve=None, port=9100, host='127.0.0.1'):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    source = metrics if metrics_to_serve is None else metrics_to_serve
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, kind = source.prometheus().encode(), 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body, kind = json.dumps(source.snapshot()).encode(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', kind)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+#Profiles the block inside a with statement with cProfile, which only sees the
+#thread that runs the block, and saves the stats for pstats or snakeviz
+#Arguments: (string) output file path
+@contextlib.contextmanager
+def profile(output_file):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_file)
+
+
+#Statistical profiler for every thread, e.g. the capture and analysis threads
+#cProfile cannot follow: a background thread looks at what each thread is
+#running every interval seconds and counts the functions it finds. The cost
+#falls on the sampling thread, and grows with the sampling rate, not the code
+class StackSampler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self.stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                code = frame.f_code
+                self.samples[(names.get(ident, str(ident)), f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')] += 1
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    #Most sampled places
+    #Arguments: (int) how many
+    #Returns: list of ((thread name, function and line), fraction of samples) tuples
+    def top(self, n=10):
+        total = sum(self.samples.values()) or 1
+        return [(place, count / total) for place, count in self.samples.most_common(n)]
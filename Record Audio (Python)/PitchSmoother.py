@@ -0,0 +1,142 @@
+import collections
+import math
+import numpy as np
+from pitch import C0
+
+
+#Streaming clean up of raw per frame pitch estimates for a steady tuner readout
+#Each update does a fixed amount of work, whatever has come before:
+#  confidence gate - frames below min_confidence count as silence, and after
+#                    hold silent frames the output drops to 0
+#  octave jumps    - a jump of a whole number of octaves is folded back onto the
+#                    current note unless it lasts octave_confirm frames
+#  median          - of the last median_size estimates, removing single frame glitches
+#  Kalman filter   - in semitones, steadying the readout while a note is held
+#  onsets          - spectral flux, a jump of more than note_change semitones
+#                    or the start of voicing; each restarts the median and the
+#                    filter so a new note shows at once instead of gliding in
+#A median of 3 delays a change of note by one frame
+class PitchSmoother:
+    def __init__(self, median_size=3, min_confidence=0.6, hold=2, octave_tolerance=0.5, octave_confirm=4, note_change=1.0,
+                 process_noise=0.001, measurement_noise=0.02, onset_threshold=0.3, refractory=4):
+        self.min_confidence = min_confidence
+        self.hold = hold
+        self.octave_tolerance = octave_tolerance
+        self.octave_confirm = octave_confirm
+        self.note_change = note_change
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.onset_threshold = onset_threshold
+        self.refractory = refractory
+        self.history = collections.deque(maxlen=median_size)
+        self.previous_spectrum = None
+        self.reset()
+
+    def reset(self):
+        self.history.clear()
+        self.previous_spectrum = None
+        self.state = math.nan
+        self.variance = 0.0
+        self.frequency = 0.0
+        self.unvoiced = self.hold + 1
+        self.octave_frames = 0
+        self.since_onset = self.refractory
+        self.flux = 0.0
+        self.onset = False
+
+    #Restarts the median and filter on a new note
+    def _restart(self):
+        self.history.clear()
+        self.state = math.nan
+        self.octave_frames = 0
+
+    #Half wave rectified spectral flux, as a fraction of the louder of the two
+    #frames. Only a frame with more energy than the last can be an onset, so the click
+    #of a note stopping is not taken for one
+    #Arguments: (numpy array) magnitude spectrum of the frame
+    #Returns: (bool) True if the flux marks an onset
+    def _spectral_onset(self, spectrum):
+        previous, self.previous_spectrum = self.previous_spectrum, spectrum
+        if previous is None or len(previous) != len(spectrum):
+            return False
+        total = max(spectrum.sum(), previous.sum())
+        self.flux = float(np.maximum(spectrum - previous, 0).sum() / total) if total > 0 else 0.0
+        return self.flux > self.onset_threshold and np.dot(spectrum, spectrum) > np.dot(previous, previous)
+
+    #Adds one frame's raw estimate
+    #Arguments: (float) frequency in Hz, 0 if no pitch was found
+    #           (float) confidence between 0 and 1, e.g. PitchTracker.confidence
+    #           (numpy array) magnitude spectrum of the frame, optional, for onset detection
+    #Returns: (float) smoothed frequency in Hz, 0 during silence
+    def update(self, frequency, confidence=1.0, spectrum=None):
+        self.since_onset += 1
+        onset = spectrum is not None and self._spectral_onset(spectrum)
+
+        if frequency <= 0 or confidence < self.min_confidence:
+            self.unvoiced += 1
+            if self.unvoiced > self.hold:
+                self._restart()
+                self.frequency = 0.0
+            self.onset = False
+            return self.frequency
+
+        semitone = 12 * math.log2(frequency / C0)
+        onset = onset or self.unvoiced > self.hold
+        self.unvoiced = 0
+        if onset:
+            self._restart()
+        elif not math.isnan(self.state):
+            difference = semitone - self.state
+            octaves = round(difference / 12)
+            if octaves and abs(difference - 12 * octaves) < self.octave_tolerance:
+                # Most likely the tracker locked onto a harmonic or subharmonic
+                self.octave_frames += 1
+                if self.octave_frames < self.octave_confirm:
+                    semitone -= 12 * octaves
+                else:
+                    onset = True
+                    self._restart()
+            else:
+                self.octave_frames = 0
+
+        self.history.append(semitone)
+        median = sorted(self.history)[len(self.history) // 2]
+        if not onset and not math.isnan(self.state) and abs(median - self.state) > self.note_change:
+            onset = True
+            self.history.clear()
+            self.history.append(semitone)
+            median = semitone
+
+        if onset or math.isnan(self.state):
+            self.state = median
+            self.variance = self.measurement_noise
+        else:
+            self.variance += self.process_noise
+            gain = self.variance / (self.variance + self.measurement_noise / max(confidence, 1e-3))
+            self.state += gain * (median - self.state)
+            self.variance *= 1 - gain
+
+        # Several onsets in quick succession are one note starting
+        self.onset = onset and self.since_onset > self.refractory
+        if onset:
+            self.since_onset = 0
+        self.frequency = C0 * 2 ** (self.state / 12)
+        return self.frequency
+
+
+#Smooths a whole sequence of estimates, e.g. from PitchTrack.pitch_track
+#Arguments: (numpy array) frequencies, 0 where no pitch was found
+#           (numpy array) confidences, defaults to all 1
+#           (numpy array) magnitude spectra shaped (frames, bins), optional
+#           other arguments as PitchSmoother
+#Returns: numpy array of smoothed frequencies, numpy array of onset flags
+def smooth_pitches(frequencies, confidences=None, spectra=None, **settings):
+    smoother = PitchSmoother(**settings)
+    smoothed = np.zeros(len(frequencies))
+    onsets = np.zeros(len(frequencies), dtype=bool)
+    for i, frequency in enumerate(frequencies):
+        smoothed[i] = smoother.update(frequency,
+                                      1.0 if confidences is None else confidences[i],
+                                      None if spectra is None else spectra[i])
+        onsets[i] = smoother.onset
+    return smoothed, onsets
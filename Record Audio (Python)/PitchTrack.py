@@ -0,0 +1,75 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PitchTracker import PitchTracker
+from WavIO import load_audio, open_wav, to_float
+from pitch import cents_off
+
+#One row per analyzed frame; cents is NaN where no pitch was found
+track_dtype = np.dtype([('time', np.float64), ('frequency', np.float64), ('cents', np.float64)])
+
+
+#Splits a wave into overlapping frames without copying it
+#Arguments: (numpy array) wave
+#           (int) frame_size samples per frame
+#           (int) hop samples between frame starts
+#Returns: read only numpy view shaped (frames, frame_size)
+def frame_signal(wave, frame_size=2048, hop=512):
+    if len(wave) < frame_size:
+        return np.empty((0, frame_size), dtype=wave.dtype)
+    return sliding_window_view(wave, frame_size)[::hop]
+
+#Short-time Fourier transform magnitudes of every frame, in one batched rfft
+#Arguments: (numpy array) wave
+#           (int) frame_size samples per frame
+#           (int) hop samples between frame starts
+#Returns: numpy array shaped (frames, frame_size // 2 + 1)
+def stft(wave, frame_size=2048, hop=512):
+    frames = frame_signal(wave, frame_size, hop)
+    return np.abs(np.fft.rfft(frames * np.hanning(frame_size), axis=1))
+
+#Builds track rows for a block of frames
+def _track_rows(tracker, frames, first_frame):
+    track = np.empty(len(frames), dtype=track_dtype)
+    frequencies, _ = tracker.estimate_batch(frames)
+    # Frame times are taken at the centre of each frame
+    track['time'] = ((first_frame + np.arange(len(frames))) * tracker.hop_size + tracker.frame_size / 2) / tracker.sample_rate
+    track['frequency'] = frequencies
+    track['cents'] = np.where(frequencies > 0, cents_off(frequencies), np.nan)
+    return track
+
+#Tracks the pitch of a wave frame by frame
+#Arguments: (numpy array) wave
+#           (int) sample_rate defaults to 44100
+#           (int) frame_size samples per frame
+#           (int) hop samples between frame starts
+#           (int) batch frames analyzed per FFT call, which bounds memory use
+#Returns: numpy array of track_dtype rows
+def pitch_track(wave, sample_rate=44100, frame_size=2048, hop=512, fmin=60, fmax=2000, batch=1024):
+    tracker = PitchTracker(sample_rate, frame_size, hop, fmin, fmax)
+    frames = frame_signal(np.asarray(wave, dtype=np.float64), frame_size, hop)
+    blocks = [_track_rows(tracker, frames[start:start + batch], start) for start in range(0, len(frames), batch)]
+    return np.concatenate(blocks) if blocks else np.empty(0, dtype=track_dtype)
+
+#Tracks the pitch of a whole audio file
+#Arguments: (string) input file path, other arguments as pitch_track
+#Returns: numpy array of track_dtype rows, (int) sample rate
+def track_file(input_file, frame_size=2048, hop=512, fmin=60, fmax=2000):
+    wave, sample_rate = load_audio(input_file)
+    return pitch_track(wave, sample_rate, frame_size, hop, fmin, fmax), sample_rate
+
+#Tracks the pitch of a .wav file in constant memory, yielding one frame at a time
+#Only block_frames frames worth of samples are read from disk at once
+#Arguments: (string) input file path
+#           (int) frame_size samples per frame
+#           (int) hop samples between frame starts
+#           (int) block_frames frames analyzed per FFT call
+#Returns: generator of track_dtype rows
+def iter_track_file(input_file, frame_size=2048, hop=512, fmin=60, fmax=2000, block_frames=256):
+    samples, sample_rate = open_wav(input_file)
+    tracker = PitchTracker(sample_rate, frame_size, hop, fmin, fmax)
+    total_frames = max(0, (len(samples) - frame_size) // hop + 1)
+    for first in range(0, total_frames, block_frames):
+        count = min(block_frames, total_frames - first)
+        start = first * hop
+        wave = to_float(samples[start:start + (count - 1) * hop + frame_size]).astype(np.float64)
+        yield from _track_rows(tracker, frame_signal(wave, frame_size, hop), first)
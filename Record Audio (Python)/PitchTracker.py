@@ -0,0 +1,174 @@
+import numpy as np
+
+
+#Streaming YIN pitch estimator (de Cheveigne & Kawahara, 2002)
+#Frames of frame_size samples are analyzed every hop_size samples. The YIN
+#difference function is computed with real FFTs, batched over many frames by
+#estimate_batch, and the FFT size and lag ranges are worked out once up front
+class PitchTracker:
+    def __init__(self, sample_rate=44100, frame_size=2048, hop_size=512, fmin=60, fmax=2000, threshold=0.15):
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.hop_size = hop_size
+        self.threshold = threshold
+        self.tau_min = max(2, int(sample_rate / fmax))
+        self.tau_max = min(int(np.ceil(sample_rate / fmin)), frame_size // 2)
+        # Each lag is compared over the same number of samples
+        self.window_size = frame_size - self.tau_max
+        self.fft_size = 1 << int(np.ceil(np.log2(frame_size)))
+        self.taus = np.arange(1, self.tau_max + 1)
+        # Circular input buffer holding every sample twice, so the newest frame
+        # is always one contiguous view and a hop only writes its new samples
+        self.buffer = np.zeros(2 * frame_size)
+        self.head = 0
+        self.filled = 0
+        self.frames = 0
+        self.confidence = 0.0
+
+    #Cumulative mean normalized difference for lags 0..tau_max
+    #Arguments: (numpy array) frames shaped (..., frame_size)
+    #Returns: numpy array shaped (..., tau_max + 1)
+    def _cmndf(self, frames):
+        w = self.window_size
+        spectrum = np.fft.rfft(frames, self.fft_size, axis=-1)
+        window_spectrum = np.fft.rfft(frames[..., :w], self.fft_size, axis=-1)
+        acf = np.fft.irfft(spectrum * np.conj(window_spectrum), self.fft_size, axis=-1)[..., :self.tau_max + 1]
+
+        squares = np.zeros(frames.shape[:-1] + (self.frame_size + 1,))
+        np.cumsum(frames * frames, axis=-1, out=squares[..., 1:])
+        energy = squares[..., w:w + self.tau_max + 1] - squares[..., :self.tau_max + 1]
+        diff = energy[..., :1] + energy - 2 * acf
+        diff[..., 0] = 0.0
+
+        cmndf = np.ones(diff.shape)
+        total = np.cumsum(diff[..., 1:], axis=-1)
+        np.divide(diff[..., 1:] * self.taus, total, out=cmndf[..., 1:], where=total > 0)
+        return cmndf
+
+    #Estimates the pitch of many frames at once, with one batched FFT
+    #Arguments: (numpy array) frames shaped (frames, frame_size)
+    #Returns: numpy array of frequencies (0 where no pitch was found), numpy array of confidences
+    def estimate_batch(self, frames):
+        cmndf = self._cmndf(np.asarray(frames, dtype=np.float64))
+        search = cmndf[:, self.tau_min:]
+        rows = np.arange(len(search))
+        below = search < self.threshold
+        voiced = below.any(axis=1)
+        # First dip under the threshold, followed down to its minimum
+        tau = np.where(voiced, below.argmax(axis=1), search.argmin(axis=1))
+        last = search.shape[1] - 1
+        while True:
+            following = np.minimum(tau + 1, last)
+            step = voiced & (tau < last) & (search[rows, following] < search[rows, tau])
+            if not step.any():
+                break
+            tau += step
+        tau += self.tau_min
+
+        confidence = np.maximum(0.0, 1.0 - cmndf[rows, tau])
+        left = cmndf[rows, tau - 1]
+        middle = cmndf[rows, tau]
+        right = cmndf[rows, np.minimum(tau + 1, self.tau_max)]
+        denominator = left - 2 * middle + right
+        offset = np.zeros(len(tau))
+        np.divide(0.5 * (left - right), denominator, out=offset, where=denominator != 0)
+        offset = np.clip(offset, -0.5, 0.5)
+        pitched = voiced & (tau < self.tau_max)
+        frequencies = np.zeros(len(tau))
+        np.divide(self.sample_rate, tau + offset, out=frequencies, where=pitched)
+        return frequencies, confidence
+
+    #Estimates the pitch of a single frame
+    #Arguments: (numpy array) frame of frame_size samples
+    #Returns: (float) frequency in Hz, 0 if no pitch was found
+    def estimate(self, frame):
+        cmndf = self._cmndf(np.asarray(frame, dtype=np.float64))
+        search = cmndf[self.tau_min:]
+        below = np.flatnonzero(search < self.threshold)
+        if len(below):
+            # First dip under the threshold, followed down to its minimum
+            tau = below[0]
+            while tau + 1 < len(search) and search[tau + 1] < search[tau]:
+                tau += 1
+        else:
+            tau = int(np.argmin(search))
+        tau += self.tau_min
+        self.confidence = max(0.0, 1.0 - cmndf[tau])
+        if len(below) == 0 or tau >= self.tau_max:
+            return 0.0
+        return self.sample_rate / (tau + parabolic_offset(cmndf, tau))
+
+    #Copies samples into the circular buffer, at most frame_size at a time
+    def _write(self, samples):
+        n = len(samples)
+        first = min(n, self.frame_size - self.head)
+        for offset in (0, self.frame_size):
+            self.buffer[offset + self.head:offset + self.head + first] = samples[:first]
+            self.buffer[offset:offset + n - first] = samples[first:]
+        self.head = (self.head + n) % self.frame_size
+
+    #The newest n samples fed in, oldest first, as a view into the buffer
+    #Arguments: (int) n up to frame_size, defaults to frame_size
+    #Returns: numpy array
+    def recent(self, n=None):
+        n = self.frame_size if n is None else n
+        end = self.head + self.frame_size
+        return self.buffer[end - n:end]
+
+    #Feeds new samples in and yields every frame they complete
+    #Arguments: (numpy array) samples of any length
+    #Returns: generator of frame views, each only valid until the next is yielded
+    def iter_frames(self, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        position = 0
+        while position < len(samples):
+            take = min(len(samples) - position, self.frame_size - self.filled)
+            self._write(samples[position:position + take])
+            self.filled += take
+            position += take
+            if self.filled == self.frame_size:
+                yield self.recent()
+                self.frames += 1
+                self.filled -= self.hop_size
+
+    #Feeds new samples in and analyzes every frame they complete
+    #Arguments: (numpy array) samples of any length
+    #Returns: numpy array of frequencies, one per completed hop
+    def process(self, samples):
+        return np.array([self.estimate(frame) for frame in self.iter_frames(samples)])
+
+    #Time in seconds of the end of the most recently analyzed frame
+    def current_time(self):
+        if self.frames == 0:
+            return 0.0
+        return (self.frame_size + (self.frames - 1) * self.hop_size) / self.sample_rate
+
+    def reset(self):
+        self.buffer[:] = 0
+        self.head = 0
+        self.filled = 0
+        self.frames = 0
+
+
+#Offset of the true minimum or maximum from index i, fitted with a parabola
+#through the point and its two neighbours
+#Arguments: (numpy array) values
+#           (int) index of the extreme point
+#Returns: (float) offset between -0.5 and 0.5
+def parabolic_offset(values, i):
+    if i <= 0 or i >= len(values) - 1:
+        return 0.0
+    left, middle, right = values[i - 1], values[i], values[i + 1]
+    denominator = left - 2 * middle + right
+    if denominator == 0:
+        return 0.0
+    return float(np.clip(0.5 * (left - right) / denominator, -0.5, 0.5))
+
+
+#Estimates the pitch of a whole wave, or of its first frame_size samples
+#Arguments: (numpy array) wave
+#           (int) sample_rate defaults to 44100
+#Returns: (float) frequency in Hz, 0 if no pitch was found
+def yin_pitch(wave, sample_rate=44100, frame_size=2048):
+    tracker = PitchTracker(sample_rate, frame_size=min(frame_size, len(wave)))
+    return tracker.estimate(wave[:tracker.frame_size])
@@ -1,30 +1,220 @@
 import numpy as np
+import collections
+import hashlib
 import math
-from pitch import pitch_to_freq
-from WaveGenerator import generate_sine_wave
+import os
+import shutil
+from pitch import pitches_to_freqs
 from WaveToWav import wave_to_wav
 
 
-def read_song(input='Python Files\\HotCrossBuns.txt', output = 'Python Files\\generated_wave.wav'):
-    f = open (input, "r")
-    bpm = f.readline()
-    notes = []
-    for line in f:
-        line = line.strip()
-        if line:
-            pitch,duration = line.split(", ")
-            notes.append((pitch, float(duration)))
-    f.close()
-    song = []
-    all_notes = []
-    for i in range(len(notes)):
-        dur = pow(int(bpm) / 60 * pow(float(notes[i][1]),-1),-1) # duration of note in seconds
-        freq = pitch_to_freq(notes[i][0])
-        wave = generate_sine_wave (duration = dur, frequency= freq)
-        all_notes.append(wave)
-    for note in all_notes:
-        for element in note:
-            song.append(element)
-
-    song = np.array(song)
-    wave_to_wav(song, output_file=output)
+#Reads a song file (bpm on the first line, then "pitch, beats" per line)
+#Arguments: (string) input file path
+#Returns: (int) bpm, list of (pitch, beats) tuples
+def parse_song(input='Python Files\\HotCrossBuns.txt'):
+    with open(input, "r") as f:
+        bpm = int(f.readline())
+        notes = []
+        for line in f:
+            line = line.strip()
+            if line:
+                pitch, duration = line.split(", ")
+                notes.append((pitch, float(duration)))
+    return bpm, notes
+
+
+#A compiled score: one row per note with its frequency in Hz and its start and
+#length in samples, so rendering needs no parsing, pitch lookups or timing math
+score_dtype = np.dtype([('frequency', np.float64), ('start', np.int64), ('length', np.int64)])
+
+
+#Samples in a note of beats beats at bpm, rounded down as render_song always has
+#The one rounding rule for render_song, song_chunks and compile_score, so the
+#renderers agree sample for sample
+def note_length(beats, bpm, sample_rate=44100):
+    return int(pow(bpm / 60 * pow(beats, -1), -1) * sample_rate)
+
+
+#Compiles notes into a score_dtype array. A different bpm gives the same song at
+#another tempo
+#Arguments: (list) (pitch, beats) tuples
+#           (int) bpm
+#           (int) sample_rate defaults to 44100
+#Returns: numpy structured array
+def compile_score(notes, bpm, sample_rate=44100):
+    score = np.zeros(len(notes), dtype=score_dtype)
+    if len(notes):
+        score['frequency'] = pitches_to_freqs([pitch for pitch, _ in notes])
+        score['length'] = [note_length(beats, bpm, sample_rate) for _, beats in notes]
+        score['start'][1:] = np.cumsum(score['length'])[:-1]
+    return score
+
+
+#Moves every note of a compiled score by a number of semitones
+#Arguments: (numpy structured array) score
+#           (float) semitones, negative to go down
+#Returns: numpy structured array
+def transpose(score, semitones):
+    score = score.copy()
+    score['frequency'] *= 2 ** (semitones / 12)
+    return score
+
+
+#Rendered notes, most recently used last, held up to max_bytes in total
+#A note is keyed by its content, frequency and sample rate, and not by its
+#length: every note starts at phase 0, so a shorter note is the start of a
+#longer one and is served as a view of it. A longer note than the one cached
+#only has its missing tail synthesized. Repeated notes, other tempos and
+#transpositions that land on notes already played all reuse the same buffers
+class NoteCache:
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        self.notes = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    #Returns the first length samples of a sine at frequency, read only
+    #Arguments: (float) frequency in Hz
+    #           (int) length in samples
+    #           (int) sample_rate
+    #Returns: numpy array
+    def note(self, frequency, length, sample_rate=44100):
+        # Rounded so a transposed frequency matches the table value it lands on
+        key = (round(float(frequency), 6), sample_rate)
+        buffer = self.notes.get(key)
+        if buffer is not None and len(buffer) >= length:
+            self.hits += 1
+            self.notes.move_to_end(key)
+            return buffer[:length]
+
+        self.misses += 1
+        done = 0 if buffer is None else len(buffer)
+        # The same products render_song makes, so the samples match it exactly
+        tail = np.arange(done, length, dtype=np.float64)
+        tail *= 2 * np.pi * frequency / sample_rate
+        np.sin(tail, out=tail)
+        buffer = tail if buffer is None else np.concatenate([buffer, tail])
+        buffer.flags.writeable = False
+        if key in self.notes:
+            self.bytes -= self.notes.pop(key).nbytes
+        self.notes[key] = buffer
+        self.bytes += buffer.nbytes
+        while self.bytes > self.max_bytes and len(self.notes) > 1:
+            self.bytes -= self.notes.popitem(last=False)[1].nbytes
+        return buffer
+
+    def clear(self):
+        self.notes.clear()
+        self.bytes = 0
+
+
+#Shared by read_song and read_songs, so notes rendered once are reused by every later song
+note_cache = NoteCache()
+
+
+#Renders a compiled score, copying each note from a NoteCache
+#Arguments: (numpy structured array) score
+#           (int) sample_rate the score was compiled for
+#           (NoteCache) cache defaults to note_cache
+#Returns: numpy array
+def render_score(score, sample_rate=44100, cache=None):
+    cache = note_cache if cache is None else cache
+    if len(score) == 0:
+        return np.empty(0)
+    song = np.empty(int(score['start'][-1] + score['length'][-1]))
+    for frequency, start, length in score.tolist():
+        song[start:start + length] = cache.note(frequency, length, sample_rate)
+    return song
+
+
+#Renders a list of notes into a single preallocated buffer
+#Each note is synthesized directly into its slice of the output, so the only
+#extra memory is one shared sample ramp as long as the longest note
+#Every note starts at phase 0, unlike WaveGenerator.generate_sequence, so a
+#note's samples never depend on the notes before it; NoteCache relies on that
+#to reuse one buffer for every repeat of a note
+#Arguments: (list) (pitch, beats) tuples
+#           (int) bpm
+#           (int) sample_rate defaults to 44100
+#Returns: numpy array
+def render_song(notes, bpm, sample_rate=44100):
+    lengths = [note_length(beats, bpm, sample_rate) for _, beats in notes]
+    song = np.empty(sum(lengths))
+    ramp = np.arange(max(lengths, default=0), dtype=np.float64)
+    steps = 2 * np.pi * pitches_to_freqs([pitch for pitch, _ in notes]) / sample_rate
+
+    start = 0
+    for step, length in zip(steps, lengths):
+        segment = song[start:start + length]
+        np.multiply(ramp[:length], step, out=segment)
+        np.sin(segment, out=segment)
+        start += length
+    return song
+
+
+#Renders a list of notes one chunk at a time, for streaming to a .wav file
+#Arguments: (list) (pitch, beats) tuples
+#           (int) bpm
+#           (int) sample_rate defaults to 44100
+#           (int) chunk_size maximum samples per chunk
+#Returns: generator of numpy arrays
+def song_chunks(notes, bpm, sample_rate=44100, chunk_size=65536):
+    ramp = np.arange(chunk_size, dtype=np.float64)
+    steps = 2 * np.pi * pitches_to_freqs([pitch for pitch, _ in notes]) / sample_rate
+    for (_, beats), step in zip(notes, steps):
+        length = note_length(beats, bpm, sample_rate)
+        for start in range(0, length, chunk_size):
+            chunk = ramp[:min(chunk_size, length - start)] + start
+            chunk *= step
+            yield np.sin(chunk, out=chunk)
+
+
+#Part of every cache_dir key. Raise it whenever a change to the synthesis
+#changes the samples, so .wav files rendered before are not reused
+renderer_version = 1
+
+
+#Renders a song file to a .wav file
+#With a cache_dir the finished .wav is also kept there under a hash of the song
+#file, the sample rate and renderer_version, and an unchanged song is copied
+#from it instead of rendered again
+#Arguments: (string) input file path
+#           (string) output file path
+#           (string) cache_dir, optional, created if missing
+#           (int) sample_rate defaults to 44100
+#Returns: (bool) True if the .wav came from cache_dir
+def read_song(input='Python Files\\HotCrossBuns.txt', output = 'Python Files\\generated_wave.wav', cache_dir=None, sample_rate=44100):
+    if cache_dir is not None:
+        with open(input, 'rb') as f:
+            digest = hashlib.sha1(f.read() + f'\n{sample_rate}\n{renderer_version}'.encode()).hexdigest()
+        cached = os.path.join(cache_dir, digest + '.wav')
+        if os.path.exists(cached):
+            shutil.copyfile(cached, output)
+            return True
+    bpm, notes = parse_song(input)
+    song = render_score(compile_score(notes, bpm, sample_rate), sample_rate)
+    wave_to_wav(song, sample_rate, output_file=output)
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written under a temporary name first, so a crash never leaves half a .wav to be reused
+        partial = cached + f'.{os.getpid()}.tmp'
+        shutil.copyfile(output, partial)
+        os.replace(partial, cached)
+    return False
+
+
+#Renders many song files, writing one .wav per song into output_dir
+#Arguments: (list) song file paths
+#           (string) output directory, created if missing
+#           (string) cache_dir as read_song
+#Returns: list of output file paths
+def read_songs(inputs, output_dir='Python Files', cache_dir=None):
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = []
+    for input in inputs:
+        name = os.path.splitext(os.path.basename(input))[0] + '.wav'
+        output = os.path.join(output_dir, name)
+        read_song(input, output, cache_dir)
+        outputs.append(output)
+    return outputs
@@ -0,0 +1,203 @@
+import time
+
+# Taken before anything else is imported, for --time
+started = time.perf_counter()
+
+import argparse
+import sys
+
+#Single entry point for the SoundByte tools:
+#  python SoundByte.py synth C4 E4 G4 --seconds 2 -o chord.wav
+#  python SoundByte.py render-song HotCrossBuns.txt -o buns.wav
+#  python SoundByte.py record recording.wav --seconds 5 [--device 1 3 --channels 2]
+#  python SoundByte.py analyze recording.wav [--score HotCrossBuns.txt]
+#  python SoundByte.py export recording.wav [-o recording.analysis]
+#  python SoundByte.py tune 442 Bb3
+#  python SoundByte.py live --tone 440 --seconds 5   (options as LiveTuner.py)
+#  python SoundByte.py ensemble --device 1:2 3      (options as EnsembleTuner.py)
+#  python SoundByte.py serve --port 8765             (options as AsyncTuner.py)
+#Each command imports only the modules it needs, inside its own function, so
+#making a sine wave never waits for matplotlib, scipy or PortAudio to load
+
+
+#Reads a frequency in Hz or a note name such as C#4
+#Arguments: (string) value
+#Returns: (float) frequency in Hz
+def parse_frequency(value):
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    from pitch import pitch_to_freq
+    try:
+        return pitch_to_freq(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def synth(args):
+    from WaveGenerator import generate_sine_wave, generate_chord
+    from WaveToWav import wave_to_wav
+    frequencies = args.frequencies
+    if len(frequencies) == 1:
+        wave = generate_sine_wave(args.seconds, args.sample_rate, frequencies[0])
+    else:
+        wave = generate_chord(args.seconds, args.sample_rate, frequencies)
+    wave_to_wav(wave, args.sample_rate, args.output)
+    print(f"Wrote {args.seconds:g} s of {', '.join(f'{frequency:.2f} Hz' for frequency in frequencies)} to {args.output}")
+
+
+def render_song(args):
+    from SongToWav import read_song, read_songs
+    if args.output_dir:
+        outputs = read_songs(args.songs, args.output_dir, args.cache_dir)
+    else:
+        if len(args.songs) > 1:
+            raise SystemExit("render-song: use --output-dir to render more than one song")
+        read_song(args.songs[0], args.output, args.cache_dir)
+        outputs = [args.output]
+    for output in outputs:
+        print(f"Wrote {output}")
+
+
+def record(args):
+    import os
+    from recordAudio import record_audio, record_devices
+    duration = None if args.seconds <= 0 else args.seconds
+    if len(args.channels) not in (1, len(args.device)):
+        raise SystemExit("record: give one --channels for every device, or one for all of them")
+    if len(args.device) == 1:
+        record_audio(args.output, args.device[0], duration, channels=args.channels[0], sample_rate=args.sample_rate)
+        outputs = [args.output]
+    else:
+        # recording.wav becomes recording_device1.wav, recording_device3.wav, ...
+        stem, extension = os.path.splitext(args.output)
+        outputs = [f"{stem}_device{device}{extension or '.wav'}" for device in args.device]
+        channels = args.channels * len(args.device) if len(args.channels) == 1 else args.channels
+        record_devices(outputs, list(zip(args.device, channels)), duration, sample_rate=args.sample_rate)
+    for output in outputs:
+        print(f"Recorded {output}")
+
+
+def analyze(args):
+    import os
+    if args.score:
+        from Intonation import main as score_main
+        return score_main([args.score, args.recording, '--band', str(args.band)])
+    if os.path.isdir(args.recording):
+        from BatchAnalysis import main as batch_main
+        return batch_main([args.recording, '-o', args.output or 'summary.csv'])
+    from BatchAnalysis import analyze_file
+    summary = analyze_file(args.recording)
+    if summary['error']:
+        raise SystemExit(f"analyze: {summary['error']}")
+    for name, value in summary.items():
+        print(f"{name:<20} {value}")
+    if args.plot:
+        from WavToFreq import find_frequencies, plot_freqs
+        plot_freqs(*find_frequencies(args.recording))
+
+
+def export(args):
+    import os
+    from AnalysisStore import export_analysis
+    output = args.output or os.path.splitext(args.recording)[0] + '.analysis'
+    analysis = export_analysis(args.recording, output, args.frame_size, args.hop, args.max_frequency or None, args.spectrum)
+    recording = os.path.getsize(args.recording)
+    print(f"Wrote {len(analysis)} frames to {output}, {analysis.size() / 1e6:.2f} MB ({recording / analysis.size():.1f}x smaller than the recording)")
+
+
+def tune(args):
+    from pitch import freq_to_pitch, cents_off, in_tune
+    for frequency in args.values:
+        print(f"{frequency:9.2f} Hz  {freq_to_pitch(frequency):<4} {cents_off(frequency):+7.2f} cents  {in_tune(frequency)}")
+
+
+def live(args):
+    from LiveTuner import main as live_main
+    return live_main(args.options)
+
+
+def ensemble(args):
+    from EnsembleTuner import main as ensemble_main
+    return ensemble_main(args.options)
+
+
+def serve(args):
+    from AsyncTuner import main as serve_main
+    return serve_main(args.options)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='SoundByte', description='Synthesize, record and analyze notes')
+    parser.add_argument('--time', action='store_true', help='report how long the command took from start up')
+    # So --time also works after the command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--time', action='store_true', default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('synth', parents=[common], help='write a tone or chord to a .wav file')
+    command.add_argument('frequencies', nargs='+', type=parse_frequency, help='frequencies in Hz or note names, sounded together')
+    command.add_argument('--seconds', type=float, default=1.0)
+    command.add_argument('--sample-rate', type=int, default=44100)
+    command.add_argument('-o', '--output', default='generated_wave.wav')
+    command.set_defaults(run=synth)
+
+    command = commands.add_parser('render-song', parents=[common], help='render song files to .wav')
+    command.add_argument('songs', nargs='+', help='song files: bpm on the first line, then "pitch, beats" per line')
+    command.add_argument('-o', '--output', default='generated_wave.wav')
+    command.add_argument('--output-dir', help='render every song into this folder')
+    command.add_argument('--cache-dir', help='keep rendered songs here and reuse them while the song file is unchanged')
+    command.set_defaults(run=render_song)
+
+    command = commands.add_parser('record', parents=[common], help='record the microphone to a .wav file')
+    command.add_argument('output', nargs='?', default='recorded_audio.wav')
+    command.add_argument('--seconds', type=float, default=5.0, help='0 records until Ctrl+C')
+    command.add_argument('--device', type=int, nargs='+', default=[0], help='devices to record at the same time, each to a file of its own')
+    command.add_argument('--channels', type=int, nargs='+', default=[1], help='channels of each device, or one number for all')
+    command.add_argument('--sample-rate', type=int, default=44100)
+    command.set_defaults(run=record)
+
+    command = commands.add_parser('analyze', parents=[common], help='summarize the pitch of a recording, or of a folder of them')
+    command.add_argument('recording', help='.wav file or folder')
+    command.add_argument('--score', help='song file to grade the recording against')
+    command.add_argument('--band', type=float, default=2.0, help='seconds the playing may drift from the score')
+    command.add_argument('-o', '--output', help='.csv or .json summary for a folder')
+    command.add_argument('--plot', action='store_true', help='plot the spectrum')
+    command.set_defaults(run=analyze)
+
+    command = commands.add_parser('export', parents=[common], help='save the pitch track and spectrogram of a recording, readable by time range')
+    command.add_argument('recording', help='.wav file')
+    command.add_argument('-o', '--output', help='folder to write, defaults to the recording name with .analysis')
+    command.add_argument('--frame-size', type=int, default=2048)
+    command.add_argument('--hop', type=int, default=512)
+    command.add_argument('--max-frequency', type=float, default=8000, help='highest spectrogram frequency kept, 0 keeps every bin')
+    command.add_argument('--spectrum', choices=['uint8', 'float16'], default='uint8', help='decibels in a byte, or half float magnitudes')
+    command.set_defaults(run=export)
+
+    command = commands.add_parser('tune', parents=[common], help='note, cents off and tuning of frequencies or note names')
+    command.add_argument('values', nargs='+', type=parse_frequency, help='frequencies in Hz or note names')
+    command.set_defaults(run=tune)
+
+    command = commands.add_parser('live', parents=[common], help='live tuner, taking the options of LiveTuner.py')
+    command.set_defaults(run=live)
+
+    command = commands.add_parser('ensemble', parents=[common], help='live tuner for every channel of several devices, taking the options of EnsembleTuner.py')
+    command.set_defaults(run=ensemble)
+
+    command = commands.add_parser('serve', parents=[common], help='send live tuner results to TCP clients as JSON lines, taking the options of AsyncTuner.py')
+    command.set_defaults(run=serve)
+
+    args, extra = parser.parse_known_args(argv)
+    if args.command in ('live', 'ensemble', 'serve'):
+        args.options = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    result = args.run(args)
+    if args.time:
+        print(f"{args.command} took {(time.perf_counter() - started) * 1000:.0f} ms from start up, "
+              f"{len(sys.modules)} modules loaded", file=sys.stderr)
+    return result
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import functools
+import numpy as np
+
+
+#Returns the frequency of each rfft bin, computed once per length and sample rate
+#The array is shared between callers, so it is made read only
+#Arguments: (int) FFT length
+#           (int) sample_rate
+#Returns: numpy array of n // 2 + 1 frequencies
+@functools.lru_cache(maxsize=32)
+def rfft_frequencies(n, sample_rate=44100):
+    freqs = np.fft.rfftfreq(n, 1 / sample_rate)
+    freqs.flags.writeable = False
+    return freqs
+
+#Returns the FFT length to use for a signal
+#Arguments: (int) signal length
+#           (string) pad policy: None keeps the length, 'pow2' zero pads to the next power of two,
+#                    'fast' zero pads to the next length with only small prime factors
+#Returns: (int) FFT length
+def fft_size(n, pad=None):
+    if pad is None:
+        return n
+    if pad == 'fast':
+        # scipy.fft takes several times longer to import than numpy, so only load it when asked to
+        from scipy.fft import next_fast_len
+        return next_fast_len(n, real=True)
+    if pad == 'pow2':
+        return 1 << max(0, int(n - 1).bit_length())
+    raise ValueError(f"Unknown pad policy: {pad!r}")
+
+#Computes the positive half of the spectrum of a real signal
+#Arguments: (numpy array) wave
+#           (int) sample_rate defaults to 44100
+#           (string) pad policy, see fft_size
+#Returns: (numpy array) frequencies, (numpy array) magnitudes
+def magnitude_spectrum(wave, sample_rate=44100, pad=None):
+    n = fft_size(len(wave), pad)
+    magnitude = np.abs(np.fft.rfft(wave, n))
+    return rfft_frequencies(n, sample_rate), magnitude
+
+#Returns the frequency of the largest bin in the spectrum
+#Arguments: (numpy array) wave
+#           (int) sample_rate defaults to 44100
+#           (string) pad policy, see fft_size
+#Returns: (float) frequency in Hz
+def dominant_frequency(wave, sample_rate=44100, pad=None):
+    freqs, magnitude = magnitude_spectrum(wave, sample_rate, pad)
+    return freqs[np.argmax(magnitude)]
@@ -4,36 +4,79 @@ import unittest
 import colorlog
 import logging
 import os
+import tempfile
+import json
+import time
+import subprocess
+import threading
+import queue
+import sys
+import asyncio
 from unittest.mock import patch
 from scipy.io import wavfile
 from io import StringIO
 from contextlib import redirect_stdout
 from tqdm import tqdm
-from setupMicrophone import list_audio_devices, select_microphone
+from setupMicrophone import list_audio_devices, select_microphone, has_input_device
 from recordAudio import record_audio
+from recordAudio import RingBuffer, AudioCapture, MultiCapture, record_devices, deinterleave
+from AudioBackend import FakeAudio, PyAudioBackend, shared_audio
 from WaveGenerator import generate_sine_wave
 from WaveToWav import wave_to_wav
+from WaveToWav import wave_to_wav_stream
 from pitch import pitch_to_freq
 from pitch import freq_to_pitch
 from pitch import find_pitch_index
+from pitch import parse_pitch
+from pitch import pitches_to_freqs
 from pitch import cents_off
 from pitch import sharp_or_flat
 from pitch import in_tune
+from pitch import nearest_semitone
+from pitch import tune_level
 from SongToWav import read_song
+from SongToWav import render_song
+from SongToWav import read_songs
+from SongToWav import song_chunks
+from SongToWav import compile_score, transpose, render_score, NoteCache
 from WaveGenerator import generate_sine_wave
 from WaveGenerator import generate_chord
+from WaveGenerator import generate_chunks
+from WaveGenerator import generate_sequence
+from WaveGenerator import OscillatorBank
 from WaveGenerator import read_wave_freq
-from LoggingSetup import log_setup
+from PitchTracker import PitchTracker, parabolic_offset, yin_pitch
+from Spectrum import magnitude_spectrum, dominant_frequency, rfft_frequencies, fft_size
+from WavIO import open_wav, to_float, load_audio, iter_windows
+from WavToFreq import find_dominant_freq, find_frequencies
+from PitchTrack import frame_signal, stft, pitch_track, track_file, iter_track_file
+from BatchAnalysis import find_recordings, analyze_files, write_summaries
+from Intonation import score_timeline, align, grade_notes, score_recording
+from LiveTuner import LiveTuner, readout
+from EnsembleTuner import EnsembleTuner, parse_source
+from AsyncTuner import AsyncTuner, TunerServer, subscribe
+from AnalysisStore import write_analysis, export_analysis, AnalysisFile, encode_spectrum, decode_spectrum
+from ChordDetector import ChordDetector, chord_names, detect_chords
+from PitchSmoother import PitchSmoother, smooth_pitches
+from BenchmarkSuite import measure, run_suite, compare_runs
+from LoggingSetup import log_setup, log_shutdown, DeferredQueueHandler
+from Metrics import Histogram, Metrics, serve_metrics, StackSampler
+from SoundByte import main as soundbyte
+
+#Tests that record from a real microphone are skipped on machines without one
+microphone = unittest.skipUnless(has_input_device(), 'no audio input device')
 
 class TestMyFunctions(unittest.TestCase):    
 
 # setupMicrophone.py
 ############################################################################################
+    @microphone
     def test_list_audio_devices(self):
         devices = list_audio_devices()
         # Assert that the devices list is not empty
         self.assertTrue(devices)
     
+    @microphone
     @patch('builtins.input', return_value='1')  # Mock user input
     def test_select_microphone(self, mock_input):
         with StringIO() as buffer:
@@ -54,6 +97,25 @@ class TestMyFunctions(unittest.TestCase):
         # Test for pitch to frequency conversion
         self.assertAlmostEqual(pitch_to_freq('A4'), 440, delta=0.01)
         self.assertAlmostEqual(pitch_to_freq('C4'), 261.63, delta=0.01)
+        # Enharmonics, double accidentals and negative octaves
+        self.assertAlmostEqual(pitch_to_freq('Cb4'), pitch_to_freq('B3'))
+        self.assertAlmostEqual(pitch_to_freq('F##2'), pitch_to_freq('G2'))
+        self.assertAlmostEqual(pitch_to_freq('Fx2'), pitch_to_freq('G2'))
+        self.assertAlmostEqual(pitch_to_freq('Bbb3'), pitch_to_freq('A3'))
+        self.assertAlmostEqual(pitch_to_freq('A-1'), 13.75, delta=0.01)
+        self.assertAlmostEqual(pitch_to_freq('A12'), 112640, delta=0.1)
+        # Improper formats raise instead of returning None
+        for pitch in ['H4', 'A', 'Ad4', 'A#b4', '']:
+            with self.assertRaises(ValueError):
+                pitch_to_freq(pitch)
+
+    def test_pitches_to_freqs(self):
+        freqs = pitches_to_freqs(['A4', 'C4', 'Db4', 'C#4'])
+        self.assertEqual(freqs.dtype, np.float64)
+        np.testing.assert_allclose(freqs, [440, 261.626, 277.183, 277.183], atol=0.001)
+        self.assertEqual(parse_pitch('Eb3'), (3, 3, pitch_to_freq('D#3')))
+        with self.assertRaises(ValueError):
+            pitches_to_freqs(['A4', 'Z4'])
 
 
     def test_find_pitch_index(self):
@@ -66,16 +128,29 @@ class TestMyFunctions(unittest.TestCase):
         self.assertEqual(find_pitch_index("C#9"),1)
         # Check for correct index flat
         self.assertEqual(find_pitch_index("Gb"),6)
+        # Check enharmonic and double accidental spellings
+        self.assertEqual(find_pitch_index("Cb"),11)
+        self.assertEqual(find_pitch_index("B#3"),0)
+        self.assertEqual(find_pitch_index("Ebb-1"),2)
 
     def test_cents_off(self):
         # Frequency matches
         self.assertAlmostEqual(cents_off(440), 0, delta=0.001)
         # Frequency is close
         self.assertAlmostEqual(cents_off(445), -19.562,delta=0.001)
-        # Frequency is not close
-        self.assertAlmostEqual(cents_off(1200),-336.951,delta=0.001)
+        # Frequency is not close (nearest note is D6)
+        self.assertAlmostEqual(cents_off(1200),-36.951,delta=0.001)
         # Frequency of 0 returns error value 
         self.assertAlmostEqual(cents_off(0),-1)
+        # Frequencies outside C2 to C5 snap to their own nearest note
+        self.assertAlmostEqual(cents_off(27.5), 0, delta=0.001)
+        self.assertAlmostEqual(cents_off(4186.01), 0, delta=0.01)
+        # Whole arrays are handled in one call
+        np.testing.assert_allclose(cents_off(np.array([440, 445, 1200, 0])), [0, -19.562, -36.951, -1], atol=0.001)
+        np.testing.assert_array_equal(nearest_semitone(np.array([440, 261.63, 27.5])), [57, 48, 9])
+        # numpy scalars take the scalar path
+        self.assertAlmostEqual(cents_off(np.float32(445)), -19.562, delta=0.001)
+        self.assertEqual(in_tune(np.int64(440)), in_tune(440))
 
 
     def test_sharp_or_flat(self):
@@ -99,9 +174,14 @@ class TestMyFunctions(unittest.TestCase):
         # Test cases where the frequency is very out of tune
         self.assertEqual(in_tune(450), "\033[35m♪ :( ♪ \033[0m")
         self.assertEqual(in_tune(430), "\033[35m♪ :( ♪ \033[0m")
+        # Whole arrays are handled in one call
+        np.testing.assert_array_equal(sharp_or_flat(np.array([435, 445, 440])), [0, 1, -1])
+        np.testing.assert_array_equal(tune_level(np.array([440, 442, 446, 450])), [0, 1, 2, 3])
+        self.assertEqual(list(in_tune(np.array([439, 435]))), [in_tune(439), in_tune(435)])
 
 # recordAudio.py
 ############################################################################################
+    @microphone
     def test_record_audio(self):
         # Define test parameters
         output_filename = 'Python Files\\test_recorded_audio.wav'
@@ -121,6 +201,142 @@ class TestMyFunctions(unittest.TestCase):
         # Clean up: Remove the output file
         os.remove(output_filename)    
 
+    def test_ring_buffer(self):
+        ring = RingBuffer(8)
+        self.assertEqual(ring.write(np.arange(6).reshape(-1, 1)), 6)
+        np.testing.assert_array_equal(ring.read(4).ravel(), [0, 1, 2, 3])
+        # Writing past the end wraps around to the start of the buffer
+        self.assertEqual(ring.write(np.arange(6, 12).reshape(-1, 1)), 6)
+        np.testing.assert_array_equal(ring.read().ravel(), np.arange(4, 12))
+        # A full ring drops the newest frames and counts them
+        self.assertEqual(ring.write(np.arange(10).reshape(-1, 1)), 8)
+        self.assertEqual(ring.overruns, 2)
+        np.testing.assert_array_equal(ring.read().ravel(), np.arange(8))
+
+    def test_audio_capture_fake_stream(self):
+        signal = (generate_sine_wave(1, 8000, 440) * 10000).astype(np.int16)
+        chunks = []
+        with tempfile.TemporaryDirectory() as folder:
+            output_filename = os.path.join(folder, 'capture.wav')
+            capture = AudioCapture(output_filename, chunk_size=256, sample_rate=8000, max_frames=6000, on_chunk=chunks.append, audio=FakeAudio(signal, 8000))
+            capture.start()
+            self.assertTrue(capture.wait(timeout=5))
+            capture.stop()
+            sample_rate, audio_data = wavfile.read(output_filename)
+        # Only max_frames are kept and every frame reaches the file and on_chunk in order
+        self.assertEqual(sample_rate, 8000)
+        np.testing.assert_array_equal(audio_data, signal[:6000])
+        np.testing.assert_array_equal(np.concatenate(chunks).ravel(), signal[:6000])
+        self.assertEqual(capture.ring.overruns, 0)
+
+        # A stream that fails to open leaves no drain thread or half-written file behind
+        with tempfile.TemporaryDirectory() as folder:
+            output_filename = os.path.join(folder, 'failed.wav')
+            audio = FakeAudio(signal, 8000)
+            capture = AudioCapture(output_filename, sample_rate=8000, audio=audio)
+            with patch.object(audio, 'open', side_effect=OSError('Invalid input device')), self.assertRaises(OSError):
+                capture.start()
+            self.assertFalse(capture.drain_thread.is_alive())
+            self.assertIsNone(capture.wave_file)
+            self.assertFalse(os.path.exists(output_filename))
+
+    def test_record_audio_fake_stream(self):
+        signal = np.arange(-8000, 8000, dtype=np.int16)
+        with tempfile.TemporaryDirectory() as folder:
+            output_filename = os.path.join(folder, 'recorded.wav')
+            record_audio(output_filename, duration=0.5, chunk_size=512, channels=2, sample_rate=8000, audio=FakeAudio(signal, 8000))
+            sample_rate, audio_data = wavfile.read(output_filename)
+        # Interleaved stereo input comes back as (frames, channels)
+        self.assertEqual(audio_data.shape, (4000, 2))
+        np.testing.assert_array_equal(audio_data.ravel(), signal[:8000])
+
+    def test_multi_capture(self):
+        stereo = np.arange(-8000, 8000, dtype=np.int16).reshape(-1, 2)
+        mono = np.arange(4000, dtype=np.int16)
+        blocks = {0: [], 1: []}
+        capture = MultiCapture([(0, 2), (1, 1)], chunk_size=256, sample_rate=8000, max_frames=3000,
+                               on_chunk=lambda source, channels: blocks[source].append(channels), audio=[FakeAudio(stereo, 8000), FakeAudio(mono, 8000)])
+        capture.start()
+        self.assertTrue(capture.wait(timeout=5))
+        capture.stop()
+        # Each device's blocks arrive as (channels, samples) views, not copies
+        self.assertEqual(blocks[0][0].shape[0], 2)
+        self.assertFalse(blocks[0][0].flags['OWNDATA'])
+        np.testing.assert_array_equal(np.concatenate(blocks[0], axis=1), stereo[:3000].T)
+        np.testing.assert_array_equal(np.concatenate(blocks[1], axis=1)[0], mono[:3000])
+        self.assertEqual(deinterleave(stereo).shape, (2, 8000))
+
+        with tempfile.TemporaryDirectory() as folder:
+            outputs = [os.path.join(folder, 'strings.wav'), os.path.join(folder, 'voice.wav')]
+            record_devices(outputs, [(0, 2), (1, 1)], duration=0.25, sample_rate=8000, audio=[FakeAudio(stereo, 8000), FakeAudio(mono, 8000)])
+            self.assertEqual(wavfile.read(outputs[0])[1].shape, (2000, 2))
+            np.testing.assert_array_equal(wavfile.read(outputs[1])[1], mono[:2000])
+
+
+# AudioBackend.py
+############################################################################################
+    def test_shared_audio(self):
+        try:
+            audio = shared_audio()
+        except Exception as error:
+            self.skipTest(f'no audio system: {error}')
+        self.assertIsInstance(audio, PyAudioBackend)
+        # One PortAudio instance for everyone, which callers cannot terminate
+        audio.terminate()
+        self.assertIs(shared_audio(), audio)
+        self.assertIs(audio.devices(), audio.devices())
+        self.assertEqual(list_audio_devices(), list_audio_devices(audio))
+
+    def test_pyaudio_backend_refresh(self):
+        with patch('AudioBackend.pyaudio.PyAudio') as portaudio:
+            portaudio.return_value.get_device_count.return_value = 0
+            portaudio.return_value._streams = set()
+            audio = PyAudioBackend()
+            first = audio.audio
+            self.assertIs(audio.devices(), audio.devices())
+            # Refreshing restarts PortAudio, the only way it notices a new device
+            audio.devices(refresh=True)
+            first.terminate.assert_called_once()
+            self.assertEqual(portaudio.call_count, 2)
+            # but not while a stream is open
+            audio.audio._streams = {'stream'}
+            audio.devices(refresh=True)
+            self.assertEqual(portaudio.call_count, 2)
+
+    def test_fake_audio_devices(self):
+        audio = FakeAudio(np.zeros((100, 2)), 8000, name='Test input')
+        self.assertEqual(list_audio_devices(audio), ['Test input'])
+        self.assertTrue(has_input_device(audio))
+        self.assertEqual(audio.devices()[0]['maxInputChannels'], 2)
+
+        # A backend without a cached device list, like a plain pyaudio.PyAudio, is asked device by device
+        class PlainAudio:
+            get_device_count = audio.get_device_count
+            get_device_info_by_index = audio.get_device_info_by_index
+        self.assertTrue(has_input_device(PlainAudio()))
+
+    def test_fake_audio_sources(self):
+        with tempfile.TemporaryDirectory() as folder:
+            input_file = os.path.join(folder, 'input.wav')
+            wavfile.write(input_file, 8000, np.linspace(-1, 1, 4000, dtype=np.float32))
+            audio = FakeAudio.from_wav(input_file, speed=0)
+            # Float files are brought to 16 bit
+            self.assertEqual((audio.sample_rate, audio.signal.min(), audio.signal.max()), (8000, -32767, 32767))
+            # and so are 32 bit and offset 8 bit ones
+            for samples in [np.array([-2**31, 0, 2**31 - 1], dtype=np.int32), np.array([0, 128, 255], dtype=np.uint8)]:
+                wavfile.write(input_file, 8000, samples)
+                np.testing.assert_allclose(FakeAudio.from_wav(input_file).signal, [-32767, 0, 32767], atol=260)
+
+            output_file = os.path.join(folder, 'recorded.wav')
+            record_audio(output_file, duration=0.5, chunk_size=256, sample_rate=8000, audio=audio)
+            _, recorded = wavfile.read(output_file)
+            np.testing.assert_array_equal(recorded, audio.signal.astype(np.int16))
+
+        audio = FakeAudio.tone(0.5, [440, 660], 8000, amplitude=0.5, speed=0)
+        self.assertEqual(audio.name, '440 Hz + 660 Hz')
+        self.assertLessEqual(np.max(np.abs(audio.signal)), 0.5 * 32767 + 1)
+        self.assertAlmostEqual(read_wave_freq(FakeAudio.tone(0.5, [440], 8000).signal, 8000), 440, delta=2)
+
 
 # SongToWav.py
 ############################################################################################
@@ -160,6 +376,79 @@ class TestMyFunctions(unittest.TestCase):
         os.remove(input_filename)
         os.remove(output_filename)
 
+    def test_render_song(self):
+        notes = [('A4', 1), ('C4', 0.5), ('G3', 2)]
+        song = render_song(notes, 120, sample_rate=8000)
+        # Each note lasts beats * 60 / bpm seconds
+        self.assertEqual(len(song), 4000 + 2000 + 8000)
+        # Every note matches a freshly generated sine wave
+        np.testing.assert_allclose(song[:4000], generate_sine_wave(0.5, 8000, pitch_to_freq('A4')), atol=1e-9)
+        np.testing.assert_allclose(song[4000:6000], generate_sine_wave(0.25, 8000, pitch_to_freq('C4')), atol=1e-9)
+        # Empty scores render to an empty buffer
+        self.assertEqual(len(render_song([], 120)), 0)
+
+    def test_read_songs(self):
+        with tempfile.TemporaryDirectory() as folder:
+            inputs = []
+            for name in ['first', 'second']:
+                input_filename = os.path.join(folder, name + '.txt')
+                with open(input_filename, 'w') as f:
+                    f.write('120\nC4, 1\nD4, 1\n')
+                inputs.append(input_filename)
+            outputs = read_songs(inputs, output_dir=os.path.join(folder, 'out'))
+            self.assertEqual([os.path.basename(o) for o in outputs], ['first.wav', 'second.wav'])
+            for output in outputs:
+                sample_rate, audio_data = wavfile.read(output)
+                self.assertEqual(len(audio_data), sample_rate)
+
+    def test_song_chunks(self):
+        notes = [('A4', 1), ('C4', 0.5), ('G3', 2)]
+        chunks = list(song_chunks(notes, 120, sample_rate=8000, chunk_size=3000))
+        self.assertEqual([len(c) for c in chunks], [3000, 1000, 2000, 3000, 3000, 2000])
+        np.testing.assert_allclose(np.concatenate(chunks), render_song(notes, 120, sample_rate=8000), atol=1e-9)
+
+    def test_render_score(self):
+        notes = [('A4', 1), ('C4', 0.5), ('A4', 1), ('A4', 2)]
+        score = compile_score(notes, 120, 8000)
+        self.assertEqual(score['start'].tolist(), [0, 4000, 6000, 10000])
+        self.assertEqual(score['length'].tolist(), [4000, 2000, 4000, 8000])
+        cache = NoteCache()
+        np.testing.assert_array_equal(render_score(score, 8000, cache), render_song(notes, 120, 8000))
+        # The repeated A4 is a hit, the longer one only synthesizes its tail
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        # Slower and transposed variants reuse the buffers they can
+        np.testing.assert_array_equal(render_score(compile_score(notes, 60, 8000), 8000, cache), render_song(notes, 60, 8000))
+        self.assertEqual((cache.hits, cache.misses), (3, 5))
+        down = render_score(transpose(score, -12), 8000, cache)
+        np.testing.assert_allclose(down[:4000], render_song([('A3', 1)], 120, 8000), atol=1e-9)
+        # Least recently used notes go first once the cache is full
+        small = NoteCache(max_bytes=5000 * 8)
+        small.note(440, 4000, 8000)
+        small.note(220, 1000, 8000)
+        small.note(110, 1000, 8000)
+        self.assertEqual([frequency for frequency, _ in small.notes], [220, 110])
+        self.assertEqual(small.bytes, 2000 * 8)
+
+    def test_read_song_cache_dir(self):
+        with tempfile.TemporaryDirectory() as folder:
+            song_file = os.path.join(folder, 'song.txt')
+            with open(song_file, 'w') as f:
+                f.write('120\nC4, 1\nD4, 1\n')
+            cache_dir = os.path.join(folder, 'cache')
+            first, second = os.path.join(folder, 'first.wav'), os.path.join(folder, 'second.wav')
+            self.assertFalse(read_song(song_file, first, cache_dir))
+            self.assertTrue(read_song(song_file, second, cache_dir))
+            with open(first, 'rb') as f, open(second, 'rb') as g:
+                self.assertEqual(f.read(), g.read())
+            # An edited song is rendered again
+            with open(song_file, 'a') as f:
+                f.write('E4, 1\n')
+            self.assertFalse(read_song(song_file, second, cache_dir))
+            self.assertEqual(len(wavfile.read(second)[1]), 44100 * 3 // 2)
+            # and so is every song once the synthesis changes
+            with patch('SongToWav.renderer_version', 2):
+                self.assertFalse(read_song(song_file, second, cache_dir))
+
 
 
 # WaveGenerator.py
@@ -209,6 +498,687 @@ class TestMyFunctions(unittest.TestCase):
         max_freq = read_wave_freq(wave)
         self.assertAlmostEqual(max_freq, frequency, delta=1)  # Delta set to 1 Hz
 
+    def test_oscillator_bank(self):
+        time_vector = np.arange(8000) / 8000
+        expected = np.sin(2 * np.pi * 220 * time_vector) + 0.5 * np.sin(2 * np.pi * 330 * time_vector)
+        # Rendering in uneven blocks keeps every voice's phase
+        bank = OscillatorBank([220, 330], 8000, amplitudes=[1, 0.5], block_size=1000)
+        wave = np.concatenate([bank.render(n) for n in [1, 2999, 5000]])
+        np.testing.assert_allclose(wave, expected, atol=1e-9)
+        np.testing.assert_array_equal(wave, OscillatorBank([220, 330], 8000, amplitudes=[1, 0.5], block_size=1000).render(8000))
+        # Renders into a caller supplied buffer, optionally as float32
+        bank = OscillatorBank([220, 330], 8000, amplitudes=[1, 0.5], dtype=np.float32)
+        out = np.empty(8000, dtype=np.float32)
+        self.assertIs(bank.render(out=out), out)
+        np.testing.assert_allclose(out, expected, atol=1e-3)
+        # No voices is silence
+        self.assertFalse(np.any(OscillatorBank([]).render(100)))
+
+    def test_generate_sequence(self):
+        wave = generate_sequence([440, 660], [0.5, 0.5], 8000)
+        self.assertEqual(len(wave), 8000)
+        # The second note starts where the first note's phase left off, so there is no jump
+        self.assertLess(np.max(np.abs(np.diff(wave))), 2 * np.pi * 660 / 8000)
+        np.testing.assert_allclose(wave[:4000], generate_sine_wave(0.5, 8000, 440), atol=1e-9)
+
+    def test_generate_chunks(self):
+        # Chunks join back into the same chord generate_chord makes
+        chunks = list(generate_chunks(2, 8000, [220, 330], chunk_size=3000))
+        self.assertEqual([len(c) for c in chunks], [3000, 3000, 3000, 3000, 3000, 1000])
+        np.testing.assert_array_equal(np.concatenate(chunks), generate_chord(2, 8000, [220, 330]))
+
+
+# WaveToWav.py
+############################################################################################
+    def test_wave_to_wav_stream(self):
+        with tempfile.TemporaryDirectory() as folder:
+            whole_file = os.path.join(folder, 'whole.wav')
+            stream_file = os.path.join(folder, 'stream.wav')
+            wave = generate_chord(1, 8000, [220, 330])
+            wave_to_wav(wave, 8000, output_file=whole_file)
+            # A list of chunks is read twice to find the peak
+            chunks = list(generate_chunks(1, 8000, [220, 330], chunk_size=1000))
+            self.assertEqual(wave_to_wav_stream(chunks, 8000, output_file=stream_file), 8000)
+            rate, expected = wavfile.read(whole_file)
+            rate, audio_data = wavfile.read(stream_file)
+            self.assertEqual(rate, 8000)
+            np.testing.assert_array_equal(audio_data, expected)
+            # A function returning fresh generators works the same way
+            wave_to_wav_stream(lambda: generate_chunks(1, 8000, [220, 330], chunk_size=1000), 8000, output_file=stream_file)
+            rate, audio_data = wavfile.read(stream_file)
+            np.testing.assert_array_equal(audio_data, expected)
+            # A one-shot generator needs the peak up front
+            with self.assertRaises(ValueError):
+                wave_to_wav_stream(generate_chunks(1, 8000), 8000, output_file=stream_file)
+            wave_to_wav_stream(generate_chunks(1, 8000), 8000, output_file=stream_file, peak=1.0)
+            rate, audio_data = wavfile.read(stream_file)
+            self.assertEqual(len(audio_data), 8000)
+
+
+
+# PitchTracker.py
+############################################################################################
+    def test_pitch_tracker(self):
+        tracker = PitchTracker(44100, frame_size=2048, hop_size=512)
+        for pitch in ['C2', 'A3', 'C4', 'A4', 'C6']:
+            tracker.reset()
+            frequency = pitch_to_freq(pitch)
+            pitches = tracker.process(generate_sine_wave(0.25, 44100, frequency))
+            # One estimate per hop once the first frame is full
+            self.assertEqual(len(pitches), 1 + (11025 - 2048) // 512)
+            # Within a cent of the real pitch, far finer than an FFT bin
+            self.assertTrue(np.all(np.abs(1200 * np.log2(pitches / frequency)) < 1))
+        # Silence has no pitch
+        tracker.reset()
+        self.assertTrue(np.all(tracker.process(np.zeros(4096)) == 0))
+        # Samples can arrive in blocks of any size
+        tracker.reset()
+        wave = generate_sine_wave(0.25, 44100, 330)
+        blocks = np.concatenate([tracker.process(wave[i:i + 300]) for i in range(0, len(wave), 300)])
+        tracker.reset()
+        np.testing.assert_allclose(blocks, tracker.process(wave))
+
+    def test_pitch_tracker_circular_buffer(self):
+        wave = generate_sine_wave(0.25, 44100, 262) + np.linspace(0, 0.1, 11025)
+        tracker = PitchTracker(44100, frame_size=4096, hop_size=256)
+        pitches = np.concatenate([tracker.process(wave[i:i + 1000]) for i in range(0, len(wave), 1000)])
+        # Each hop analyzes the same frame as slicing the whole wave would
+        frames = frame_signal(wave, 4096, 256)
+        np.testing.assert_allclose(pitches, [tracker.estimate(frame) for frame in frames])
+        np.testing.assert_array_equal(tracker.recent(300), wave[-300:])
+
+    def test_parabolic_offset(self):
+        # A parabola with its minimum at 2.25
+        values = (np.arange(5) - 2.25) ** 2
+        self.assertAlmostEqual(parabolic_offset(values, 2), 0.25)
+        self.assertEqual(parabolic_offset(values, 0), 0.0)
+        self.assertAlmostEqual(yin_pitch(generate_sine_wave(0.1, 44100, 196)), 196, delta=0.2)
+
+
+# Spectrum.py
+############################################################################################
+    def test_magnitude_spectrum(self):
+        wave = generate_chord(1, 8000, [440, 1000])
+        freqs, magnitude = magnitude_spectrum(wave, 8000)
+        # Only the positive half of the spectrum is returned
+        self.assertEqual(len(freqs), 4001)
+        self.assertEqual(len(magnitude), 4001)
+        self.assertEqual(freqs[-1], 4000)
+        np.testing.assert_array_equal(sorted(freqs[np.argsort(magnitude)[-2:]]), [440, 1000])
+        # The frequency axis is computed once per length
+        self.assertIs(rfft_frequencies(8000, 8000), freqs)
+        self.assertFalse(freqs.flags.writeable)
+        self.assertEqual(dominant_frequency(generate_sine_wave(1, 8000, 1000), 8000), 1000)
+
+    def test_fft_size(self):
+        self.assertEqual(fft_size(1000), 1000)
+        self.assertEqual(fft_size(1000, 'pow2'), 1024)
+        self.assertEqual(fft_size(1024, 'pow2'), 1024)
+        self.assertEqual(fft_size(1031, 'fast'), 1080)
+        with self.assertRaises(ValueError):
+            fft_size(1000, 'pow3')
+        freqs, magnitude = magnitude_spectrum(generate_sine_wave(1, 8000, 440), 8000, pad='pow2')
+        self.assertEqual(len(magnitude), 4097)
+        self.assertAlmostEqual(freqs[np.argmax(magnitude)], 440, delta=8000 / 8192)
+
+
+# WavIO.py
+############################################################################################
+    def test_open_wav(self):
+        with tempfile.TemporaryDirectory() as folder:
+            output_file = os.path.join(folder, 'stereo.wav')
+            stereo = np.stack([np.arange(-500, 500), np.arange(500, -500, -1)], axis=1).astype(np.int16)
+            wavfile.write(output_file, 22050, stereo)
+            samples, sample_rate = open_wav(output_file)
+            # The file is memory mapped at its own sample rate, not resampled
+            self.assertIsInstance(samples, np.memmap)
+            self.assertEqual(sample_rate, 22050)
+            np.testing.assert_array_equal(samples, stereo)
+            # Channels are averaged to mono and scaled to -1..1
+            np.testing.assert_array_equal(to_float(samples[:3]), [0, 0, 0])
+            self.assertEqual(to_float(samples[:3], mono=False)[0, 0], -500 / 32768)
+            del samples
+
+    def test_load_audio(self):
+        with tempfile.TemporaryDirectory() as folder:
+            output_file = os.path.join(folder, 'tone.wav')
+            wave = generate_sine_wave(2, 8000, 440)
+            wave_to_wav(wave, 8000, output_file=output_file)
+            audio, sample_rate = load_audio(output_file)
+            self.assertEqual(audio.dtype, np.float32)
+            self.assertEqual(sample_rate, 8000)
+            np.testing.assert_allclose(audio, wave, atol=1e-4)
+            # Only the requested window is returned
+            window, sample_rate = load_audio(output_file, start=0.5, stop=0.75)
+            np.testing.assert_array_equal(window, audio[4000:6000])
+            # Windows walk the file without loading it
+            starts = [start for start, window in iter_windows(output_file, 4000, 2000)]
+            self.assertEqual(starts, [0, 2000, 4000, 6000, 8000, 10000, 12000])
+            # A length that is not a multiple of the hop ends with a short window, so the tail is not lost
+            wave_to_wav(generate_sine_wave(1.25, 8000, 440), 8000, output_file=output_file)
+            windows = list(iter_windows(output_file, 4000))
+            self.assertEqual([(start, len(window)) for start, window in windows], [(0, 4000), (4000, 4000), (8000, 2000)])
+            self.assertEqual([start for start, _ in iter_windows(output_file, 4000, 3000)], [0, 3000, 6000])
+
+
+# WavToFreq.py
+############################################################################################
+    def test_find_dominant_freq(self):
+        with tempfile.TemporaryDirectory() as folder:
+            output_file = os.path.join(folder, 'notes.wav')
+            wave_to_wav(np.concatenate([generate_sine_wave(1, 8000, 440), generate_sine_wave(1, 8000, 660)]), 8000, output_file=output_file)
+            self.assertAlmostEqual(find_dominant_freq(output_file, start=0, stop=1), 440, delta=1)
+            self.assertAlmostEqual(find_dominant_freq(output_file, start=1), 660, delta=1)
+            freqs, magnitude = find_frequencies(output_file, pad=None)
+            self.assertEqual(len(freqs), 8001)
+            self.assertEqual(freqs[-1], 4000)
+
+
+# PitchTrack.py
+############################################################################################
+    def test_frame_signal(self):
+        wave = np.arange(10.0)
+        frames = frame_signal(wave, 4, 3)
+        np.testing.assert_array_equal(frames, [[0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9]])
+        # Frames are views into the wave, not copies
+        self.assertTrue(np.shares_memory(frames, wave))
+        self.assertEqual(frame_signal(wave, 20, 3).shape, (0, 20))
+        self.assertEqual(stft(np.zeros(5000), 2048, 512).shape, (6, 1025))
+
+    def test_pitch_track(self):
+        wave = np.concatenate([generate_sine_wave(0.5, 8000, 220), np.zeros(4000), generate_sine_wave(0.5, 8000, 445)])
+        track = pitch_track(wave, 8000, frame_size=1024, hop=256)
+        self.assertEqual(len(track), (12000 - 1024) // 256 + 1)
+        np.testing.assert_allclose(np.diff(track['time']), 256 / 8000)
+        # Each note is tracked with its cents, and the silence in between has no pitch
+        first, gap, last = track[track['time'] < 0.4], track[(track['time'] > 0.65) & (track['time'] < 0.85)], track[track['time'] > 1.1]
+        np.testing.assert_allclose(first['frequency'], 220, atol=0.1)
+        # At 8 kHz a 445 Hz period is only 18 samples long, so allow a few cents
+        np.testing.assert_allclose(last['cents'], cents_off(445), atol=3)
+        self.assertTrue(np.all(gap['frequency'] == 0))
+        self.assertTrue(np.all(np.isnan(gap['cents'])))
+
+    def test_iter_track_file(self):
+        with tempfile.TemporaryDirectory() as folder:
+            output_file = os.path.join(folder, 'song.wav')
+            wave_to_wav(render_song([('G3', 1), ('A3', 1), ('B3', 2)], 120, 8000), 8000, output_file=output_file)
+            track, sample_rate = track_file(output_file, frame_size=1024, hop=256)
+            # Reading the file a few frames at a time gives the same track
+            rows = list(iter_track_file(output_file, frame_size=1024, hop=256, block_frames=7))
+            self.assertEqual(len(rows), len(track))
+            np.testing.assert_allclose([row['frequency'] for row in rows], track['frequency'])
+            self.assertAlmostEqual(np.median(track['frequency'][track['time'] > 1.1]), pitch_to_freq('B3'), delta=0.2)
+
+
+# AnalysisStore.py
+############################################################################################
+    def test_export_analysis(self):
+        with tempfile.TemporaryDirectory() as folder:
+            input_file = os.path.join(folder, 'song.wav')
+            wave_to_wav(render_song([('G3', 1), ('A3', 1), ('B3', 2)], 120, 8000), 8000, output_file=input_file)
+            analysis = export_analysis(input_file, os.path.join(folder, 'song.analysis'), frame_size=1024, hop=256, max_frequency=2000)
+            track, sample_rate = track_file(input_file, frame_size=1024, hop=256)
+            # The stored track matches a fresh one to within float16 cents
+            np.testing.assert_array_equal(analysis.track()['time'], track['time'])
+            np.testing.assert_allclose(analysis.track()['frequency'], track['frequency'], rtol=1e-6)
+            np.testing.assert_allclose(analysis.track()['cents'], track['cents'], atol=0.05)
+            # A time range reads only the frames centred inside it
+            part = analysis.track(1.1, 1.5)
+            self.assertTrue(np.all((part['time'] >= 1.1) & (part['time'] <= 1.5)))
+            self.assertEqual(len(part), len(track[(track['time'] >= 1.1) & (track['time'] <= 1.5)]))
+            self.assertAlmostEqual(np.median(part['frequency']), pitch_to_freq('B3'), delta=0.2)
+            spectrogram = analysis.spectrogram(1.1, 1.5)
+            self.assertEqual(spectrogram.shape, (len(part), 257))
+            self.assertAlmostEqual(analysis.frequencies()[np.argmax(spectrogram.mean(axis=0))], pitch_to_freq('B3'), delta=8000 / 1024)
+            self.assertLess(analysis.size(), os.path.getsize(input_file))
+
+            # An unfinished export cannot be opened
+            os.remove(os.path.join(folder, 'song.analysis', 'meta.json'))
+            with self.assertRaises(FileNotFoundError):
+                AnalysisFile(os.path.join(folder, 'song.analysis'))
+
+        magnitudes = np.array([1.0, 0.1, 1e-3, 1e-6, 0.0])
+        # Within 0.2 dB down to the -100 dB floor, and 0 below it
+        decoded = decode_spectrum(encode_spectrum(magnitudes))
+        np.testing.assert_allclose(decoded[:3], magnitudes[:3], rtol=0.025)
+        self.assertEqual(decoded[-1], 0)
+        np.testing.assert_allclose(decode_spectrum(encode_spectrum(magnitudes, 'float16'), 'float16'), magnitudes, rtol=1e-3, atol=1e-7)
+        with self.assertRaises(ValueError):
+            write_analysis(np.zeros(100), 8000, 'unused', spectrum='float64')
+
+
+# ChordDetector.py
+############################################################################################
+    def test_chord_detector(self):
+        detector = ChordDetector(8000, 2048)
+        chords = [['A4', 'C#5', 'E5'], ['C3', 'G3', 'E4', 'C5'], ['A2', 'A3'], ['G4'], []]
+        frames = np.array([generate_chord(2048 / 8000, 8000, pitches_to_freqs(chord)) / max(1, len(chord)) for chord in chords])
+        frequencies, salience = detector.detect_batch(frames)
+        self.assertEqual(chord_names(frequencies), [tuple(chord) for chord in chords])
+        # Frequencies are refined past the semitone grid, to within a few cents
+        self.assertLess(np.max(np.abs(1200 * np.log2(frequencies[0, :3] / pitches_to_freqs(chords[0])))), 5)
+        self.assertTrue(np.all(salience[frequencies == 0] == 0))
+
+        # A harmonic rich tone is one note, not one per harmonic
+        t = np.arange(2048) / 8000
+        tone = sum(np.sin(2 * np.pi * 220 * h * t) / h for h in range(1, 8)) / 2
+        self.assertEqual(detector.notes(tone), ('A3',))
+
+        times, frequencies = detect_chords(generate_chord(1, 8000, [261.63, 329.63, 392.0]) / 3, 8000, 2048, 512)
+        self.assertEqual(len(times), len(frequencies))
+        self.assertEqual(set(chord_names(frequencies)), {('C4', 'E4', 'G4')})
+
+
+# BatchAnalysis.py
+############################################################################################
+    def test_analyze_files(self):
+        with tempfile.TemporaryDirectory() as folder:
+            os.makedirs(os.path.join(folder, 'class'))
+            wave_to_wav(generate_sine_wave(1, 44100, 440), output_file=os.path.join(folder, 'a.wav'))
+            wave_to_wav(generate_sine_wave(1, 44100, 445), output_file=os.path.join(folder, 'class', 'b.wav'))
+            with open(os.path.join(folder, 'broken.wav'), 'w') as f:
+                f.write('not a wav file')
+            files = find_recordings(folder)
+            self.assertEqual([os.path.relpath(f, folder) for f in files], ['a.wav', 'broken.wav', os.path.join('class', 'b.wav')])
+
+            summaries = analyze_files(files, workers=2, progress=False)
+            in_tune, broken, sharp = summaries
+            self.assertEqual(in_tune['note'], 'A4')
+            self.assertEqual(in_tune['duration'], 1.0)
+            self.assertEqual(in_tune['in_tune'], 1.0)
+            self.assertAlmostEqual(sharp['mean_abs_cents'], 19.56, delta=1)
+            self.assertEqual(sharp['really_out_of_tune'], 1.0)
+            # A bad file is reported, not raised
+            self.assertTrue(broken['error'])
+
+            csv_file = os.path.join(folder, 'summary.csv')
+            json_file = os.path.join(folder, 'summary.json')
+            write_summaries(summaries, csv_file)
+            write_summaries(summaries, json_file)
+            with open(csv_file) as f:
+                self.assertEqual(len(f.readlines()), 4)
+            with open(json_file) as f:
+                self.assertEqual(json.load(f)[0]['note'], 'A4')
+
+# Intonation.py
+############################################################################################
+    def test_score_timeline(self):
+        timeline = score_timeline([('C4', 1), ('D4', 0.5), ('E4', 2)], 120)
+        np.testing.assert_allclose(timeline['start'], [0, 0.5, 0.75])
+        np.testing.assert_allclose(timeline['end'], [0.5, 0.75, 1.75])
+        self.assertEqual(list(timeline['pitch']), ['C4', 'D4', 'E4'])
+
+    def test_grade_notes(self):
+        # Played 10% slow after half a second of silence, with one note 30 cents sharp
+        notes = [('B3', 1), ('A3', 1), ('G3', 2), ('G3', 0.5), ('G3', 0.5), ('A3', 0.5), ('A3', 0.5), ('B3', 1)]
+        timeline = score_timeline(notes, 108)
+        stretch = 1.1
+        frequencies = timeline['frequency'].copy()
+        frequencies[2] *= 2 ** (30 / 1200)
+        lengths = np.round(np.diff(timeline['end'], prepend=0) * stretch * 44100).astype(int)
+        wave = np.concatenate([np.zeros(22050)] + [generate_sine_wave(n / 44100, 44100, f)[:n] for n, f in zip(lengths, frequencies)])
+        report = grade_notes(pitch_track(wave), timeline)
+
+        np.testing.assert_allclose(report['start'], 0.5 + timeline['start'] * stretch, atol=0.08)
+        np.testing.assert_allclose(report['cents'], [0, 0, -30, 0, 0, 0, 0, 0], atol=1)
+        self.assertEqual(list(report['level']), [0, 0, 3, 0, 0, 0, 0, 0])
+        with self.assertRaises(ValueError):
+            align(pitch_track(wave[:4096]), timeline)
+
+    def test_score_recording(self):
+        with tempfile.TemporaryDirectory() as folder:
+            recording = os.path.join(folder, 'buns.wav')
+            read_song('HotCrossBuns.txt', recording)
+            report = score_recording('HotCrossBuns.txt', recording)
+            self.assertEqual(len(report), 17)
+            self.assertTrue(np.all(report['level'] == 0))
+
+# PitchSmoother.py
+############################################################################################
+    def test_smoother_rejects_glitches(self):
+        raw = np.full(40, 220.0) * 2 ** (np.random.default_rng(0).normal(0, 0.1, 40) / 12)
+        raw[10] *= 2           # octave error
+        raw[20] = 110.0        # suboctave error
+        raw[30] *= 2 ** (1 / 12)  # one frame on the next note
+        smoothed, onsets = smooth_pitches(raw)
+        # Held steady within a few cents, with only the first frame an onset
+        self.assertTrue(np.all(np.abs(1200 * np.log2(smoothed / 220)) < 8))
+        self.assertEqual(list(np.flatnonzero(onsets)), [0])
+
+    def test_smoother_follows_notes(self):
+        raw = np.concatenate([np.full(10, 220.0), np.full(10, 246.94), np.full(8, 493.88), np.full(10, 440.0)])
+        smoothed, onsets = smooth_pitches(raw)
+        # A new note shows one frame after it starts, without gliding in, and
+        # a lasting octave jump is believed after octave_confirm frames
+        self.assertEqual(list(np.flatnonzero(onsets)), [0, 11, 23, 29])
+        np.testing.assert_allclose(smoothed[[10, 11, 19, 22, 23, 29]], [220, 246.94, 246.94, 246.94, 493.88, 440], rtol=1e-3)
+
+    def test_smoother_confidence_gate(self):
+        smoother = PitchSmoother(hold=2)
+        smoother.update(440.0, 0.9)
+        # Unconfident frames hold the last pitch for a while, then read as silence
+        self.assertAlmostEqual(smoother.update(300.0, 0.2), 440)
+        self.assertAlmostEqual(smoother.update(0.0, 0.0), 440)
+        for _ in range(4):
+            self.assertEqual(smoother.update(0.0, 0.0), 0.0)
+        # Voicing again is a new note
+        self.assertAlmostEqual(smoother.update(330.0, 0.9), 330)
+        self.assertTrue(smoother.onset)
+
+    def test_smoother_spectral_onsets(self):
+        # The same note struck three times, dying away each time
+        note = generate_sine_wave(0.3, 44100, 440)[:13230] * np.exp(-np.arange(13230) / 44100 * 8)
+        wave = np.concatenate([np.zeros(4410), note, note, note, np.zeros(4410)])
+        wave += np.random.default_rng(1).normal(0, 0.005, len(wave))
+        frames = frame_signal(wave, 2048, 256)
+        frequencies, confidences = PitchTracker(44100, 2048, 256).estimate_batch(frames)
+        smoothed, onsets = smooth_pitches(frequencies, confidences, stft(wave, 2048, 256))
+        times = (np.arange(len(frames)) * 256 + 1024) / 44100
+        np.testing.assert_allclose(times[onsets], [0.1, 0.4, 0.7], atol=0.03)
+        # Nothing is heard after the last note stops
+        self.assertEqual(smoothed[-1], 0)
+
+# LiveTuner.py
+############################################################################################
+    def test_live_tuner(self):
+        signal = generate_sine_wave(1, 8000, 440) * 10000
+        tuner = LiveTuner(chunk_size=256, sample_rate=8000, frame_size=512, hop_size=256, audio=FakeAudio(signal, 8000, speed=4))
+        notes = []
+        # A display slower than the readings only skips readings, never audio
+        stats = tuner.run_headless(refresh=100, on_reading=lambda reading: (notes.append(reading.note), time.sleep(0.03)))
+        self.assertEqual(set(notes), {'A4'})
+        self.assertEqual(stats['dropped frames'], 0)
+        self.assertGreater(stats['readings not displayed'], 0)
+        self.assertEqual(tuner.latest().spectrum.shape, (257,))
+        self.assertIn('display latency max (ms)', stats)
+
+    def test_live_tuner_overlapping_frames(self):
+        # 445 Hz is 19.6 cents sharp of A4
+        signal = generate_sine_wave(0.5, 44100, 445) * 10000
+        tuner = LiveTuner(chunk_size=256, sample_rate=44100, frame_size=4096, hop_size=256, audio=FakeAudio(signal, 44100, speed=2))
+        stats = tuner.run_headless(refresh=200)
+        reading = tuner.latest()
+        self.assertAlmostEqual(reading.cents, -19.6, delta=1)
+        self.assertEqual(readout(reading), 'A4 20 cents sharp')
+        # One reading per hop once the first frame is full
+        self.assertEqual(stats['hops'], (22050 - 4096) // 256 + 1)
+        self.assertGreater(stats['update rate (Hz)'], 0)
+        self.assertGreater(stats['cpu per hop (ms)'], 0)
+        # The Hann windowed spectrum peaks at the bin nearest 445 Hz
+        self.assertEqual(np.argmax(reading.spectrum), 41)
+        self.assertEqual(readout(reading._replace(frequency=0.0)), 'None')
+        self.assertEqual(readout(reading._replace(cents=0.3)), 'A4 in tune')
+
+    def test_live_tuner_chords(self):
+        chord = FakeAudio.tone(0.5, [440, 554.37, 659.25], amplitude=0.9, speed=0)
+        tuner = LiveTuner(chunk_size=1024, frame_size=4096, hop_size=1024, audio=chord, chords=True)
+        tuner.start()
+        self.assertTrue(tuner.wait(10))
+        tuner.stop()
+        self.assertEqual(tuner.latest().chord, ('A4', 'C#5', 'E5'))
+
+    def test_live_tuner_skips_backlog(self):
+        tuner = LiveTuner(chunk_size=256, sample_rate=8000, frame_size=512, hop_size=256, max_backlog=2048, audio=FakeAudio([], 8000))
+        # A block larger than the analysis is allowed to lag only has its newest samples analyzed
+        tuner._analyze(np.zeros((40000, 1), dtype=np.int16))
+        self.assertEqual(tuner.stats()['dropped frames'], 40000 - 2048)
+        self.assertEqual(tuner.readings, 1)
+        self.assertEqual(tuner.tracker.frames, 7)
+
+
+# BenchmarkSuite.py
+############################################################################################
+    def test_benchmark_suite(self):
+        stats = measure(lambda: None, min_time=0.01)
+        self.assertGreaterEqual(stats['rounds'], 3)
+        self.assertLessEqual(stats['min'], stats['median'])
+
+        run = run_suite('cents_off array', min_time=0.01)
+        self.assertEqual(list(run['results']), ['cents_off array'])
+        self.assertEqual(list(run['results']['cents_off array']), ['10', '1000', '100000'])
+        # Results survive a trip through JSON, and a slower run is a regression
+        baseline = json.loads(json.dumps(run))
+        slower = json.loads(json.dumps(run))
+        slower['results']['cents_off array']['1000']['min'] *= 2
+        regressed = [(name, size) for name, size, _, _, _, regression in compare_runs(baseline, slower) if regression]
+        self.assertEqual(regressed, [('cents_off array', '1000')])
+
+        # A measured seconds value regresses too, while counts and other units are only reported
+        run = run_suite('chord detection accuracy')
+        values = run['results']['chord detection accuracy']['4096']['values']
+        self.assertEqual(values['chords named exactly (count)'], values['chords tried (count)'])
+        self.assertEqual(compare_runs(run, run), [])
+        baseline = {'results': {'live': {'256': {'values': {'cpu per hop': 1e-4, 'readings (count)': 10}}}}}
+        slower = {'results': {'live': {'256': {'values': {'cpu per hop': 3e-4, 'readings (count)': 40}}}}}
+        self.assertEqual([row[0] for row in compare_runs(baseline, slower) if row[-1]], ['live: cpu per hop'])
+
+        # Importing the suite needs no audio system; the audio benchmarks are skipped without pyaudio
+        script = ("import sys; sys.modules['pyaudio'] = None; import BenchmarkSuite; "
+                  "run = BenchmarkSuite.run_suite('fake capture', 0.01); print(list(run['skipped']), list(run['results']))")
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        self.assertEqual(output.strip(), "['fake capture'] []")
+
+# Metrics.py
+############################################################################################
+    def test_histogram(self):
+        histogram = Histogram()
+        values = np.random.default_rng(0).lognormal(-8, 1, 10000)
+        for value in values:
+            histogram.record(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 10000)
+        self.assertAlmostEqual(snapshot['sum'], values.sum())
+        self.assertEqual((snapshot['min'], snapshot['max']), (values.min(), values.max()))
+        for percent, key in [(50, 'p50'), (90, 'p90'), (99, 'p99')]:
+            self.assertAlmostEqual(snapshot[key] / np.percentile(values, percent), 1, delta=0.02)
+        self.assertEqual(Histogram().snapshot()['p99'], 0.0)
+
+    def test_metrics_export(self):
+        metrics = Metrics()
+        for seconds in [0.001, 0.002, 0.003]:
+            metrics.record('fft', seconds)
+        with metrics.timer('draw'):
+            pass
+        metrics.count('samples read', 256)
+        metrics.count('samples read', 256)
+        metrics.gauge('ring overruns', lambda: 3)
+        text = metrics.prometheus()
+        self.assertIn('# TYPE soundbyte_fft_seconds summary', text)
+        self.assertIn('soundbyte_fft_seconds_count 3', text)
+        self.assertIn('soundbyte_samples_read_total 512', text)
+        self.assertIn('soundbyte_ring_overruns 3', text)
+        with tempfile.TemporaryDirectory() as folder:
+            metrics.write(os.path.join(folder, 'metrics.json'))
+            with open(os.path.join(folder, 'metrics.json')) as f:
+                saved = json.load(f)
+            self.assertAlmostEqual(saved['timers']['fft']['p50'], 0.002, delta=0.002 / 64)
+            self.assertEqual(saved['timers']['draw']['count'], 1)
+        # Switched off, nothing is kept
+        metrics = Metrics(enabled=False)
+        metrics.record('fft', 1)
+        metrics.histogram('pitch').record(1)
+        metrics.count('hops')
+        self.assertEqual(metrics.snapshot(), {'timers': {}, 'counters': {}, 'gauges': {}})
+
+    def test_live_tuner_metrics(self):
+        metrics = Metrics()
+        signal = generate_sine_wave(duration=0.5, frequency=220) * 10000
+        tuner = LiveTuner(chunk_size=1024, frame_size=2048, hop_size=512, audio=FakeAudio(signal, speed=0), metrics=metrics)
+        server = serve_metrics(metrics, port=0)
+        sampler = StackSampler(interval=0.001)
+        sampler.start()
+        try:
+            tuner.start()
+            self.assertTrue(tuner.wait(10))
+            tuner.stop()
+            from urllib.request import urlopen
+            with urlopen(f'http://127.0.0.1:{server.server_address[1]}/metrics.json') as response:
+                served = json.load(response)
+        finally:
+            server.shutdown()
+            sampler.stop()
+        self.assertEqual(served['counters']['samples read'], len(signal))
+        self.assertEqual(served['counters']['hops'], tuner.hops)
+        self.assertEqual(served['timers']['pitch']['count'], tuner.hops)
+        self.assertEqual(served['timers']['analysis latency']['count'], tuner.readings)
+        self.assertEqual(served['gauges']['ring overruns'], 0)
+        self.assertTrue(sampler.samples)
+
+# LoggingSetup.py
+############################################################################################
+    def test_log_setup(self):
+        root = logging.getLogger()
+        level = root.level
+        # Records whose message is only built when the listener writes them
+        class Message:
+            def __str__(self):
+                threads.append(threading.current_thread())
+                return 'deferred'
+        threads = []
+        # Queued without being formatted
+        records = queue.SimpleQueue()
+        DeferredQueueHandler(records).handle(logging.LogRecord('test', logging.INFO, __file__, 0, '%s', (Message(),), None))
+        self.assertEqual((records.get().getMessage(), len(threads)), ('deferred', 1))
+        threads.clear()
+        with tempfile.TemporaryDirectory() as folder:
+            log_file = os.path.join(folder, 'logs', 'test.log')
+            before = sum(isinstance(handler, DeferredQueueHandler) for handler in root.handlers)
+            # Leaves any setup main() made alone
+            with patch('LoggingSetup._listener', None), patch('LoggingSetup._queue_handler', None):
+                log_setup(logging.INFO, {'INFO': 'blue'}, log_file, max_bytes=2000, backup_count=2)
+                # Setting up again replaces the first setup instead of adding to it
+                log_setup(logging.DEBUG, {'DEBUG': 'red'}, log_file, max_bytes=2000, backup_count=2)
+                self.assertEqual(sum(isinstance(handler, DeferredQueueHandler) for handler in root.handlers), before + 1)
+                logging.getLogger('test').debug('%s', Message())
+                for i in range(300):
+                    logging.getLogger('test').info('line %03d', i)
+                log_shutdown()
+            root.setLevel(level)
+            self.assertEqual(sum(isinstance(handler, DeferredQueueHandler) for handler in root.handlers), before)
+            # Written by the listener's thread
+            self.assertTrue(any(thread is not threading.current_thread() for thread in threads))
+            # Rotated at 2000 bytes, keeping two old files, with the newest lines in the live one
+            self.assertEqual(sorted(os.listdir(os.path.dirname(log_file))), ['test.log', 'test.log.1', 'test.log.2'])
+            self.assertLessEqual(max(os.path.getsize(log_file + suffix) for suffix in ['', '.1', '.2']), 2000)
+            with open(log_file) as f:
+                lines = f.read().splitlines()
+            self.assertIn('line 299', lines[-1])
+            self.assertIn('\033[', lines[-1])
+
+# SoundByte.py
+############################################################################################
+    def test_soundbyte_cli(self):
+        with tempfile.TemporaryDirectory() as folder:
+            output_file = os.path.join(folder, 'chord.wav')
+            with redirect_stdout(StringIO()) as output:
+                soundbyte(['synth', 'A4', '659.25', '--seconds', '0.5', '-o', output_file])
+                soundbyte(['tune', '442', 'Bb3'])
+            sample_rate, samples = wavfile.read(output_file)
+            self.assertEqual((sample_rate, len(samples)), (44100, 22050))
+            lines = output.getvalue().splitlines()
+            self.assertIn('A4', lines[1])
+            self.assertIn('-7.85 cents', lines[1])
+            self.assertIn('A#3', lines[2])
+            with redirect_stdout(StringIO()), self.assertRaises(SystemExit):
+                soundbyte(['tune', 'H4'])
+
+            # A fresh process making a tone loads none of the slow imports
+            here = os.path.dirname(os.path.abspath(__file__))
+            check = (f"import sys, SoundByte; SoundByte.main(['synth', 'C4', '-o', {output_file!r}]); "
+                     "print(sorted(m for m in ('matplotlib', 'scipy', 'pyaudio', 'tqdm', 'colorlog') if m in sys.modules))")
+            loaded = subprocess.run([sys.executable, '-c', check], cwd=here, capture_output=True, text=True, check=True)
+            self.assertEqual(loaded.stdout.splitlines()[-1], '[]')
+            # and tuning a few frequencies does not even load numpy
+            check = "import sys, SoundByte; SoundByte.main(['tune', '442', 'Bb3']); print('numpy' in sys.modules)"
+            loaded = subprocess.run([sys.executable, '-c', check], cwd=here, capture_output=True, text=True, check=True)
+            self.assertEqual(loaded.stdout.splitlines()[-1], 'False')
+
+
+# EnsembleTuner.py
+############################################################################################
+    def test_ensemble_tuner(self):
+        # A four channel device and a mono one, each channel tuned on its own. The input runs as fast as it
+        # can and the backlog is never cut short, so no frame is dropped however loaded the machine is
+        strings = FakeAudio.channel_tones(0.5, [196, 293.66, 440, 659.25], speed=0)
+        voice = FakeAudio.tone(0.5, [261.63], speed=0)
+        tuner = EnsembleTuner([(0, 4), (1, 1)], frame_size=2048, max_backlog=10**6, audio=[strings, voice], metrics=Metrics())
+        self.assertEqual(tuner.labels, ['0:0', '0:1', '0:2', '0:3', '1:0'])
+        stats = tuner.run_headless(refresh=100)
+        self.assertEqual([reading.note for reading in tuner.latest()], ['G3', 'D4', 'A4', 'E5', 'C4'])
+        self.assertEqual({channel['dropped frames'] for channel in stats.values()}, {0})
+        # Every channel analyzed every hop, and the counters survived the threads
+        self.assertEqual(len({channel['hops'] for channel in stats.values()}), 1)
+        self.assertEqual(tuner.metrics.counters['samples analyzed'], 5 * 22050)
+        self.assertEqual(parse_source('2:4'), (2, 4))
+        self.assertEqual(parse_source('3'), (3, 1))
+        with redirect_stdout(StringIO()) as output:
+            soundbyte(['ensemble', '--tone', '220', '330', '--seconds', '0.3', '--speed', '0', '--quiet'])
+        self.assertIn('0:1:', output.getvalue())
+
+
+# AsyncTuner.py
+############################################################################################
+    def test_async_tuner(self):
+        live_tuner = LiveTuner(frame_size=2048, audio=FakeAudio.tone(0.5, [440], speed=2), metrics=Metrics())
+
+        async def run():
+            tuner = AsyncTuner(live_tuner)
+            server = TunerServer(tuner, port=0)
+            await server.start()
+            clients = [asyncio.create_task(collect(subscribe(port=server.port))) for _ in range(2)]
+            while server.clients < 2:
+                await asyncio.sleep(0.01)
+            # Every reader subscribes before the input starts, so none misses the first frames
+            stalled = asyncio.Event()
+            every = asyncio.create_task(collect(tuner.frames(drop_oldest=False)))
+            slow = asyncio.create_task(collect(tuner.frames(maxsize=2), stall=stalled))
+            await asyncio.sleep(0)
+            await tuner.start()
+            await tuner.watcher
+            stalled.set()
+            results = await asyncio.gather(every, slow, *clients)
+            await server.stop()
+            return results
+
+        #Takes one frame then waits for stall, if given, before taking the rest
+        async def collect(frames, stall=None):
+            received = []
+            async for frame in frames:
+                received.append(frame)
+                if stall is not None:
+                    await stall.wait()
+            return received
+
+        every, slow, *clients = asyncio.run(run())
+        # Analyzed once, whoever is listening; a stalled reader only misses frames, one that waits misses none
+        self.assertEqual([frame.sequence for frame in every], list(range(live_tuner.readings)))
+        self.assertGreater(live_tuner.metrics.counters['frames dropped by readers'], 0)
+        self.assertLessEqual(len(slow), 3)
+        self.assertEqual(slow[-1].sequence, every[-1].sequence)
+        self.assertEqual({every[-1].note, every[-1].category}, {'A4', 'in tune'})
+        self.assertAlmostEqual(every[-1].time, 0.5, delta=0.01)
+        for received in clients:
+            self.assertEqual(received[-1], {**received[-1], 'note': 'A4', 'sequence': every[-1].sequence, 'category': 'in tune'})
+
+    def test_async_tuner_stop(self):
+        live_tuner = LiveTuner(frame_size=2048, audio=FakeAudio.tone(5, [440], speed=4), metrics=Metrics())
+
+        # A reader that holds up the analysis and stops reading does not keep stop() waiting
+        async def run():
+            tuner = AsyncTuner(live_tuner)
+            frames = tuner.frames(maxsize=2, drop_oldest=False)
+            await tuner.start()
+            first = await anext(frames)
+            await asyncio.sleep(0.2)
+            await asyncio.wait_for(tuner.stop(), 5)
+            rest = [frame async for frame in frames]
+            return first, rest
+
+        first, rest = asyncio.run(run())
+        self.assertEqual(first.sequence, 0)
+        self.assertLess(live_tuner.received, 5 * 44100)
+        self.assertEqual(rest[-1].sequence, live_tuner.readings - 1)
 
 
 def main():
@@ -223,17 +1193,22 @@ def main():
     # Iterate over each test case
     for test_case in test_cases:
         # Run the test case
+        start = time.perf_counter()
         result = test_case.run()
+        elapsed = f" ({(time.perf_counter() - start) * 1000:.0f} ms)"
         
         # Get the test name
         test_name = test_case._testMethodName
         
+        # Print the test name in yellow if it was skipped, e.g. with no microphone
+        if result.skipped:
+            print("\033[33m" + test_name + " skipped: " + result.skipped[0][1] + "\033[0m")
         # Print the test name in green if the test was successful
-        if result.wasSuccessful():
-            print("\033[92m" + test_name + " passed\033[0m")
+        elif result.wasSuccessful():
+            print("\033[92m" + test_name + " passed" + elapsed + "\033[0m")
             #logging.info("\033[92m" + test_name + " passed\033[0m")
         else:
-            print("\033[91m" + test_name + " failed\033[0m")
+            print("\033[91m" + test_name + " failed" + elapsed + "\033[0m")
             logging.info("\033[91m" + test_name + " failed\033[0m")
             allTestPassed = 0
 
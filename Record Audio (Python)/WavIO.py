@@ -0,0 +1,70 @@
+import os
+import numpy as np
+from scipy.io import wavfile
+
+
+#Divisors that bring each PCM sample type into the range -1 to 1
+pcm_scales = {np.dtype(np.int16): 32768.0, np.dtype(np.int32): 2147483648.0, np.dtype(np.uint8): 128.0}
+
+
+#Opens a .wav file without reading it. PCM files are memory mapped, so the
+#samples are only read from disk when a slice of them is used
+#Arguments: (string) input file path
+#Returns: numpy array shaped (frames,) or (frames, channels), (int) sample rate
+def open_wav(input_file):
+    try:
+        sample_rate, samples = wavfile.read(input_file, mmap=True)
+    except ValueError:
+        # 24 bit and some float files cannot be memory mapped
+        sample_rate, samples = wavfile.read(input_file)
+    return samples, sample_rate
+
+#Converts raw samples to float32 between -1 and 1, averaging channels to mono
+#Arguments: (numpy array) samples shaped (frames,) or (frames, channels)
+#           (bool) mono defaults to True
+#Returns: numpy float32 array
+def to_float(samples, mono=True):
+    if samples.dtype == np.uint8:
+        audio = (samples.astype(np.float32) - 128) / 128
+    elif samples.dtype in pcm_scales:
+        audio = samples.astype(np.float32) / pcm_scales[samples.dtype]
+    else:
+        audio = samples.astype(np.float32)
+    if mono and audio.ndim > 1:
+        audio = audio.mean(axis=1, dtype=np.float32)
+    return audio
+
+#Loads audio at its native sample rate, optionally only between two times
+#.wav files are memory mapped so only the requested window is read; other
+#formats fall back to librosa, which is imported only when needed
+#Arguments: (string) input file path
+#           (float) start in seconds defaults to the beginning
+#           (float) stop in seconds defaults to the end
+#           (bool) mono defaults to True
+#Returns: numpy float32 array, (int) sample rate
+def load_audio(input_file, start=None, stop=None, mono=True):
+    if os.path.splitext(input_file)[1].lower() == '.wav':
+        samples, sample_rate = open_wav(input_file)
+        first = 0 if start is None else int(start * sample_rate)
+        last = None if stop is None else int(stop * sample_rate)
+        return to_float(samples[first:last], mono), sample_rate
+
+    import librosa
+    duration = None if stop is None else stop - (start or 0)
+    wave, sample_rate = librosa.load(input_file, sr=None, mono=mono, offset=start or 0.0, duration=duration)
+    return wave, sample_rate
+
+#Reads a .wav file one window at a time without loading the whole file
+#Arguments: (string) input file path
+#           (int) window_size samples per window
+#           (int) hop samples between window starts, defaults to window_size
+#Returns: generator of (int) start sample, numpy float32 window; the last window
+#         is shorter when the windows do not end exactly at the end of the file,
+#         so every sample is read
+def iter_windows(input_file, window_size, hop=None):
+    samples, sample_rate = open_wav(input_file)
+    hop = hop or window_size
+    for start in range(0, max(1, len(samples)), hop):
+        yield start, to_float(samples[start:start + window_size])
+        if start + window_size >= len(samples):
+            break
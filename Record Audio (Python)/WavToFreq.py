@@ -1,26 +1,27 @@
-import numpy as np
-import librosa
-import matplotlib.pyplot as plt
+from Spectrum import dominant_frequency, magnitude_spectrum
+from WavIO import load_audio
 
-def find_dominant_freq(input_file = "Python Files\\generated_wave.wav"):
-    wave, sample_rate = librosa.load(input_file)
+#Finds the loudest frequency in a file, or in part of it
+#Arguments: (string) input file path
+#           (string) pad policy, see Spectrum.fft_size
+#           (float) start and stop in seconds default to the whole file
+#Returns: (float) frequency in Hz
+def find_dominant_freq(input_file = "Python Files\\generated_wave.wav", pad='fast', start=None, stop=None):
+    wave, sample_rate = load_audio(input_file, start, stop)
+    return dominant_frequency(wave, sample_rate, pad)
 
-    fft = np.fft.fft(wave)
-
-    # Finding the dominant frequency
-    freqs = np.fft.fftfreq(len(fft), 1/sample_rate)
-    index = np.argmax(np.abs(fft))
-    dominant_freq = freqs[index]
-    return dominant_freq
-
-def find_frequencies(input_file = "Python Files\\generated_wave.wav"):
-    wave, sample_rate = librosa.load(input_file)
-    magnitude = np.abs(np.fft.fft(wave))
-    fft = np.fft.fft(wave)
-    freqs = np.fft.fftfreq(len(fft), 1/sample_rate)
-    return freqs, magnitude
+#Finds the spectrum of a file, or of part of it
+#Arguments: (string) input file path
+#           (string) pad policy, see Spectrum.fft_size
+#           (float) start and stop in seconds default to the whole file
+#Returns: (numpy array) positive frequencies, (numpy array) magnitudes
+def find_frequencies(input_file = "Python Files\\generated_wave.wav", pad='fast', start=None, stop=None):
+    wave, sample_rate = load_audio(input_file, start, stop)
+    return magnitude_spectrum(wave, sample_rate, pad)
 
+#Plots a spectrum; matplotlib is slow to import, so it is only loaded here
 def plot_freqs(freqs,magnitude):
+    import matplotlib.pyplot as plt
     plt.figure(figsize = (8, 5))
     plt.plot(freqs,magnitude)
     plt.xlabel("Frequency (Hz)")
@@ -1,5 +1,5 @@
 import numpy as np
-import matplotlib.pyplot as plt
+from Spectrum import dominant_frequency
 
 #Generates a sine wave using numpy
 #Arguments: (int) duration defaults to 5
@@ -12,24 +12,111 @@ def generate_sine_wave(duration=5, sample_rate=44100, frequency=440):
     return wave
 
 
+#Bank of sine oscillators that keeps each voice's phase between calls, so
+#blocks rendered one after another join without clicks. All voices in a block
+#are computed with one broadcasted sin over a (voices, samples) array
+#Each sample's phase depends only on how many samples have been rendered since
+#the voices were set, never on how the output was split into calls: blocks are
+#aligned to multiples of block_size from that point, and each block's starting
+#phase is worked out in float64 from its index. Rendering in any chunks gives
+#exactly the samples of rendering all at once
+class OscillatorBank:
+    def __init__(self, frequencies=[440], sample_rate=44100, amplitudes=None, dtype=np.float64, block_size=4096):
+        self.sample_rate = sample_rate
+        self.dtype = np.dtype(dtype)
+        self.block_size = block_size
+        self.ramp = np.arange(block_size, dtype=self.dtype)
+        # Phase of each voice when the voices were set, and samples rendered since
+        self.offsets = np.zeros(0)
+        self.elapsed = 0
+        self.set_frequencies(frequencies, amplitudes)
+
+    #Current phase of each voice, between 0 and 2 pi
+    @property
+    def phases(self):
+        return (self.offsets + self.increments * self.elapsed) % (2 * np.pi) if self.elapsed else self.offsets
+
+    #Changes the voices; voices that already exist keep their phase
+    #Arguments: (list) frequencies in Hz
+    #           (list) amplitudes, defaults to 1 per voice
+    def set_frequencies(self, frequencies, amplitudes=None):
+        current = self.phases
+        self.frequencies = np.asarray(frequencies, dtype=np.float64).reshape(-1)
+        voices = len(self.frequencies)
+        if amplitudes is None:
+            amplitudes = np.ones(voices)
+        self.amplitudes = np.asarray(amplitudes, dtype=self.dtype).reshape(-1)
+        offsets = np.zeros(voices)
+        kept = min(voices, len(current))
+        offsets[:kept] = current[:kept]
+        self.offsets = offsets
+        self.elapsed = 0
+        self.increments = 2 * np.pi * self.frequencies / self.sample_rate
+
+    #Renders the sum of all voices and advances their phases
+    #Arguments: (int) number of samples, or
+    #           (numpy array) out buffer to fill in place
+    #Returns: numpy array
+    def render(self, samples=None, out=None):
+        if out is None:
+            out = np.empty(samples, dtype=self.dtype)
+        if len(self.frequencies) == 0:
+            out[:] = 0
+            return out
+        increments = self.increments.astype(self.dtype)[:, None]
+        done = 0
+        while done < len(out):
+            index, offset = divmod(self.elapsed, self.block_size)
+            n = min(self.block_size - offset, len(out) - done)
+            start = (self.offsets + self.increments * (index * self.block_size)) % (2 * np.pi)
+            phase = start.astype(self.dtype)[:, None] + increments * self.ramp[offset:offset + n]
+            np.sin(phase, out=phase)
+            np.matmul(self.amplitudes, phase, out=out[done:done + n])
+            done += n
+            self.elapsed += n
+        return out
+
+
+#Generates a chord by adding sine waves together
+#Arguments: (int) duration defaults to 5
+#           (int) sample_rate defaults to 44100
+#           (list) frequencies defaults to an A major triad
+#Returns: numpy array
 def generate_chord(duration=5, sample_rate=44100, frequencies=[440, 554.37, 659.25]):
-    time_vector = np.linspace(0, duration, int(duration * sample_rate), endpoint=False)
-    chord_wave = np.zeros(len(time_vector))
-    
-    for frequency in frequencies:
-        sine_wave = np.sin(2 * np.pi * frequency * time_vector)
-        chord_wave += sine_wave
-    
-    return chord_wave
+    return OscillatorBank(frequencies, sample_rate).render(int(duration * sample_rate))
+
+#Generates one note after another without restarting the phase between notes
+#Arguments: (list) frequencies in Hz
+#           (list) durations in seconds
+#           (int) sample_rate defaults to 44100
+#           (dtype) np.float32 halves the memory of the output
+#Returns: numpy array
+def generate_sequence(frequencies, durations, sample_rate=44100, dtype=np.float64):
+    lengths = [int(duration * sample_rate) for duration in durations]
+    wave = np.empty(sum(lengths), dtype=dtype)
+    bank = OscillatorBank([], sample_rate, dtype=dtype)
+    start = 0
+    for frequency, length in zip(frequencies, lengths):
+        bank.set_frequencies([frequency])
+        bank.render(out=wave[start:start + length])
+        start += length
+    return wave
+
+#Generates a sine wave or chord one chunk at a time, for streaming to a .wav file
+#Arguments: (int) duration defaults to 5
+#           (int) sample_rate defaults to 44100
+#           (list) frequencies defaults to A4
+#           (int) chunk_size samples per chunk
+#Returns: generator of numpy arrays
+def generate_chunks(duration=5, sample_rate=44100, frequencies=[440], chunk_size=65536):
+    total = int(duration * sample_rate)
+    bank = OscillatorBank(frequencies, sample_rate)
+    for start in range(0, total, chunk_size):
+        yield bank.render(min(chunk_size, total - start))
 
 #Returns the frequency of a sine wave
 #Arguments: (numpy array) sine wave
+#           (int) sample_rate defaults to 44100
 #Returns: (int) maximum frequency 
-def read_wave_freq(wave):
-    fft = np.fft.fft(wave) 
-    fft_freq = np.fft.fftfreq(len(fft), 1 / 44100)
-    positive_freqs = fft_freq[:len(fft) // 2] # Isolate the positive frequencies 
-    magnitude_spectrum = np.abs(fft[:len(fft) // 2]) # Finds magnitude of each frequency 
-    max_freq_index = np.argmax(magnitude_spectrum) # Finds index of max frequency 
-    max_freq = positive_freqs[max_freq_index] # Finds biggest positive frequency 
-    return max_freq
\ No newline at end of file
+def read_wave_freq(wave, sample_rate=44100):
+    return dominant_frequency(wave, sample_rate)
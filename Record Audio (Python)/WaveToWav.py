@@ -1,12 +1,60 @@
 import numpy
 import numpy as np
-from scipy.io.wavfile import write
+import wave
 
+#Writes a wave held in memory to a 16 bit .wav file, normalized to its peak
+#Arguments: (numpy array) wave to write
+#           (int) sampling_rate defaults to 44100
+#           (string) output file path
+#Returns: N/A
 def wave_to_wav (sin_wave, sampling_rate = 44100, output_file='Python Files\\generated_wave.wav'):
-    
-    sin_wave = np.clip(sin_wave * (32767 / np.max(np.abs(sin_wave))), -32768, 32767)
-    #sin_wave *= 32767 / np.max(np.abs(sin_wave))
-    #Convert to 16 bit integers
-    sin_wave = sin_wave.astype(np.int16)
-    #Write to .wav file
-    write(output_file, sampling_rate, sin_wave)
+    sin_wave = np.asarray(sin_wave)
+    #Peak without allocating np.abs(sin_wave)
+    peak = max(np.max(sin_wave), -np.min(sin_wave))
+    chunks = (sin_wave[i:i + 65536] for i in range(0, len(sin_wave), 65536))
+    wave_to_wav_stream(chunks, sampling_rate, output_file, peak=peak)
+
+#Finds the largest absolute sample across an iterable of chunks
+#Arguments: (iterable) numpy array chunks
+#Returns: (float) peak
+def find_peak(chunks):
+    peak = 0.0
+    for chunk in chunks:
+        if len(chunk):
+            peak = max(peak, np.max(chunk), -np.min(chunk))
+    return peak
+
+#Writes chunks to a 16 bit .wav file as they arrive so memory stays bounded by the chunk size
+#Chunks are 1-D for mono or (samples, channels) for multi-channel audio
+#Arguments: (iterable or function) chunks, or a function returning a fresh iterable of chunks
+#           (int) sampling_rate defaults to 44100
+#           (string) output file path
+#           (float) peak used for normalization; if not given the chunks are read twice,
+#                   which needs a function or a re-iterable such as a list
+#Returns: (int) number of frames written
+def wave_to_wav_stream(chunks, sampling_rate = 44100, output_file='Python Files\\generated_wave.wav', peak=None):
+    get_chunks = chunks if callable(chunks) else lambda: chunks
+    if peak is None:
+        if not callable(chunks) and iter(chunks) is chunks:
+            raise ValueError("wave_to_wav_stream: a one-shot iterator needs a known peak")
+        peak = find_peak(get_chunks())
+    scale = 32767 / peak if peak else 0.0
+
+    frames = 0
+    channels = None
+    with wave.open(output_file, 'wb') as wf:
+        wf.setsampwidth(2)
+        wf.setframerate(sampling_rate)
+        for chunk in get_chunks():
+            chunk = np.asarray(chunk)
+            if channels is None:
+                channels = chunk.shape[1] if chunk.ndim > 1 else 1
+                wf.setnchannels(channels)
+            scaled = np.multiply(chunk, scale, dtype=np.float64)
+            np.clip(scaled, -32768, 32767, out=scaled)
+            #Convert to little endian 16 bit integers
+            wf.writeframes(scaled.astype('<i2').tobytes())
+            frames += len(chunk)
+        if channels is None:
+            wf.setnchannels(1)
+    return frames
@@ -1,89 +1,66 @@
-import pyaudio
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
+from LiveTuner import LiveTuner, readout
+from Metrics import metrics
 
 # Function to initialize the plot
 def init_plot():
-    line_time.set_ydata(np.zeros(CHUNK))
-    line_freq.set_ydata(np.zeros(int(CHUNK / 2)))
+    line_time.set_ydata(np.zeros(FRAME))
+    line_freq.set_ydata(np.zeros(len(tuner.frequencies)))
     return line_time, line_freq, note_text
 
-# Function to update the plot with new audio data
+# Function to update the plot with the newest reading
+# Capture and analysis run on their own threads, so a slow redraw only skips readings
 def update_plot(frame):
-    data = np.frombuffer(stream.read(CHUNK), dtype=np.int16)
+    with metrics.timer('draw'):
+        return draw(tuner.latest())
+
+def draw(reading):
+    if reading is None:
+        return line_time, line_freq, note_text
     
     # Time-domain plot
-    line_time.set_ydata(data)
+    line_time.set_ydata(reading.waveform)
     
     # Frequency-domain plot
-    fft_data = np.fft.fft(data)
-    fft_magnitude = np.abs(fft_data[:int(CHUNK / 2)]) * 2 / (32768 * CHUNK) # Scale FFT
-    line_freq.set_ydata(fft_magnitude)
-    
-    # Find the index of the peak frequency
-    peak_index = np.argmax(fft_magnitude)
+    line_freq.set_ydata(reading.spectrum)
     
-    # Calculate corresponding frequency and note
-    frequency = peak_index * RATE / CHUNK
-    note = get_note_name(frequency)
-    note_text.set_text(f'Note: {note}')
+    # Note and how far off it, e.g. Note: A4 12 cents flat, and every note of a chord
+    text = f'Note: {readout(reading)}'
+    if len(reading.chord) > 1:
+        text += '\nChord: ' + ' '.join(reading.chord)
+    note_text.set_text(text)
     
     return line_time, line_freq, note_text
 
-# Function to get the musical note name from frequency
-def get_note_name(frequency):
-    A4_frequency = 440.0
-    notes = ['A', 'A#', 'B', 'C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#']
-    
-
-    # when frequency = 0, log2(0) would cuase error 
-    # (also if frequency / A4_frequency is very close to 0 cuases round(infinity) so just keep frequecny above some min value)
-    if( frequency < 1 ):
-        return f'{'None'}'
-    
-    else:
-        # Calculate the number of half steps from A4
-        half_steps = round(12 * np.log2(frequency / A4_frequency)) # (round to 1 decimal ?)
-    
-        # Calculate the octave and note
-        octave = 4 + half_steps // 12
-        note_index = int(half_steps % 12)
-    
-        return f'{notes[note_index]}{octave}'
-
 # Parameters
-FORMAT = pyaudio.paInt16
-CHANNELS = 1
 RATE = 44100
-CHUNK = 1024
+FRAME = 4096
+HOP = 256
+CHUNK = 256
 
-# Initialize PyAudio
-p = pyaudio.PyAudio()
-
-# Open stream
-stream = p.open(format=FORMAT,
-                channels=CHANNELS,
-                rate=RATE,
-                input=True,
-                frames_per_buffer=CHUNK)
+# YIN over overlapping 4096 sample frames, updated every hop, on threads of its own
+# The chord detector reuses each reading's spectrum
+tuner = LiveTuner(chunk_size=CHUNK, sample_rate=RATE, frame_size=FRAME, hop_size=HOP, chords=True)
+tuner.start()
 
 # Initialize plot
 fig, (ax1, ax2) = plt.subplots(2, 1)
-x_time = np.arange(0, 2 * CHUNK, 2)
-x_freq = np.linspace(0, RATE / 2, int(CHUNK / 2))
-line_time, = ax1.plot(x_time, np.random.rand(CHUNK))
-line_freq, = ax2.plot(x_freq, np.random.rand(int(CHUNK / 2)))
+x_time = np.arange(FRAME)
+x_freq = tuner.frequencies
+line_time, = ax1.plot(x_time, np.random.rand(FRAME))
+line_freq, = ax2.plot(x_freq, np.random.rand(len(x_freq)))
 note_text = ax2.text(0.85, 0.9, '', transform=ax2.transAxes, ha='center')
 
 # Plot settings
 # ax1.set_ylim(-32768, 32767)
 ax1.set_ylim(-32768 / 8, 32767 / 8)
-ax1.set_xlim(0, CHUNK)
+ax1.set_xlim(0, FRAME)
 ax1.set_title('Time Domain')
 ax1.set_ylabel('Amplitude')
 # plt.setp(ax1, xticks=[0, CHUNK, 2 * CHUNK], yticks=[-32768, 0, 32767])
-plt.setp(ax1, xticks=[0, CHUNK, 2 * CHUNK], yticks=[-32768 / 8, 0, 32767/ 8])
+plt.setp(ax1, xticks=[0, FRAME // 2, FRAME], yticks=[-32768 / 8, 0, 32767/ 8])
 
 # ax2.set_ylim(0, 1)
 ax2.set_ylim(0, 1 / 8)
@@ -98,9 +75,12 @@ ani = animation.FuncAnimation(fig, update_plot, init_func=init_plot, blit=True)
 
 plt.show()
 
-# Close stream
-stream.stop_stream()
-stream.close()
+# Close stream and PyAudio
+tuner.stop()
+
+# Update rate, CPU per hop, latency and dropped frames
+for name, value in tuner.stats().items():
+    print(name, value)
 
-# Close PyAudio
-p.terminate()
+# Where the time went, stage by stage
+metrics.write('metrics.json')
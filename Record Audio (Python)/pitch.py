@@ -1,17 +1,22 @@
+import bisect
+import functools
 import logging
 import math
-import re
-import numpy as np
+
+#numpy is imported only by the paths that take arrays, so one-off lookups such
+#as SoundByte.py tune start without waiting for it to load
+
+logger = logging.getLogger(__name__)
 
 A4 = 440
 C0 = A4*pow(2, -4.75)
 all_sharp = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
 all_flat = ["C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B"]
 
-frequencies_C2_to_C5 = np.array([65.40639132514966, 73.41619197935188, 82.40688922821748, 87.30705785825096, 97.99885899543733, 109.99999999999999, 123.47082531403102, 
+frequencies_C2_to_C5 = [65.40639132514966, 73.41619197935188, 82.40688922821748, 87.30705785825096, 97.99885899543733, 109.99999999999999, 123.47082531403102, 
                                  130.8127826502993, 146.83238395870376, 164.81377845643496, 174.6141157165019, 195.99771799087466, 219.99999999999997, 246.94165062806204, 
                                  261.6255653005986, 293.66476791740763, 329.62755691286986, 349.22823143300394, 391.9954359817492, 439.99999999999994, 493.8833012561242, 
-                                 523.2511306011972, 587.3295358348153, 659.2551138257397, 698.4564628660079, 783.9908719634984, 879.9999999999999, 987.7666025122484])
+                                 523.2511306011972, 587.3295358348153, 659.2551138257397, 698.4564628660079, 783.9908719634984, 879.9999999999999, 987.7666025122484]
 
 """
 C_major, A_minor= []
@@ -44,64 +49,119 @@ def freq_to_pitch(freq, key=all_sharp):
     n = h % 12
     return key[n] + str(octave)
 
+#Semitones above C of each letter, and the shift of each accidental spelling
+natural_index = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+accidentals = {"": 0, "#": 1, "b": -1, "##": 2, "x": 2, "bb": -2,
+               "♯": 1, "♭": -1, "♯♯": 2, "𝄪": 2, "♭♭": -2, "𝄫": -2}
+
+#Every common spelling without an octave mapped to its index, e.g. "Cb" -> 11
+note_index = {letter + accidental: (natural_index[letter] + shift) % 12
+              for letter in natural_index for accidental, shift in accidentals.items()}
+
+#Every common spelling from octave -1 to 9 mapped to (index, octave, frequency)
+#Cb4 is written in octave 4 but sounds as B3, so its frequency is B3's
+pitch_table = {}
+for _letter in natural_index:
+    for _accidental in ["", "#", "b", "##", "x", "bb"]:
+        for _octave in range(-1, 10):
+            _semitones = natural_index[_letter] + accidentals[_accidental] + _octave * 12
+            pitch_table[_letter + _accidental + str(_octave)] = (_semitones % 12, _octave, C0 * (2 ** (_semitones / 12)))
+
+#Parses a pitch name such as "A4", "Eb3", "F##2" or "C-1"
+#Arguments: (string) pitch
+#Returns: (tuple) (index, octave, frequency)
+#Raises: ValueError if the pitch is not a note name followed by an octave
+def parse_pitch(pitch):
+    entry = pitch_table.get(pitch)
+    if entry is None:
+        entry = parse_unusual_pitch(pitch)
+    return entry
+
+#Slow path of parse_pitch for spellings outside pitch_table, cached by name
+@functools.lru_cache(maxsize=256)
+def parse_unusual_pitch(pitch):
+    if not isinstance(pitch, str) or not pitch or pitch[0] not in natural_index:
+        raise ValueError(f"Improper pitch format: {pitch!r}")
+    split = 1
+    while split < len(pitch) and not (pitch[split].isdigit() or pitch[split] == "-"):
+        split += 1
+    accidental = pitch[1:split]
+    octave = pitch[split:]
+    if accidental not in accidentals or not octave.lstrip("-").isdigit() or octave.count("-") > 1:
+        raise ValueError(f"Improper pitch format: {pitch!r}")
+    octave = int(octave)
+    semitones = natural_index[pitch[0]] + accidentals[accidental] + octave * 12
+    return (semitones % 12, octave, C0 * (2 ** (semitones / 12)))
+
+#Returns the frequency of a pitch name
+#Arguments: (string) pitch such as "A4"
+#Returns: (float) frequency in Hz
+#Raises: ValueError for an improperly formatted pitch
 def pitch_to_freq(pitch):
-    #Check if pitch passed in is in correct format
-    match = re.match(r'([A-G][#b]?+)(\d+)',pitch)
-    if match:
-        note = match.group(1)
-        octave = match.group(2)
-        index = find_pitch_index(note)
-        if index != -1:
-            return C0 * (2 ** ((index + int(octave) * 12) / 12))
-        else:
-            print ("Improper format")
-    else:
-        print ("Improper format")
+    return parse_pitch(pitch)[2]
+
+#Converts a list of pitch names to frequencies in one call
+#Arguments: (list) pitch names
+#Returns: numpy float64 array of frequencies
+#Raises: ValueError for an improperly formatted pitch
+def pitches_to_freqs(pitches):
+    import numpy as np
+    return np.fromiter((parse_pitch(pitch)[2] for pitch in pitches), dtype=np.float64, count=len(pitches))
 
+#Returns the index (0 for C up to 11 for B) of a pitch with or without an octave
+#Arguments: (string) pitch such as "C#" or "C#4"
+#Returns: (int) index, -1 if the pitch is improperly formatted
 def find_pitch_index(pitch):
-    match = re.match(r'([A-G][#b]?+)(\d+)',pitch)
-    if match: # If pitch contains octave
-        note = match.group(1)
-        octave = match.group(2)
-        try:
-            index = all_sharp.index(note)
-            return index
-        except ValueError:
-            try:
-                index = all_flat.index(note)
-                return index
-            except ValueError:
-                return -1
-    else: # If pitch doesn't contain octave
-        try:
-            index = all_sharp.index(pitch)
-            return index
-        except ValueError:
-            try:
-                index = all_flat.index(pitch)
-                return index
-            except ValueError:
-                return -1
+    index = note_index.get(pitch)
+    if index is not None:
+        return index
+    try:
+        return parse_pitch(pitch)[0]
+    except ValueError:
+        return -1
         
+#Returns the number of semitones above C0 of the nearest note, for the whole MIDI range
+#Arguments: (float or numpy array) frequency
+#Returns: (float or numpy array) semitones, so 57 is A4
+def nearest_semitone(freq):
+    import numpy as np
+    return np.round(12 * np.log2(np.asarray(freq, dtype=np.float64) / C0))
+
+#Returns how many cents the nearest note is above the frequency (negative when sharp)
+#Arguments: (float or numpy array) frequency
+#Returns: (float or numpy array) cents, -1 for a frequency of 0
 def cents_off (f1):
-   if f1==0:
-       logging.debug(" \033[38;5;208m cents_off:Improper frequency of 0\033[0m")
-       return -1
-   f2 = min(frequencies_C2_to_C5, key=lambda x: abs(x - f1))
-   return 1200 * math.log2(f2 / f1)
+    if isinstance(f1, (int, float)):
+        if f1 <= 0:
+            logger.debug(" \033[38;5;208m cents_off:Improper frequency of 0\033[0m")
+            return -1
+        semitones = 12 * math.log2(f1 / C0)
+        return 100 * (round(semitones) - semitones)
+    import numpy as np
+    if np.ndim(f1) == 0:
+        return cents_off(float(f1))
+    f1 = np.asarray(f1, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        semitones = 12 * np.log2(f1 / C0)
+        return np.where(f1 > 0, 100 * (np.round(semitones) - semitones), -1.0)
 
+#Returns 1 if sharp, 0 if flat, -1 if on pitch (-2 for NaN in arrays), to the nearest cent
+#Arguments: (float or numpy array) frequency
+#Returns: (int or numpy array)
 def sharp_or_flat (freq):
-    cents = round(cents_off(freq))
-    if cents < 0:
-        flat = 1
-    elif cents > 0:
-        flat = 0
-    elif cents == 0:
-        flat = -1
-    else:
-        flat = -2
-        logging.debug("Returned NAN")
-    return flat
+    cents = cents_off(freq)
+    if isinstance(cents, (int, float)):
+        cents = round(cents)
+        if cents < 0:
+            flat = 1
+        elif cents > 0:
+            flat = 0
+        else:
+            flat = -1
+        return flat
+    import numpy as np
+    cents = np.round(cents)
+    return np.select([cents < 0, cents > 0, cents == 0], [1, 0, -1], -2)
 
 
 #Levels of in Tune measured in Cents away from "perfect"
@@ -110,14 +170,29 @@ def sharp_or_flat (freq):
 #3. 13-25 : Eep                  #988200
 #4. 26-45 : Ow                   #c16d00
 #5. 46-99 : Whole different note #ff0000
-def in_tune(freq):
-    cents = abs(cents_off(freq))
-    if cents < 4:
-        return ("\033[32m" + "♪ In Tune ♪ \033[0m")
-    elif cents < 13:
-        return ("\033[33m" + "♪ Out of Tune ♪ \033[0m")
-    elif cents < 26:
-        return ("\033[31m" + "♪ Really Out of Tune ♪ \033[0m")
-    elif cents < 99:
-        return ("\033[35m" + "♪ :( ♪ \033[0m")
+tune_limits = [4, 13, 26]
+tune_labels = ["\033[32m" + "♪ In Tune ♪ \033[0m",
+               "\033[33m" + "♪ Out of Tune ♪ \033[0m",
+               "\033[31m" + "♪ Really Out of Tune ♪ \033[0m",
+               "\033[35m" + "♪ :( ♪ \033[0m"]
+#The same levels without colors, for saving or sending elsewhere
+tune_categories = ['in tune', 'out of tune', 'really out of tune', 'different note']
+
+#Returns the tuning level, an index into tune_labels
+#Arguments: (float or numpy array) frequency
+#Returns: (int or numpy array) 0 in tune up to 3 for a different note
+def tune_level(freq):
+    cents = cents_off(freq)
+    if isinstance(cents, (int, float)):
+        return bisect.bisect_right(tune_limits, abs(cents))
+    import numpy as np
+    return np.searchsorted(tune_limits, np.abs(cents), side='right')
 
+#Arguments: (float or numpy array) frequency
+#Returns: (string or numpy array of strings) colored tuning label
+def in_tune(freq):
+    level = tune_level(freq)
+    if isinstance(level, int):
+        return tune_labels[level]
+    import numpy as np
+    return np.array(tune_labels)[level]
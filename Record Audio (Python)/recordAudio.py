@@ -1,60 +1,297 @@
 import pyaudio
 import numpy as np
 import wave
+import os
 import logging
+import functools
+import threading
+import time
+from AudioBackend import sample_dtypes, shared_audio
+from Metrics import metrics as shared_metrics
 
+logger = logging.getLogger(__name__)
 
 
+#Preallocated ring of audio frames shared by one writer (the audio callback)
+#and one reader (the drain thread). Frames that arrive while the ring is full
+#are dropped and counted in overruns instead of blocking the audio thread
+class RingBuffer:
+    def __init__(self, capacity, channels=1, dtype=np.int16):
+        self.capacity = capacity
+        self.buffer = np.zeros((capacity, channels), dtype=dtype)
+        self.write_index = 0
+        self.read_index = 0
+        self.overruns = 0
+
+    #Number of frames waiting to be read
+    def available(self):
+        return self.write_index - self.read_index
+
+    #Copies frames into the ring
+    #Arguments: (numpy array) frames shaped (n, channels)
+    #Returns: (int) frames stored
+    def write(self, frames):
+        free = self.capacity - self.available()
+        if len(frames) > free:
+            self.overruns += len(frames) - free
+            frames = frames[:free]
+        n = len(frames)
+        start = self.write_index % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = frames[:first]
+        self.buffer[:n - first] = frames[first:]
+        #Publish only after the copy so the reader never sees partial frames
+        self.write_index += n
+        return n
+
+    #Copies waiting frames out of the ring
+    #Arguments: (int) max_frames to read, defaults to everything available
+    #Returns: numpy array shaped (n, channels)
+    def read(self, max_frames=None):
+        n = self.available()
+        if max_frames is not None:
+            n = min(n, max_frames)
+        start = self.read_index % self.capacity
+        first = min(n, self.capacity - start)
+        frames = np.concatenate((self.buffer[start:start + first], self.buffer[:n - first]))
+        self.read_index += n
+        return frames
+
+
+#Callback driven recorder. PyAudio's audio thread only copies each block into
+#a RingBuffer; a drain thread flushes the ring to the .wav file as it fills and
+#hands every block to on_chunk, so analysis never runs on the audio thread
+#Ring reads and file writes are timed, and overruns reported, in metrics
+#(Metrics.metrics unless another is given)
+class AudioCapture:
+    def __init__(self, output_filename=None, device_index=0, chunk_size=1024, sample_format=pyaudio.paInt16, channels=1, sample_rate=44100,
+                 max_frames=None, buffer_seconds=5, on_chunk=None, audio=None, metrics=None):
+        self.output_filename = output_filename
+        self.device_index = device_index
+        self.chunk_size = chunk_size
+        self.sample_format = sample_format
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.max_frames = max_frames
+        self.on_chunk = on_chunk
+        self.dtype = sample_dtypes[sample_format]
+        self.ring = RingBuffer(int(buffer_seconds * sample_rate), channels, self.dtype)
+        # Without an audio backend of its own the capture borrows the shared one
+        self.borrowed_audio = audio is None
+        self.audio = audio
+        self.stream = None
+        self.wave_file = None
+        self.captured = 0
+        self.input_overflows = 0
+        # perf_counter times the newest block reached the callback, and that
+        # the newest block handed to on_chunk had arrived by
+        self.last_arrival = 0.0
+        self.chunk_arrival = 0.0
+        self.data_ready = threading.Event()
+        self.finished = threading.Event()
+        self.stopping = False
+        self.drain_thread = None
+        self.metrics = shared_metrics if metrics is None else metrics
+
+    def start(self):
+        if self.audio is None:
+            self.audio = shared_audio()
+        self.metrics.gauge('ring overruns', lambda: self.ring.overruns)
+        self.metrics.gauge('input overflows', lambda: self.input_overflows)
+        self.read_time = self.metrics.histogram('read')
+        self.write_time = self.metrics.histogram('write')
+        if self.output_filename:
+            self.wave_file = wave.open(self.output_filename, 'wb')
+            self.wave_file.setnchannels(self.channels)
+            self.wave_file.setsampwidth(self.audio.get_sample_size(self.sample_format))
+            self.wave_file.setframerate(self.sample_rate)
+        self.drain_thread = threading.Thread(target=self._drain, daemon=True)
+        self.drain_thread.start()
+        try:
+            self.stream = self.audio.open(format=self.sample_format,
+                                          channels=self.channels,
+                                          rate=self.sample_rate,
+                                          frames_per_buffer=self.chunk_size,
+                                          input=True,
+                                          input_device_index=self.device_index,
+                                          stream_callback=self._callback)
+        except Exception:
+            # e.g. no such device; nothing was recorded, so the empty .wav goes too
+            self.stop()
+            if self.output_filename:
+                os.remove(self.output_filename)
+            raise
+
+    #Runs on PyAudio's audio thread, so it only copies and signals
+    def _callback(self, in_data, frame_count, time_info, status):
+        self.last_arrival = time.perf_counter()
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        frames = np.frombuffer(in_data, dtype=self.dtype).reshape(-1, self.channels)
+        if self.max_frames is not None:
+            frames = frames[:self.max_frames - self.captured]
+        self.captured += self.ring.write(frames)
+        self.data_ready.set()
+        if self.max_frames is not None and self.captured >= self.max_frames:
+            self.finished.set()
+            return (None, pyaudio.paComplete)
+        return (None, pyaudio.paContinue)
+
+    def _drain(self):
+        while True:
+            self.data_ready.wait(0.05)
+            self.data_ready.clear()
+            stopping = self.stopping
+            if self.ring.available():
+                self.chunk_arrival = self.last_arrival
+                start = time.perf_counter()
+                frames = self.ring.read()
+                read = time.perf_counter()
+                self.read_time.record(read - start)
+                self.metrics.count('samples read', len(frames))
+                if self.wave_file is not None:
+                    self.wave_file.writeframes(frames.tobytes())
+                    self.write_time.record(time.perf_counter() - read)
+                if self.on_chunk is not None:
+                    self.on_chunk(frames)
+            elif stopping:
+                return
+
+    #Blocks until max_frames have been captured or the stream ends
+    #Arguments: (float) timeout in seconds, defaults to waiting forever
+    #Returns: (bool) True if the capture finished
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.finished.wait(0.05):
+            if not self.stream.is_active():
+                self.finished.set()
+            elif deadline is not None and time.monotonic() > deadline:
+                return False
+        return True
+
+    #Stops the stream, flushes whatever is left in the ring and closes the file
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        self.stopping = True
+        self.data_ready.set()
+        if self.drain_thread is not None:
+            self.drain_thread.join()
+        if self.wave_file is not None:
+            self.wave_file.close()
+            self.wave_file = None
+        if self.borrowed_audio:
+            self.audio = None
+        if self.ring.overruns or self.input_overflows:
+            logger.debug("\033[38;5;208m AudioCapture:%d frames dropped, %d input overflows \033[0m", self.ring.overruns, self.input_overflows)
+
+
+#The channels of a block of interleaved frames as rows, without copying
+#Arguments: (numpy array) frames shaped (samples, channels), as read from a RingBuffer
+#Returns: numpy array shaped (channels, samples), a strided view of the frames
+def deinterleave(frames):
+    return frames.T
+
+
+#Records from several devices at once. Each device gets an AudioCapture of its
+#own, and so its own stream, ring buffer and drain thread, and a device that
+#falls behind only drops its own frames. Every block drained is handed to
+#on_chunk(source, channels), source being the device's place in sources and
+#channels its samples shaped (channels, samples), a view of the block
+#Arguments for sources: list of (device_index, channels) pairs
+#              audio: one backend for every device, or a list of one per device
+class MultiCapture:
+    def __init__(self, sources, output_filenames=None, chunk_size=1024, sample_format=pyaudio.paInt16, sample_rate=44100,
+                 max_frames=None, buffer_seconds=5, on_chunk=None, audio=None, metrics=None):
+        self.sources = list(sources)
+        self.on_chunk = on_chunk
+        self.metrics = shared_metrics if metrics is None else metrics
+        outputs = output_filenames or [None] * len(self.sources)
+        audios = audio if isinstance(audio, (list, tuple)) else [audio] * len(self.sources)
+        self.captures = [AudioCapture(output, device, chunk_size, sample_format, channels, sample_rate, max_frames, buffer_seconds,
+                                      on_chunk=functools.partial(self._deliver, source) if on_chunk is not None else None,
+                                      audio=device_audio, metrics=self.metrics)
+                         for source, ((device, channels), output, device_audio) in enumerate(zip(self.sources, outputs, audios))]
+        self.channels = sum(channels for _, channels in self.sources)
+
+    def _deliver(self, source, frames):
+        self.on_chunk(source, deinterleave(frames))
+
+    def start(self):
+        for started, capture in enumerate(self.captures):
+            try:
+                capture.start()
+            except Exception:
+                for other in self.captures[:started]:
+                    other.stop()
+                raise
+        # Each capture registered its own gauges under the same names; report the totals
+        self.metrics.gauge('ring overruns', lambda: sum(capture.ring.overruns for capture in self.captures))
+        self.metrics.gauge('input overflows', lambda: sum(capture.input_overflows for capture in self.captures))
+
+    #Blocks until every device has finished
+    #Arguments: (float) timeout in seconds, defaults to waiting forever
+    #Returns: (bool) True if every capture finished
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for capture in self.captures:
+            if not capture.wait(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                return False
+        return True
+
+    #True while any device is still capturing
+    def active(self):
+        return any(not capture.finished.is_set() and capture.stream is not None and capture.stream.is_active()
+                   for capture in self.captures)
+
+    def stop(self):
+        for capture in self.captures:
+            capture.stop()
+
+
+#Records several devices at the same time, each to a .wav file of its own
+#Arguments: (list) output file paths, one per device
+#           (list) (device_index, channels) pairs
+#           (int) seconds to record, None records until interrupted (Ctrl+C)
+#           other arguments as record_audio, audio may also be a list of one backend per device
+#Returns: N/A
+def record_devices(output_filenames, sources, duration=5, chunk_size=1024, sample_format=pyaudio.paInt16, sample_rate=44100, audio=None):
+    max_frames = None if duration is None else int(duration * sample_rate)
+    capture = MultiCapture(sources, output_filenames, chunk_size, sample_format, sample_rate, max_frames=max_frames, audio=audio)
+    logger.debug("\033[38;5;208m record_devices:Recording %d devices... \033[38;5;208m", len(capture.captures))
+    capture.start()
+    try:
+        capture.wait()
+    except KeyboardInterrupt:
+        pass
+    capture.stop()
+    logger.debug("\033[38;5;208m record_devices:Streams closed  \033[38;5;208m")
+
 
 #Records audio and saves it to a .wav file
 #Arguments: (string) output file path
 #           (int) microphone to record from
-#           (int) seconds to record
-#           (int)
-#           
+#           (int) seconds to record, None records until interrupted (Ctrl+C)
+#           (int) frames per callback block
+#           (int) pyaudio sample format
 #           (int) number of channels microphone has
 #           (int) samples per second
+#           (PyAudio) audio interface to use, defaults to AudioBackend.shared_audio()
 #Returns: N/A
-def record_audio(output_filename = 'Python Files\\recorded_audio.wav', device_index = 0, duration=5, chunk_size=1024, sample_format=pyaudio.paInt16, channels=1, sample_rate=44100):
-    p = pyaudio.PyAudio()
-    chunk_size = duration * sample_rate
-    stream = p.open(format=sample_format,
-                    channels=channels,
-                    rate=sample_rate,
-                    frames_per_buffer=chunk_size,
-                    input=True,
-                    input_device_index=device_index)
-
-    frames = []
-    all_frequencies = []
-
-    logging.debug("\033[38;5;208m redord_audio:Recording... \033[38;5;208m")
-    #print("Sample Rate:", sample_rate)
-
-    for _ in range(0, int(sample_rate / chunk_size * duration)):
-        data = stream.read(chunk_size)
-        frames.append(data)
-
-        # Convert binary data to numpy array
-        audio_data = np.frombuffer(data, dtype=np.int16)
-        # Apply FFT to analyze frequency components
-        fft_result = np.fft.fft(audio_data)
-        # Calculate frequencies corresponding to FFT result
-        frequencies = np.fft.fftfreq(len(audio_data), 1/sample_rate)
-        all_frequencies.append(frequencies)
-
-
-    logging.debug("\033[38;5;208m redord_audio:Finished Recording \033[38;5;208m")
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
+def record_audio(output_filename = 'Python Files\\recorded_audio.wav', device_index = 0, duration=5, chunk_size=1024, sample_format=pyaudio.paInt16, channels=1, sample_rate=44100, audio=None):
+    max_frames = None if duration is None else int(duration * sample_rate)
+    capture = AudioCapture(output_filename, device_index, chunk_size, sample_format, channels, sample_rate, max_frames=max_frames, audio=audio)
+
+    logger.debug("\033[38;5;208m record_audio:Recording... \033[38;5;208m")
+    capture.start()
+    try:
+        capture.wait()
+    except KeyboardInterrupt:
+        pass
+    logger.debug("\033[38;5;208m record_audio:Finished Recording \033[38;5;208m")
+    capture.stop()
 
     # Log that streams have been closed
-    logging.debug("\033[38;5;208m record_audio:Streams closed  \033[38;5;208m")
-
-    wf = wave.open(output_filename, 'wb')
-    wf.setnchannels(channels)
-    wf.setsampwidth(p.get_sample_size(sample_format))
-    wf.setframerate(sample_rate)
-    wf.writeframes(b''.join(frames))
-    wf.close()
+    logger.debug("\033[38;5;208m record_audio:Streams closed  \033[38;5;208m")
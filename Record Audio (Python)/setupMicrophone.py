@@ -1,26 +1,43 @@
-import pyaudio
+from AudioBackend import shared_audio
 
 #Detects audio input devices
-#Arguments: N/A
+#Arguments: (audio backend) defaults to AudioBackend.shared_audio()
 #Returns: Array of audio devices and their info 
-def list_audio_devices():
-    p = pyaudio.PyAudio()
+def list_audio_devices(audio=None):
+    p = audio or shared_audio()
+    # The shared backend's cached device list, limited to the first host API as below
+    if hasattr(p, 'devices'):
+        return [device.get('name') for device in p.devices() if device.get('hostApi', 0) == 0]
     info = p.get_host_api_info_by_index(0)
     num_devices = info.get('deviceCount')
     devices = []
     for i in range(0, num_devices):
         device_info = p.get_device_info_by_host_api_device_index(0, i)
         devices.append(device_info.get('name'))
-    p.terminate()
     return devices
 
+#Checks for a microphone without failing on machines with no audio system
+#Arguments: (audio backend) defaults to AudioBackend.shared_audio()
+#Returns: (bool) True if any device can record
+def has_input_device(audio=None):
+    try:
+        p = audio or shared_audio()
+        # A plain pyaudio.PyAudio has no cached device list
+        if hasattr(p, 'devices'):
+            devices = p.devices()
+        else:
+            devices = [p.get_device_info_by_index(i) for i in range(p.get_device_count())]
+        return any(device.get('maxInputChannels', 0) > 0 for device in devices)
+    except Exception:
+        return False
+
 #Prints out a menu for the user to select a microphone
-#Arguments: N/A
+#Arguments: (audio backend) defaults to AudioBackend.shared_audio()
 #Returns: index of microphone selected
-def select_microphone():
-    devices = list_audio_devices()
+def select_microphone(audio=None):
+    devices = list_audio_devices(audio)
     print("Available microphones:")
     for i, device in enumerate(devices):
         print(f"{i}: {device}")
     choice = int(input("Select the microphone you want to use: "))
-    return choice
\ No newline at end of file
+    return choice
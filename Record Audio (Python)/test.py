@@ -1,8 +1,5 @@
-import matplotlib.pyplot as plt
 import numpy as np
-import colorlog
 import logging
-import math
 from setupMicrophone import list_audio_devices, select_microphone
 from recordAudio import record_audio
 from WaveGenerator import generate_sine_wave
@@ -17,7 +14,6 @@ from SongToWav import read_song
 from WavToFreq import find_dominant_freq
 from WavToFreq import find_frequencies
 from WavToFreq import plot_freqs
-from UnitTesting import main
 from LoggingSetup import log_setup
 
 def record_to_wave():